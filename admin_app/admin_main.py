@@ -1,27 +1,37 @@
+from shared import startup  # first, so startup timing covers the imports below
 import tkinter as tk
-import tkinterweb
-import threading
-import time
 
-from admin_app.admin_pages import app as admin_flask_app
-
-def run_admin_flask():
-    admin_flask_app.run(port=5001, debug=False)
+PORT = 5001
 
 class AdminApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, boot):
         super().__init__()
         self.title("PUP Shop - Admin Panel")
         self.geometry("800x600")
+        self.boot = boot
+        with startup.phase('html engine'):
+            import tkinterweb
         self.html_frame = tkinterweb.HtmlFrame(self)
         self.html_frame.pack(fill="both", expand=True)
-        self.html_frame.load_url("http://127.0.0.1:5001/admin")
+        self.load_when_ready("/admin")
+
+    def load_when_ready(self, path):
+        # The server boots behind the window; the page loads once it is ready.
+        if not self.boot.ready.is_set():
+            self.after(20, self.load_when_ready, path)
+            return
+        if self.boot.error:
+            self.html_frame.load_html(f"<p>{self.boot.error}</p>")
+            return
+        self.html_frame.load_url(self.boot.url + path)
+        startup.mark('first page')
+        startup.report('first paint')
 
 if __name__ == "__main__":
-    flask_thread = threading.Thread(target=run_admin_flask, daemon=True)
-    flask_thread.start()
-    time.sleep(1)
-    from shared.database import setup_database
-    setup_database()
-    app = AdminApp()
+    # Headless serving without this window: python -m shared.server admin
+    startup.mark('launcher imports')
+    boot = startup.ServerBoot("admin", PORT)
+    app = AdminApp(boot)
+    app.after_idle(startup.mark, 'first paint')
     app.mainloop()
+    boot.stop()
@@ -1,24 +1,53 @@
 import os
-from flask import Flask, request, redirect, url_for
+from flask import Flask, Response, request, redirect, url_for, jsonify, stream_with_context
 import dominate
 from dominate.tags import *
 from shared import database as db
+from shared.rendering import PageShell, FragmentCache, render_fragment
+from shared import metrics
+from shared import images
+from shared import assets
+from shared import server
+from shared import analytics
+from shared import profiler
+from shared.http_cache import conditional, PRIVATE_REVALIDATE
+from admin_app.inventory_io import PARSERS, EXPORTERS, parse_variations, format_variations
 
-app = Flask(__name__, static_folder='assets', static_url_path='/static')
+app = Flask(__name__, static_folder=None)
+metrics.install(app, 'admin')
+server.install(app)
+assets.install(app)
+
+IMPORT_ERRORS_SHOWN = 200
+
+def admin_head():
+    link(rel="stylesheet", href=assets.asset_url("css/style.css"))
+
+shell = PageShell(admin_head, cls="container", style="max-width: 750px;")
+fragments = FragmentCache()
 
 def create_admin_page(page_title, content_func):
-    doc = dominate.document(title=page_title)
-    with doc.head:
-        link(rel="stylesheet", href="/static/css/style.css")
-    with doc.body:
-        with div(cls="container", style="max-width: 750px;"):
-            content_func()
-    return doc.render()
+    with metrics.render_phase():
+        return shell.render(page_title, render_fragment(content_func))
 
 def inventory_management_content():
     h1("Inventory Management")
-    
-    with form(action="/admin/action", method="post"):
+    with p():
+        a("Sales & Inventory Analytics", href=url_for('admin_analytics'))
+        span(" · ")
+        a("Query Profile", href=url_for('admin_query_profile'))
+    fragments.include(('inventory-form',), inventory_form)
+    hr()
+    fragments.include(('bulk-tools',), bulk_tools)
+    hr()
+    h2("Current Inventory")
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    # Not fragment-cached: stock changes with every checkout.
+    inventory_table(after, before)
+
+def inventory_form():
+    with form(action="/admin/action", method="post", enctype="multipart/form-data"):
         with table(style="width: 100%; text-align: left;"):
             with tr():
                 td(label("Item ID (for Update/Delete):"))
@@ -28,57 +57,348 @@ def inventory_management_content():
                 td(input_(type="text", name="item_name", required=True))
             with tr():
                 td(label("Quantity:"))
-                td(input_(type="number", name="quantity", required=True))
+                td(input_(type="number", name="quantity", min="0", placeholder="Total, if no variations"))
+            with tr():
+                td(label("Variations (optional):"))
+                td(input_(type="text", name="variations", placeholder="e.g., S:5, M:10, L:3:+20.00"))
             with tr():
                 td(label("Price:"))
                 td(input_(type="text", name="price", required=True, placeholder="e.g., 150.00"))
+            with tr():
+                td(label("Image (optional):"))
+                td(input_(type="file", name="image", accept="image/*"))
         
         button("Add Item", name="action", value="add", type="submit", cls="btn-primary")
         button("Update Item", name="action", value="update", type="submit", cls="btn-secondary")
         button("Delete Item", name="action", value="delete", type="submit", cls="btn-danger", style="background-color: #f44336;")
-        
-    hr()
-    h2("Current Inventory")
-    
-    products = db.get_all_products()
+
+def bulk_tools():
+    h2("Bulk Import / Export")
+    with form(action="/admin/import", method="post", enctype="multipart/form-data"):
+        with table(style="width: 100%; text-align: left;"):
+            with tr():
+                td(label("CSV or JSON-lines file:"))
+                td(input_(type="file", name="inventory_file", accept=".csv,.jsonl,.ndjson", required=True))
+            with tr():
+                td(label("Batch size:"))
+                td(input_(type="number", name="batch_size", value=db.IMPORT_BATCH_SIZE, min="1"))
+        button("Import", type="submit", cls="btn-primary")
+    p(
+        a("Export CSV", href=url_for('export_inventory', fmt='csv')),
+        " | ",
+        a("Export JSON-lines", href=url_for('export_inventory', fmt='jsonl')),
+    )
+
+def import_report_content(filename, report):
+    h1("Import Results")
+    p(f"File: {filename}")
+    p(f"Rows written: {report['written']} in {report['batches']} batch(es)")
+    p(f"Rows with errors: {len(report['errors'])}")
+    if report['errors']:
+        with table(cls="admin-table"):
+            with thead():
+                with tr():
+                    th("Line")
+                    th("Error")
+            with tbody():
+                for line_no, message in report['errors'][:IMPORT_ERRORS_SHOWN]:
+                    with tr():
+                        td(line_no if line_no is not None else "-")
+                        td(message)
+        if len(report['errors']) > IMPORT_ERRORS_SHOWN:
+            p(f"... and {len(report['errors']) - IMPORT_ERRORS_SHOWN} more.")
+    a("Back to Inventory", href=url_for('admin_dashboard'))
+
+def invalid_image_content(message):
+    h1("Image Rejected")
+    p(message)
+    a("Back to Inventory", href=url_for('admin_dashboard'))
+
+def invalid_variations_content(message):
+    h1("Variations Rejected")
+    p(message)
+    p("List each variation as name:stock, optionally followed by :price difference.")
+    a("Back to Inventory", href=url_for('admin_dashboard'))
+
+def action_failed_content(message):
+    h1("Item Not Saved")
+    p(message)
+    a("Back to Inventory", href=url_for('admin_dashboard'))
+
+def inventory_table(after, before):
+    page = db.get_products_page(
+        limit=db.ADMIN_PAGE_SIZE,
+        after=after,
+        before=before,
+        columns=db.INVENTORY_COLUMNS,
+        cached=False,
+    )
+    products = page['items']
+    # Live stock per variation for the whole page in one query.
+    variations = db.get_variations([p['id'] for p in products])
     with table(cls="admin-table"):
         with thead():
             with tr():
                 th("ID")
                 th("Name")
                 th("Quantity (Stock)")
+                th("Variations")
                 th("Price")
         with tbody():
             if not products:
                 with tr():
-                    td("No products found.", colspan="4")
+                    td("No products found.", colspan="5")
             for p in products:
                 with tr():
                     td(p['id'])
                     td(p['name'])
                     td(p['stock'])
+                    td(format_variations(variations.get(p['id'], [])).replace(',', ', ') or "-")
                     td(f"₱{p['price']:.2f}")
 
+    with div(cls="pager"):
+        if page['prev'] is not None:
+            a("‹ Prev", href=url_for('admin_dashboard', before=page['prev']))
+        if page['next'] is not None:
+            a("Next ›", href=url_for('admin_dashboard', after=page['next']))
+
+def analytics_content():
+    h1("Sales & Inventory Analytics")
+    data = analytics.dashboard()
+    if data is None:
+        p("Analytics are unavailable: the database could not be reached.")
+        a("Back to Inventory", href=url_for('admin_dashboard'))
+        return
+    totals = data['totals']
+    inventory = data['inventory']
+    with table(cls="admin-table"):
+        with tbody():
+            for name, value in (
+                ("Revenue today", f"₱{totals['today']:.2f}"),
+                (f"Revenue since {data['start']}", f"₱{totals['revenue']:.2f}"),
+                (f"Orders since {data['start']}", totals['orders']),
+                (f"Units sold since {data['start']}", totals['units']),
+                ("Products", inventory['product_count']),
+                ("Units in stock", inventory['units_in_stock']),
+                ("Stock value", f"₱{inventory['stock_value']:.2f}"),
+            ):
+                with tr():
+                    th(name)
+                    td(value)
+
+    h2("Sales by Day")
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("Day")
+                th("Orders")
+                th("Units")
+                th("Revenue")
+        with tbody():
+            if not data['sales']:
+                with tr():
+                    td("No sales yet.", colspan="4")
+            for row in data['sales']:
+                with tr():
+                    td(str(row['day']))
+                    td(row['order_count'])
+                    td(row['units'])
+                    td(f"₱{row['revenue']:.2f}")
+
+    h2(f"Top Products since {data['start']}")
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("ID")
+                th("Name")
+                th("Units")
+                th("Revenue")
+        with tbody():
+            for row in data['top_products']:
+                with tr():
+                    td(row['product_id'])
+                    td(row['name'] or "(deleted)")
+                    td(row['units'])
+                    td(f"₱{row['revenue']:.2f}")
+
+    h2("Top Variations")
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("ID")
+                th("Name")
+                th("Variation")
+                th("Sold")
+        with tbody():
+            for row in data['top_variations']:
+                with tr():
+                    td(row['product_id'])
+                    td(row['name'] or "(deleted)")
+                    td(row['variation'])
+                    td(row['sold_count'])
+
+    h2(f"Low Stock (≤ {analytics.LOW_STOCK_THRESHOLD})")
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("ID")
+                th("Name")
+                th("Variation")
+                th("Stock")
+                th("Price")
+        with tbody():
+            if not data['low_stock']:
+                with tr():
+                    td("Nothing is running low.", colspan="5")
+            for row in data['low_stock']:
+                with tr():
+                    td(row['id'])
+                    td(row['name'])
+                    td(row['variation'] or "—")
+                    td(row['stock'])
+                    td(f"₱{row['price']:.2f}")
+    a("Back to Inventory", href=url_for('admin_dashboard'))
+
+def query_profile_content():
+    h1("Query Profile")
+    if not db.QUERY_PROFILE:
+        p("Profiling is off in this process. Start the apps (or benchmarks.load_test) with "
+          "PUP_QUERY_PROFILE=1 to record statements; profiles of other running processes are shown below.")
+    rows = profiler.report()
+    flagged = sum(1 for row in rows if row['full_scans'] or row['filesort'])
+    p(f"{len(rows)} statement(s), {flagged} flagged. Rows are the plan's estimate per call. "
+      "python -m shared.profiler prints the same report, including processes that have exited.")
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("Count")
+                th("Total ms")
+                th("Max ms")
+                th("Rows")
+                th("Flags")
+                th("Statement")
+        with tbody():
+            if not rows:
+                with tr():
+                    td("No statements recorded yet.", colspan="6")
+            for row in rows:
+                flags = [f"full scan: {table_name}" for table_name in row['full_scans']]
+                if row['filesort']:
+                    flags.append("filesort")
+                if row['explain_error']:
+                    flags.append("explain failed")
+                with tr():
+                    td(row['count'])
+                    td(f"{row['total'] * 1000:.1f}")
+                    td(f"{row['max'] * 1000:.2f}")
+                    td('-' if row['rows_examined'] is None else row['rows_examined'])
+                    td(", ".join(flags))
+                    td(code(row['shape']))
+    a("Back to Inventory", href=url_for('admin_dashboard'))
+
+def dashboard_validator():
+    # The inventory table shows live stock, which checkouts change without
+    # bumping the catalog version.
+    stock = db.stock_level()
+    if stock is None:
+        return None
+    return (shell.digest, db.catalog_version(), stock)
+
 @app.route('/admin')
+@conditional(dashboard_validator, PRIVATE_REVALIDATE)
 def admin_dashboard():
     return create_admin_page("Admin - Inventory", inventory_management_content)
 
+@app.route('/admin/analytics')
+def admin_analytics():
+    return create_admin_page("Admin - Analytics", analytics_content)
+
+@app.route('/admin/query-profile')
+def admin_query_profile():
+    return create_admin_page("Admin - Query Profile", query_profile_content)
+
+@app.route('/admin/db-pool')
+def db_pool_stats():
+    return jsonify(db.pool_stats())
+
 @app.route('/admin/action', methods=['POST'])
 def handle_admin_action():
     action = request.form.get('action')
-    item_id = request.form.get('item_id')
-    item_name = request.form.get('item_name')
-    quantity = request.form.get('quantity')
-    price = request.form.get('price')
+    item_id = request.form.get('item_id', '').strip()
+    item_name = request.form.get('item_name', '').strip()
+    quantity = request.form.get('quantity', '').strip()
+    price = request.form.get('price', '').strip()
+
+    def failed(message):
+        return create_admin_page("Admin - Item Not Saved", lambda: action_failed_content(message))
+
+    if action in ('update', 'delete') and not item_id.isdigit():
+        return failed(f"Enter the ID of the item to {action}.")
+    if action in ('add', 'update'):
+        if not item_name:
+            return failed("Enter the item's name.")
+        try:
+            price = float(price)
+            quantity = int(quantity) if quantity else None
+        except ValueError:
+            return failed("Price must be a number and quantity a whole number.")
+        if price < 0 or (quantity is not None and quantity < 0):
+            return failed("Price and quantity must not be negative.")
+
+    variations = None
+    if action in ('add', 'update') and request.form.get('variations', '').strip():
+        try:
+            variations = parse_variations(request.form['variations'], quantity or 0) or None
+        except ValueError as err:
+            return create_admin_page("Admin - Invalid Variations", lambda: invalid_variations_content(str(err)))
+    if variations is not None:
+        quantity = sum(stock for _, stock, _ in variations)
+    elif action in ('add', 'update') and quantity is None:
+        # A product that keeps its variations takes its stock from them.
+        if action == 'add' or not db.get_variations([int(item_id)]).get(int(item_id)):
+            return failed("Enter a quantity, or list variations to take the total from.")
+        quantity = 0
+
+    image_url = None
+    upload = request.files.get('image')
+    if action in ('add', 'update') and upload and upload.filename:
+        try:
+            image_url = images.save_upload(upload)
+        except images.InvalidImage as err:
+            return create_admin_page("Admin - Invalid Image", lambda: invalid_image_content(str(err)))
 
     if action == 'add':
-        if item_name and quantity and price:
-            db.add_product(item_name, int(quantity), float(price))
+        saved = db.add_product(item_name, quantity, price, image_url, variations)
     elif action == 'update':
-        if item_id and item_name and quantity and price:
-            db.update_product(int(item_id), item_name, int(quantity), float(price))
+        saved = db.update_product(int(item_id), item_name, quantity, price, image_url, variations)
     elif action == 'delete':
-        if item_id:
-            db.delete_product(int(item_id))
-            
+        saved = db.delete_product(int(item_id))
+    else:
+        return failed("Unknown action.")
+    if not saved:
+        return failed("The database did not accept the change; see the server log and try again.")
     return redirect(url_for('admin_dashboard'))
+
+@app.route('/admin/import', methods=['POST'])
+def import_inventory():
+    upload = request.files.get('inventory_file')
+    if not upload or not upload.filename:
+        return redirect(url_for('admin_dashboard'))
+    extension = upload.filename.rsplit('.', 1)[-1].lower()
+    fmt = 'jsonl' if extension in ('jsonl', 'ndjson') else 'csv'
+    batch_size = max(1, request.form.get('batch_size', db.IMPORT_BATCH_SIZE, type=int) or db.IMPORT_BATCH_SIZE)
+
+    report = db.bulk_upsert_products(PARSERS[fmt](upload.stream), batch_size=batch_size)
+    return create_admin_page("Admin - Import", lambda: import_report_content(upload.filename, report))
+
+@app.route('/admin/export.<fmt>')
+def export_inventory(fmt):
+    if fmt not in EXPORTERS:
+        return "Unsupported export format", 404
+    writer, mimetype = EXPORTERS[fmt]
+    # No Content-Length is set, so the body goes out chunked as it is read.
+    return Response(
+        stream_with_context(writer(db.iter_products())),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=inventory.{fmt}'},
+    )
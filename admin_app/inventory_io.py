@@ -0,0 +1,170 @@
+# admin_app/inventory_io.py
+#
+# Streaming parsers and writers for bulk inventory files. Parsers yield
+# (line_no, row) pairs one at a time; a bad record yields a ValueError in place
+# of the row so the import can report it and carry on.
+
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from shared import database as db
+from shared.backends import split_stock
+
+CHUNK_ROWS = 200
+
+
+def parse_variations(spec, stock=0):
+    # "S:5, M:10, L:3:+20" -> [(name, stock, price_delta), ...]. Entries
+    # without a stock share what `stock` leaves after the listed ones, so a
+    # plain list of names ("S,M,L") spreads the product's stock evenly.
+    entries = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        fields = [field.strip() for field in part.split(':')]
+        name = fields[0]
+        if not name or len(fields) > 3:
+            raise ValueError(f"invalid variation {part!r}")
+        if any(entry[0] == name for entry in entries):
+            raise ValueError(f"duplicate variation {name!r}")
+        try:
+            variation_stock = int(fields[1]) if len(fields) > 1 and fields[1] else None
+        except ValueError:
+            raise ValueError(f"invalid stock for variation {name!r}")
+        if variation_stock is not None and variation_stock < 0:
+            raise ValueError(f"stock for variation {name!r} must not be negative")
+        try:
+            price_delta = Decimal(fields[2]) if len(fields) > 2 and fields[2] else Decimal(0)
+        except InvalidOperation:
+            raise ValueError(f"invalid price for variation {name!r}")
+        entries.append([name, variation_stock, price_delta])
+    unstocked = [entry for entry in entries if entry[1] is None]
+    if unstocked:
+        rest = stock - sum(entry[1] for entry in entries if entry[1] is not None)
+        for entry, share in zip(unstocked, split_stock(rest, len(unstocked))):
+            entry[1] = share
+    return [tuple(entry) for entry in entries]
+
+
+def format_variations(variations):
+    # The inverse of parse_variations; the price delta is left out when zero.
+    parts = []
+    for variation in variations:
+        part = f"{variation['name']}:{variation['stock']}"
+        if variation['price_delta']:
+            part += f":{variation['price_delta']:+.2f}"
+        parts.append(part)
+    return ','.join(parts)
+
+
+def _to_row(record):
+    name = str(record.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+
+    product_id = record.get('id')
+    if product_id in (None, ''):
+        product_id = None
+    else:
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid id {product_id!r}")
+        if product_id <= 0:
+            raise ValueError(f"invalid id {product_id!r}")
+
+    try:
+        price = Decimal(str(record.get('price')).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"invalid price {record.get('price')!r}")
+    if price < 0:
+        raise ValueError("price must not be negative")
+
+    try:
+        stock = int(str(record.get('stock')).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid stock {record.get('stock')!r}")
+    if stock < 0:
+        raise ValueError("stock must not be negative")
+
+    description = str(record.get('description') or '').strip() or None
+    variations = str(record.get('variations') or '').strip() or None
+    if variations is not None:
+        variations = parse_variations(variations, stock) or None
+    if variations is not None:
+        stock = sum(entry[1] for entry in variations)
+    image_url = str(record.get('image_url') or '').strip()
+    if not image_url and product_id is None:
+        image_url = db.DEFAULT_IMAGE_URL
+    return (product_id, name, description, price, image_url, stock, variations)
+
+
+def parse_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    missing = {'name', 'price', 'stock'} - set(reader.fieldnames or ())
+    if missing:
+        yield 1, ValueError(f"missing columns: {', '.join(sorted(missing))}")
+        return
+    for record in reader:
+        try:
+            yield reader.line_num, _to_row(record)
+        except ValueError as err:
+            yield reader.line_num, err
+
+
+def parse_jsonl(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            yield line_no, _to_row(record)
+        except ValueError as err:
+            yield line_no, err
+
+
+PARSERS = {'csv': parse_csv, 'jsonl': parse_jsonl}
+
+
+def _export_value(product, column):
+    if column == 'variations' and product.get('variation_list'):
+        return format_variations(product['variation_list'])
+    return product[column]
+
+
+def export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(db.EXPORT_COLUMNS)
+    for count, product in enumerate(rows, start=1):
+        writer.writerow([_export_value(product, c) if product[c] is not None else '' for c in db.EXPORT_COLUMNS])
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_jsonl(rows):
+    chunk = []
+    for product in rows:
+        chunk.append(json.dumps({c: _export_value(product, c) for c in db.EXPORT_COLUMNS},
+                                default=str, ensure_ascii=False))
+        if len(chunk) >= CHUNK_ROWS:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+EXPORTERS = {
+    'csv': (export_csv, 'text/csv'),
+    'jsonl': (export_jsonl, 'application/x-ndjson'),
+}
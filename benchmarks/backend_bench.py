@@ -0,0 +1,70 @@
+# benchmarks/backend_bench.py
+#
+# Per-operation latency of each storage backend, measured directly against
+# the repository interface (no catalog cache, no Flask).
+#
+#   python -m benchmarks.backend_bench --products 5000 --backends sqlite-memory sqlite-file mysql
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from shared.backends import create_backend, split_stock
+from shared import database as db
+
+BACKEND_FACTORIES = {
+    'sqlite-memory': lambda: create_backend('sqlite', path=':memory:'),
+    'sqlite-file': lambda: create_backend('sqlite', path=os.path.join(tempfile.mkdtemp(), 'bench.db')),
+    'mysql': lambda: create_backend('mysql'),
+}
+
+
+def seed(backend, count):
+    backend.setup()
+    variations = [(name, stock, 0) for name, stock in zip(('S', 'M', 'L'), split_stock(50, 3))]
+    rows = [(None, f"Bench Product {i}", "Seeded for benchmarks.", 100 + i % 400,
+             db.DEFAULT_IMAGE_URL, 50, variations) for i in range(count)]
+    for start in range(0, count, 1000):
+        backend.upsert_products(rows[start:start + 1000])
+
+
+def measure(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(names, products, iterations):
+    print(f"{'backend':<15}{'operation':<18}{'p50 ms':>10}{'p95 ms':>10}")
+    for name in names:
+        backend = BACKEND_FACTORIES[name]()
+        seed(backend, products)
+        max_id = backend.fetch_products_page(1, None, None, ('id',))['items'][0]['id']
+        operations = {
+            'product by id': lambda: backend.fetch_product(random.randint(1, max_id)),
+            'first page': lambda: backend.fetch_products_page(db.PAGE_SIZE, None, None, db.LISTING_COLUMNS),
+            'deep page': lambda: backend.fetch_products_page(db.PAGE_SIZE, random.randint(1, max_id), None, db.LISTING_COLUMNS),
+            'catalog version': backend.catalog_version,
+            'update product': lambda: backend.update_product(random.randint(1, max_id), "Updated", 10, 99),
+        }
+        for label, fn in operations.items():
+            p50, p95 = measure(fn, iterations)
+            print(f"{name:<15}{label:<18}{p50:>10.3f}{p95:>10.3f}")
+        backend.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-operation latency of each storage backend.")
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--backends', nargs='+', default=['sqlite-memory', 'sqlite-file'],
+                        choices=sorted(BACKEND_FACTORIES))
+    args = parser.parse_args()
+    run(args.backends, args.products, args.iterations)
@@ -0,0 +1,124 @@
+# benchmarks/checkout_bench.py
+#
+# Many buyers checking out the same few SKUs at once. Verifies that stock is
+# never oversold (stock + sold == initial stock, and the order_items rows
+# agree) and reports checkouts per second and latency.
+#
+#   python -m benchmarks.checkout_bench --buyers 1000 --concurrency 200 --stock 300 --skus 1
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from shared import database as db
+from benchmarks.backend_bench import BACKEND_FACTORIES
+from benchmarks.load_test import percentile
+
+
+def seed_skus(backend, skus, stock):
+    backend.setup()
+    rows = [(None, f"Flash Sale Item {i}", "Limited stock.", 99, db.DEFAULT_IMAGE_URL, stock, None)
+            for i in range(skus)]
+    backend.upsert_products(rows)
+    with backend.cursor() as (_, cursor):
+        cursor.execute("SELECT id, stock, sold_count FROM products ORDER BY id DESC LIMIT %s", (skus,))
+        return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def run(buyers, concurrency, hot_ids, max_quantity, items_per_order):
+    start_gate = threading.Barrier(min(buyers, concurrency))
+    gate_lock = threading.Lock()
+    passed = set()
+
+    def buy(n):
+        # Hold every worker at the gate once so the first wave arrives together.
+        ident = threading.get_ident()
+        with gate_lock:
+            first = ident not in passed
+            passed.add(ident)
+        if first:
+            try:
+                start_gate.wait(timeout=10)
+            except threading.BrokenBarrierError:
+                pass
+        chosen = random.sample(hot_ids, min(items_per_order, len(hot_ids)))
+        items = [(product_id, '', random.randint(1, max_quantity)) for product_id in chosen]
+        started = time.perf_counter()
+        try:
+            order_id = db.place_order(f"bench-{n}", items)
+            outcome = 'placed' if order_id is not None else 'error'
+        except db.OutOfStock:
+            outcome = 'sold_out'
+        return outcome, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(buy, range(buyers)))
+    return outcomes, time.perf_counter() - started
+
+
+def verify(backend, initial):
+    problems = []
+    ids = list(initial)
+    placeholders = ", ".join(["%s"] * len(ids))
+    with backend.cursor() as (_, cursor):
+        cursor.execute(f"SELECT id, stock, sold_count FROM products WHERE id IN ({placeholders})", ids)
+        current = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        cursor.execute(
+            f"SELECT product_id, SUM(quantity) FROM order_items WHERE product_id IN ({placeholders}) "
+            "GROUP BY product_id", ids)
+        ordered = dict(cursor.fetchall())
+    for product_id, (stock, sold) in initial.items():
+        now_stock, now_sold = current[product_id]
+        units = int(ordered.get(product_id, 0))
+        if now_stock < 0:
+            problems.append(f"product {product_id}: negative stock {now_stock}")
+        if now_stock + (now_sold - sold) != stock:
+            problems.append(f"product {product_id}: stock {now_stock} + sold {now_sold - sold} != {stock}")
+        if units != now_sold - sold:
+            problems.append(f"product {product_id}: order_items {units} != sold {now_sold - sold}")
+    return problems, current
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent checkout correctness and throughput.")
+    parser.add_argument('--backend', default='sqlite-file', choices=sorted(BACKEND_FACTORIES))
+    parser.add_argument('--buyers', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--skus', type=int, default=1, help="hot products everyone is buying")
+    parser.add_argument('--stock', type=int, default=300, help="initial stock per hot product")
+    parser.add_argument('--max-quantity', type=int, default=2)
+    parser.add_argument('--items-per-order', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    backend = db.use_backend(BACKEND_FACTORIES[args.backend]())
+    initial = seed_skus(backend, args.skus, args.stock)
+    outcomes, wall = run(args.buyers, args.concurrency, list(initial), args.max_quantity, args.items_per_order)
+
+    counts = {}
+    for outcome, _ in outcomes:
+        counts[outcome] = counts.get(outcome, 0) + 1
+    latencies = sorted(elapsed * 1000 for _, elapsed in outcomes)
+    problems, current = verify(backend, initial)
+
+    print(f"backend {backend.name}, {args.buyers} buyers, concurrency {args.concurrency}, "
+          f"{args.skus} SKU(s) x {args.stock} units")
+    print(f"placed {counts.get('placed', 0)}, sold out {counts.get('sold_out', 0)}, errors {counts.get('error', 0)}")
+    print(f"checkouts/s {len(outcomes) / wall:.0f} (placed/s {counts.get('placed', 0) / wall:.0f})")
+    print(f"latency p50 {percentile(latencies, 0.5):.2f} ms, p95 {percentile(latencies, 0.95):.2f} ms, "
+          f"p99 {percentile(latencies, 0.99):.2f} ms")
+    print(f"remaining stock {sum(stock for stock, _ in current.values())}")
+    if problems:
+        print("OVERSOLD / INCONSISTENT:")
+        for line in problems:
+            print(f"  {line}")
+        return 1
+    print("Stock consistent: no overselling.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
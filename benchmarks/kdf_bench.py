@@ -0,0 +1,74 @@
+# benchmarks/kdf_bench.py
+#
+# Registrations per second against the password hashing cost. Each run
+# registers users through database.create_user (scrypt hash plus insert) from
+# concurrent threads, with hashing on the calling thread (workers 0) or on
+# the credentials process pool. Use it to pick PUP_SCRYPT_N and
+# PUP_HASH_WORKERS for the expected enrollment peak.
+#
+#   python -m benchmarks.kdf_bench --costs 12 14 15 --workers 0 4 --registrations 200 --concurrency 16
+
+import argparse
+import itertools
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from shared import credentials
+from shared import database as db
+from benchmarks.backend_bench import BACKEND_FACTORIES
+from benchmarks.load_test import percentile
+
+_emails = itertools.count()
+
+
+def register(_):
+    n = next(_emails)
+    start = time.perf_counter()
+    try:
+        user_id = db.create_user(f"KDF Bench {n}", f"kdf{n}@example.com", f"password-{n}")
+    except credentials.CredentialsBusy:
+        user_id = None
+    return time.perf_counter() - start, user_id is not None
+
+
+def run(registrations, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(register, range(registrations)))
+    return outcomes, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registrations per second against the scrypt cost.")
+    parser.add_argument('--backend', default='sqlite-file', choices=sorted(BACKEND_FACTORIES))
+    parser.add_argument('--costs', type=int, nargs='+', default=[12, 14, 15], help="log2 of scrypt N")
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, credentials.HASH_WORKERS],
+                        help="hashing processes; 0 hashes on the request thread")
+    parser.add_argument('--registrations', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    backend = db.use_backend(BACKEND_FACTORIES[args.backend]())
+    backend.setup()
+
+    print(f"r={credentials.SCRYPT_R} p={credentials.SCRYPT_P}, {args.registrations} registrations, "
+          f"{args.concurrency} threads")
+    print(f"{'N':>8}{'MiB/hash':>10}{'workers':>9}{'reg/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+    for cost, workers in itertools.product(args.costs, args.workers):
+        credentials.SCRYPT_N = 2 ** cost
+        credentials.HASH_WORKERS = workers
+        credentials.shutdown()
+        run(max(workers, 1), max(workers, 1))  # start the pool's processes
+        outcomes, wall = run(args.registrations, args.concurrency)
+        latencies = sorted(elapsed * 1000 for elapsed, _ in outcomes)
+        mib = 128 * credentials.SCRYPT_N * credentials.SCRYPT_R / 2 ** 20
+        print(f"{credentials.SCRYPT_N:>8}{mib:>10.0f}{workers:>9}{args.registrations / wall:>9.1f}"
+              f"{percentile(latencies, 0.50):>9.1f}{percentile(latencies, 0.95):>9.1f}"
+              f"{sum(1 for _, ok in outcomes if not ok):>8}")
+    credentials.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# benchmarks/load_test.py
+#
+# Concurrent load against the shop and admin Flask apps through their test
+# clients, on a seeded catalog. Reports latency percentiles, throughput, DB
+# queries per request and peak memory, and writes machine-readable results
+# that a later run can be compared against.
+#
+#   python -m benchmarks.load_test --products 5000 --requests 2000 --concurrency 16 \
+#       --output results.json --baseline previous.json
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from shared import database as db
+from shop_app.web_pages import app as shop_app
+from admin_app.admin_pages import app as admin_app
+from benchmarks.backend_bench import BACKEND_FACTORIES, seed
+
+_emails = itertools.count()
+
+
+def _random_product_id(max_id):
+    return random.randint(1, max_id)
+
+
+def build_scenarios(max_id):
+    # name -> (app, method, path, form data factory)
+    return {
+        'GET /home': (shop_app, 'GET', lambda: '/home', None),
+        'GET /product/<id>': (shop_app, 'GET', lambda: f"/product/{_random_product_id(max_id)}", None),
+        'POST /register': (shop_app, 'POST', lambda: '/register', lambda: {
+            'name': 'Load Test', 'email': f"load{next(_emails)}@example.com",
+            'password': 'secret', 'confirm_password': 'secret',
+        }),
+        'GET /admin': (admin_app, 'GET', lambda: '/admin', None),
+        'POST /admin/action': (admin_app, 'POST', lambda: '/admin/action', lambda: {
+            'action': 'update', 'item_id': str(_random_product_id(max_id)),
+            'item_name': 'Load Test Item', 'quantity': '25', 'price': '99.00',
+        }),
+    }
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def run_scenario(scenario, requests, concurrency):
+    flask_app, method, path_fn, data_fn = scenario
+    backend = db.get_backend()
+    local = threading.local()
+
+    def one_request(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = flask_app.test_client()
+        data = data_fn() if data_fn else None
+        queries_before = backend.thread_query_count()
+        start = time.perf_counter()
+        response = client.open(path_fn(), method=method, data=data)
+        elapsed = time.perf_counter() - start
+        return elapsed, backend.thread_query_count() - queries_before, response.status_code < 400
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one_request, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _ in outcomes)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, _, ok in outcomes if not ok),
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': sum(latencies) / len(latencies),
+        'throughput_rps': requests / wall if wall else 0.0,
+        'queries_per_request': sum(q for _, q, _ in outcomes) / requests,
+    }
+
+
+def measure_peak_memory(scenario, requests, concurrency):
+    # Separate pass: tracemalloc slows allocation-heavy code down, so it must
+    # not run while latencies are being recorded.
+    tracemalloc.start()
+    try:
+        run_scenario(scenario, requests, concurrency)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']:.0f} -> {current['throughput_rps']:.0f} req/s")
+        if current['queries_per_request'] > previous['queries_per_request'] + 0.5:
+            regressions.append(f"{name}: queries/request {previous['queries_per_request']:.2f} -> {current['queries_per_request']:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the shop and admin routes.")
+    parser.add_argument('--backend', default='sqlite-file', choices=sorted(BACKEND_FACTORIES) + ['configured'],
+                        help="'configured' uses PUP_DB_BACKEND as the apps would")
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=1000, help="requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--memory-requests', type=int, default=200)
+    parser.add_argument('--scenario', action='append', help="run only these scenarios (repeatable)")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    if args.backend == 'configured':
+        db.setup_database()
+        seed(db.get_backend(), args.products)
+    else:
+        backend = db.use_backend(BACKEND_FACTORIES[args.backend]())
+        seed(backend, args.products)
+    max_id = db.get_backend().fetch_products_page(1, None, None, ('id',))['items'][0]['id']
+
+    scenarios = build_scenarios(max_id)
+    selected = args.scenario or list(scenarios)
+
+    results = {
+        'meta': {
+            'backend': db.get_backend().name,
+            'products': args.products,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'scenarios': {},
+    }
+
+    print(f"{'scenario':<22}{'p50':>8}{'p95':>8}{'p99':>8}{'req/s':>9}{'q/req':>7}{'peak KiB':>10}{'errors':>8}")
+    for name in selected:
+        scenario = scenarios[name]
+        run_scenario(scenario, min(args.requests, 50), args.concurrency)  # warm caches
+        stats = run_scenario(scenario, args.requests, args.concurrency)
+        stats['peak_memory_kib'] = measure_peak_memory(scenario, args.memory_requests, args.concurrency)
+        results['scenarios'][name] = stats
+        print(f"{name:<22}{stats['p50_ms']:>8.2f}{stats['p95_ms']:>8.2f}{stats['p99_ms']:>8.2f}"
+              f"{stats['throughput_rps']:>9.0f}{stats['queries_per_request']:>7.2f}"
+              f"{stats['peak_memory_kib']:>10.0f}{stats['errors']:>8}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# benchmarks/render_bench.py
+#
+# Render time per route with and without the page shell / fragment cache.
+# The catalog is synthetic so the numbers measure rendering only.
+#
+#   python -m benchmarks.render_bench --products 500 --iterations 200
+
+import argparse
+import statistics
+import time
+from decimal import Decimal
+
+import dominate
+from dominate.tags import meta, link, div
+
+from shared import database as db
+from shared import rendering
+from shop_app import web_pages
+from admin_app import admin_pages
+
+
+def install_synthetic_catalog(count):
+    products = [{
+        'id': i,
+        'name': f"PUP Sample Product {i}",
+        'description': "Synthetic product used for render benchmarks.",
+        'price': Decimal('140.00') + i % 50,
+        'image_url': '/static/images/pup_logo.png',
+        'stock': 100,
+        'variations': 'S,M,L,XL',
+        'sold_count': i % 97,
+    } for i in range(count, 0, -1)]
+    by_id = {p['id']: p for p in products}
+
+    def get_products_page(limit=db.PAGE_SIZE, after=None, before=None, columns=db.LISTING_COLUMNS):
+        rows = [p for p in products if after is None or p['id'] < after][:limit]
+        return {'items': rows, 'next': rows[-1]['id'] if rows else None, 'prev': None}
+
+    db.get_products_page = get_products_page
+    db.get_product_by_id = by_id.get
+    db.catalog_version = lambda: 1
+    return products
+
+
+# The pre-shell implementations, kept here as the "before" baseline.
+def legacy_base_page(page_title, content_div):
+    doc = dominate.document(title=page_title)
+    with doc.head:
+        meta(charset="UTF-8")
+        meta(name="viewport", content="width=device-width, initial-scale=1.0")
+        link(rel="stylesheet", href="/static/css/style.css")
+    with doc.body:
+        with div(cls="container"):
+            content_div(web_pages.app)
+    return doc.render()
+
+
+def legacy_admin_page(page_title, content_func):
+    doc = dominate.document(title=page_title)
+    with doc.head:
+        link(rel="stylesheet", href="/static/css/style.css")
+    with doc.body:
+        with div(cls="container", style="max-width: 750px;"):
+            content_func()
+    return doc.render()
+
+
+def time_route(client, path, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(products, iterations):
+    install_synthetic_catalog(products)
+    routes = [
+        (web_pages.app, '/home'),
+        (web_pages.app, '/product/1'),
+        (web_pages.app, '/'),
+        (admin_pages.app, '/admin'),
+    ]
+    shop_page, admin_page = web_pages.create_base_page, admin_pages.create_admin_page
+
+    results = {}
+    for mode in ('before', 'after'):
+        if mode == 'before':
+            web_pages.create_base_page, admin_pages.create_admin_page = legacy_base_page, legacy_admin_page
+            rendering.FRAGMENT_CACHE_ENABLED = False
+        else:
+            web_pages.create_base_page, admin_pages.create_admin_page = shop_page, admin_page
+            rendering.FRAGMENT_CACHE_ENABLED = True
+        for flask_app, path in routes:
+            client = flask_app.test_client()
+            client.get(path)  # warm-up
+            results.setdefault(path, {})[mode] = time_route(client, path, iterations)
+
+    print(f"{'route':<16}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for path, timing in results.items():
+        speedup = timing['before'] / timing['after'] if timing['after'] else float('inf')
+        print(f"{path:<16}{timing['before']:>12.3f}{timing['after']:>12.3f}{speedup:>9.1f}x")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render time per route, before and after the fragment cache.")
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    run(args.products, args.iterations)
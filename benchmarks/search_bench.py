@@ -0,0 +1,84 @@
+# benchmarks/search_bench.py
+#
+# Build time and query latency of the in-memory search index on a synthetic
+# catalog (no database involved).
+#
+#   python -m benchmarks.search_bench --products 100000
+
+import argparse
+import random
+import time
+
+from shared.search import SearchIndex
+from benchmarks.load_test import percentile
+
+NOUNS = ['lanyard', 'tote', 'bag', 'shirt', 'hoodie', 'sticker', 'mug', 'pin', 'notebook', 'cap',
+         'keychain', 'jacket', 'pamaypay', 'bayong', 'tumbler', 'payong', 'medyas', 'pitaka']
+ADJECTIVES = ['classic', 'minimalist', 'baybayin', 'iskolar', 'maroon', 'vintage', 'premium',
+              'jeepney', 'sablay', 'makabayan', 'bago', 'luma', 'pula', 'dilaw']
+VARIATIONS = ['S,M,L,XL', 'White', 'Cream', 'Black', 'Coquette,Classic', 'Iskolar Script', 'Pula,Dilaw']
+QUERIES = ['tote', 'baybayin lanyard', 'iskolar bag', 'shir', 'hoodi', 'jeepny sticker', 'maroon xl',
+           'pamaypay na pula', 'mga payong', 'sablay pin 42', 'vintage', 'zzz nothing']
+
+
+def synthetic_products(count, seed=7):
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        words = rng.sample(ADJECTIVES, 2) + [rng.choice(NOUNS)]
+        yield {
+            'id': product_id,
+            'name': f"PUP {' '.join(w.title() for w in words)} {product_id}",
+            'description': f"{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS)} para sa mga Iskolar ng Bayan.",
+            'variations': rng.choice(VARIATIONS),
+            'price': rng.randint(20, 900),
+            'image_url': '/static/images/pup_logo.png',
+            'sold_count': rng.randint(0, 5000),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search index build and query latency.")
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    for product in synthetic_products(args.products):
+        index.add(product)
+    print(f"built {len(index)} products, {len(index.terms)} terms in {time.perf_counter() - started:.2f} s")
+
+    # first: impact lists built on demand; uncached: lists built, result
+    # cache bypassed; cached: repeated query served from the result cache.
+    print(f"{'query':<22}{'hits':>6}{'first ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'cached':>10}")
+    for query in QUERIES:
+        start = time.perf_counter()
+        results = index.search(query)
+        first = (time.perf_counter() - start) * 1000
+        samples = []
+        for _ in range(args.iterations):
+            index._results.clear()
+            start = time.perf_counter()
+            index.search(query)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        start = time.perf_counter()
+        index.search(query)
+        cached = (time.perf_counter() - start) * 1000
+        print(f"{query:<22}{len(results):>6}{first:>10.3f}{percentile(samples, 0.5):>10.3f}"
+              f"{percentile(samples, 0.95):>10.3f}{cached:>10.3f}")
+
+    samples = []
+    next_id = args.products + 1
+    for product in synthetic_products(args.iterations, seed=11):
+        product['id'] = next_id
+        next_id += 1
+        start = time.perf_counter()
+        index.add(product)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    print(f"{'incremental add':<22}{'':>16}{percentile(samples, 0.5):>10.3f}{percentile(samples, 0.95):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/startup_bench.py
+#
+# Cold start of a headless app: launches `python -m shared.server <app>` in
+# a fresh interpreter, measures the time until /ready answers and stops it.
+# The first run may apply migrations; later runs only check the version.
+# Exits non-zero when the median is over the budget.
+#
+#   PUP_DB_BACKEND=sqlite python -m benchmarks.startup_bench --runs 5
+
+import argparse
+import signal
+import subprocess
+import sys
+import time
+
+from benchmarks.load_test import percentile
+from shared.server import wait_until_ready
+from shared.startup import STARTUP_BUDGET_MS
+
+
+def cold_start(app, port):
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-m', 'shared.server', app, '--port', str(port)],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_ready(f"http://127.0.0.1:{port}/ready"):
+            return None
+        return (time.perf_counter() - started) * 1000
+    finally:
+        child.send_signal(signal.SIGINT)
+        child.wait(30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold start to ready of a headless app.")
+    parser.add_argument('--app', default='shop', choices=['shop', 'admin'])
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    samples = []
+    for run in range(args.runs):
+        elapsed = cold_start(args.app, args.port)
+        if elapsed is None:
+            print(f"run {run + 1}: server did not become ready")
+            return 1
+        samples.append(elapsed)
+        print(f"run {run + 1}: ready in {elapsed:.0f} ms")
+    samples.sort()
+    median = percentile(samples, 0.5)
+    print(f"{args.app}: median {median:.0f} ms, max {samples[-1]:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    return 0 if median <= args.budget_ms else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
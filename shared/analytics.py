@@ -0,0 +1,75 @@
+# shared/analytics.py
+#
+# Sales and inventory figures for the admin dashboard. Checkouts and admin
+# writes keep summary tables up to date in their own transactions (see
+# StorageBackend.place_order and adjust_inventory_stats): revenue and units
+# per product per day, orders per day, and running inventory totals. The
+# dashboard reads those counters with a fixed handful of queries, so its
+# cost does not grow with the order history. Days follow the database's
+# CURRENT_DATE (UTC on SQLite).
+
+import logging
+import os
+import threading
+import time
+
+from shared import database as db
+from shared.backends import DB_ERRORS
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DAYS = int(os.environ.get('PUP_ANALYTICS_DAYS', 14))
+ANALYTICS_TOP_PRODUCTS = int(os.environ.get('PUP_ANALYTICS_TOP_PRODUCTS', 10))
+LOW_STOCK_THRESHOLD = int(os.environ.get('PUP_LOW_STOCK_THRESHOLD', 5))
+LOW_STOCK_LIMIT = int(os.environ.get('PUP_LOW_STOCK_LIMIT', 25))
+# Seconds a computed dashboard is reused; 0 reads the counters every time.
+ANALYTICS_CACHE_TTL = float(os.environ.get('PUP_ANALYTICS_CACHE_TTL', 5))
+
+_cache = {}  # days -> (computed at, dashboard)
+_lock = threading.Lock()
+
+
+def _load(days):
+    data = db.get_backend().fetch_analytics(days, ANALYTICS_TOP_PRODUCTS, LOW_STOCK_THRESHOLD, LOW_STOCK_LIMIT)
+    sales = data['sales']
+    today = str(data['today'])
+    data['totals'] = {
+        'today': next((row['revenue'] for row in sales if str(row['day']) == today), 0) or 0,
+        'orders': sum(row['order_count'] or 0 for row in sales),
+        'units': sum(row['units'] or 0 for row in sales),
+        'revenue': sum(row['revenue'] or 0 for row in sales),
+    }
+    inventory = data['inventory'] or {}
+    data['inventory'] = {key: inventory.get(key) or 0
+                         for key in ('product_count', 'units_in_stock', 'stock_value')}
+    return data
+
+
+def dashboard(days=ANALYTICS_DAYS):
+    # None when the database is unavailable.
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(days)
+    if cached is not None and now - cached[0] < ANALYTICS_CACHE_TTL:
+        return cached[1]
+    try:
+        data = _load(days)
+    except DB_ERRORS as err:
+        logger.error("Error loading analytics: %s", err)
+        return None
+    with _lock:
+        _cache[days] = (now, data)
+    return data
+
+
+def invalidate():
+    with _lock:
+        _cache.clear()
+
+
+def _on_catalog_change(event, product_id, data):
+    # An admin sees their own edits without waiting for the TTL.
+    invalidate()
+
+
+db.CATALOG_OBSERVERS.append(_on_catalog_change)
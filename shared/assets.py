@@ -0,0 +1,170 @@
+# shared/assets.py
+#
+# Static asset pipeline. At startup every file under assets/ is hashed and
+# given a fingerprinted URL (/assets/css/style.<hash>.css); CSS references to
+# other assets are rewritten to their fingerprinted URLs before the CSS itself
+# is hashed. Text-like files are precompressed with gzip (and brotli, when the
+# optional `brotli` package is installed). Fingerprinted URLs are immutable;
+# plain /static/ URLs still work and revalidate with ETags.
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import Response, abort, request, send_from_directory
+
+from shared.images import ASSETS_DIR, UPLOAD_SUBDIR
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FINGERPRINT_PREFIX = '/assets/'
+STATIC_PREFIX = '/static/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ttf', '.otf', '.json', '.txt', '.html'}
+MIN_COMPRESS_BYTES = 512
+
+_CSS_URL = re.compile(r"""url\((['"]?)(/static/[^'")]+)\1\)""")
+
+
+class Asset:
+    def __init__(self, logical, body):
+        self.logical = logical
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(logical)
+        self.url = f"{FINGERPRINT_PREFIX}{stem}.{self.digest}{ext}"
+        self.mimetype = mimetypes.guess_type(logical)[0] or 'application/octet-stream'
+        if ext == '.ttf':
+            self.mimetype = 'font/ttf'
+        # encoding -> body; identity is always available.
+        self.variants = {'identity': body}
+        if ext in COMPRESSIBLE and len(body) >= MIN_COMPRESS_BYTES:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body)
+                if len(compressed) < len(body):
+                    self.variants['br'] = compressed
+
+
+class Manifest:
+    def __init__(self, root=ASSETS_DIR):
+        self.root = root
+        self.by_logical = {}
+        self.by_url = {}
+        self._build()
+
+    def _build(self):
+        skip = os.path.join(self.root, UPLOAD_SUBDIR)
+        css = []
+        for directory, _, files in os.walk(self.root):
+            if directory.startswith(skip):
+                continue
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                logical = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if logical.endswith('.css'):
+                    css.append((logical, path))
+                    continue
+                with open(path, 'rb') as f:
+                    self._add(Asset(logical, f.read()))
+        # CSS last: its fingerprint covers the rewritten references.
+        for logical, path in css:
+            with open(path, encoding='utf-8') as f:
+                text = _CSS_URL.sub(self._rewrite_css_url, f.read())
+            self._add(Asset(logical, text.encode('utf-8')))
+
+    def _rewrite_css_url(self, match):
+        quote, url = match.group(1), match.group(2)
+        asset = self.by_logical.get(url[len(STATIC_PREFIX):])
+        return f"url({quote}{asset.url if asset else url}{quote})"
+
+    def _add(self, asset):
+        self.by_logical[asset.logical] = asset
+        self.by_url[asset.url[len(FINGERPRINT_PREFIX):]] = asset
+
+    def stats(self):
+        return {
+            'assets': len(self.by_logical),
+            'bytes': sum(len(a.body) for a in self.by_logical.values()),
+            'compressed_bytes': sum(min(len(v) for v in a.variants.values()) for a in self.by_logical.values()),
+        }
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_manifest():
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = Manifest()
+    return _manifest
+
+
+def asset_url(logical):
+    # '/static/css/style.css' or 'css/style.css' -> fingerprinted URL. Files
+    # that were not present at startup keep their plain /static/ URL.
+    if logical.startswith(STATIC_PREFIX):
+        logical = logical[len(STATIC_PREFIX):]
+    asset = get_manifest().by_logical.get(logical)
+    return asset.url if asset else STATIC_PREFIX + logical
+
+
+def _choose_encoding(asset):
+    # The variant with the highest q-value, brotli on a tie; q=0 (or a
+    # wildcard at q=0) refuses an encoding.
+    accepted = request.accept_encodings
+    best, best_quality = 'identity', 0
+    for encoding in ('br', 'gzip'):
+        quality = accepted[encoding]
+        if encoding in asset.variants and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def _asset_response(asset, cache_control):
+    encoding = _choose_encoding(asset)
+    etag = f'"{asset.digest}-{encoding}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding',
+    }
+    if etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(asset.variants[encoding], mimetype=asset.mimetype, headers=headers)
+
+
+def install(app):
+    # Serves /assets/<fingerprinted> (immutable) and /static/<path>
+    # (revalidated via ETag) from the project-level assets/ directory.
+    manifest = get_manifest()
+
+    def fingerprinted(filename):
+        asset = manifest.by_url.get(filename)
+        if asset is None:
+            abort(404)
+        return _asset_response(asset, IMMUTABLE)
+
+    def static(filename):
+        asset = manifest.by_logical.get(filename)
+        if asset is None:
+            # Uploads and files added after startup come straight from disk.
+            return send_from_directory(ASSETS_DIR, filename, conditional=True)
+        return _asset_response(asset, REVALIDATE)
+
+    app.add_url_rule(f'{FINGERPRINT_PREFIX}<path:filename>', 'fingerprinted_asset', fingerprinted)
+    app.add_url_rule(f'{STATIC_PREFIX}<path:filename>', 'static', static)
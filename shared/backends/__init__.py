@@ -0,0 +1,17 @@
+# shared/backends/__init__.py
+
+from shared.backends.base import StorageBackend, DatabaseError, OutOfStock, DB_ERRORS, QUERY_OBSERVERS, split_stock
+
+BACKENDS = ('mysql', 'sqlite')
+
+
+def create_backend(name, **options):
+    # Drivers are imported on demand so an SQLite-only setup does not need
+    # mysql-connector installed.
+    if name == 'mysql':
+        from shared.backends.mysql_backend import MySQLBackend
+        return MySQLBackend(**options)
+    if name == 'sqlite':
+        from shared.backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**options)
+    raise ValueError(f"Unknown database backend {name!r}; expected one of {', '.join(BACKENDS)}")
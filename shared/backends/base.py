@@ -0,0 +1,938 @@
+# shared/backends/base.py
+
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+
+from shared.pool import ConnectionPool, PoolTimeout
+
+
+class DatabaseError(Exception):
+    # Driver errors (mysql.connector.Error, sqlite3.Error, ...) are re-raised
+    # as this type so callers never depend on the configured driver.
+    # `data_error` is True when the statement was rejected for the values it
+    # carried (wrong type, too long, a constraint), so retrying it unchanged
+    # cannot succeed; False for connection and other transient failures.
+    def __init__(self, msg, errno=None, data_error=False):
+        super().__init__(msg)
+        self.msg = msg
+        self.errno = errno
+        self.data_error = data_error
+
+
+class OutOfStock(Exception):
+    # A checkout asked for more units than are left; nothing was written.
+    def __init__(self, product_id, requested):
+        super().__init__(f"Not enough stock for product {product_id} (requested {requested})")
+        self.product_id = product_id
+        self.requested = requested
+
+
+# Everything a data-layer call can fail with.
+DB_ERRORS = (DatabaseError, PoolTimeout)
+
+# Called as observer(backend, sql, params, elapsed_seconds) after every
+# statement, whichever backend ran it. Observers must be cheap and must not
+# raise.
+QUERY_OBSERVERS = []
+
+# Checkouts spread their counter updates over this many rows of
+# sales_by_day and inventory_stats (by order id), so concurrent orders do
+# not all queue on one hot row. Readers sum the slots.
+STATS_SLOTS = 8
+
+
+def split_stock(stock, count):
+    # Spreads a product-level stock over `count` variations, remainder first.
+    share, extra = divmod(max(stock, 0), count)
+    return [share + (1 if n < extra else 0) for n in range(count)]
+
+
+def variation_names(text):
+    # Names from the legacy comma-separated products.variations column.
+    names = []
+    for name in (text or '').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+PLACEHOLDER_PRODUCTS = [
+    ('PUP Minimalist Baybayin Lanyard', 'Stylish lanyard with Baybayin script.', 140.00, '/static/images/product_lanyard_1.png', 100, 'Coquette,Classic', 50),
+    ('PUP Jeepney Signage', 'Fun sticker for your laptop.', 20.00, '/static/images/product_jeepney.png', 200, 'Iskolar Script', 120),
+    ('PUP Iskolar TOTE BAG (V1)', 'Canvas tote bag for every Iskolar.', 160.00, '/static/images/product_tote_1.png', 150, 'White', 30),
+    ('PUP Iskolar TOTE BAG (V2)', 'Another great tote bag design.', 160.00, '/static/images/product_tote_2.png', 150, 'Cream', 45),
+    ('PUP STUDY WITH STYLE Shirt', 'Premium quality shirt.', 450.00, '/static/images/product_shirt.png', 80, 'S,M,L,XL', 22),
+    ('PUP Baybayin Lanyard (Classic)', 'Classic edition lanyard.', 140.00, '/static/images/product_lanyard_2.png', 100, 'Classic', 65),
+]
+
+
+class Cursor:
+    # Thin wrapper over a driver cursor: SQL is written once with %s
+    # placeholders and rows come back as dicts when asked for.
+    def __init__(self, backend, raw, dictionary):
+        self.backend = backend
+        self.raw = raw
+        self.dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self.backend.count_query()
+        start = time.perf_counter()
+        try:
+            self.raw.execute(self.backend.translate(sql), params)
+        finally:
+            self._observe(sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        self.backend.count_query()
+        start = time.perf_counter()
+        try:
+            self.raw.executemany(self.backend.translate(sql), seq_of_params)
+        finally:
+            self._observe(sql, seq_of_params, time.perf_counter() - start)
+
+    def _observe(self, sql, params, elapsed):
+        for observer in QUERY_OBSERVERS:
+            observer(self.backend, sql, params, elapsed)
+
+    def fetchone(self):
+        return self._convert(self.raw.fetchone())
+
+    def fetchall(self):
+        return [self._convert(row) for row in self.raw.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self.raw.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.raw.lastrowid
+
+    def _convert(self, row):
+        if row is None or not self.dictionary or isinstance(row, dict):
+            return row
+        return dict(zip((d[0] for d in self.raw.description), row))
+
+    def close(self):
+        self.raw.close()
+
+
+class StorageBackend:
+    # Repository interface for products and users. SQL shared by every
+    # dialect lives here; subclasses supply connections, DDL and the few
+    # statements whose syntax differs.
+    name = None
+    Error = Exception
+    DataError = ()  # driver errors raised as DatabaseError(data_error=True)
+
+    def __init__(self, pool_size=5, idle_timeout=300, check_after=30, checkout_timeout=10):
+        self.pool = ConnectionPool(
+            self.connect,
+            size=pool_size,
+            validate=self.ping,
+            idle_timeout=idle_timeout,
+            check_after=check_after,
+            checkout_timeout=checkout_timeout,
+        )
+        self._local = threading.local()
+
+    # --- Driver hooks ---
+    def connect(self):
+        raise NotImplementedError
+
+    def ping(self, conn):
+        raise NotImplementedError
+
+    def raw_cursor(self, conn, dictionary):
+        return conn.cursor()
+
+    def translate(self, sql):
+        return sql
+
+    def create_database(self):
+        # Called before the first migration; servers that need the database
+        # created first (MySQL) do it here.
+        pass
+
+    def lock_schema(self, cursor):
+        # Serializes migrations between processes starting at the same time.
+        pass
+
+    def unlock_schema(self, cursor):
+        pass
+
+    def run_migration_statement(self, cursor, statement):
+        cursor.execute(statement)
+
+    def is_transient(self, err):
+        # True for lock conflicts (deadlock, busy database) that are safe to
+        # retry because the failed transaction was rolled back.
+        return False
+
+    def explain(self, sql, params):
+        # The plan of one statement, without running it, as a list of steps:
+        # {'table', 'access', 'rows' (estimate or None), 'full_scan', 'filesort'}.
+        raise NotImplementedError
+
+    # Dialect-specific statements.
+    upsert_product_query = None
+    order_summary_query = None
+    variation_sales_query = None
+    daily_sales_query = None
+    sales_by_day_query = None
+    cart_add_query = None
+    cart_set_query = None
+
+    # Ordered (version, name, steps) tuples; a step is an SQL statement or a
+    # function called with (backend, cursor). Never edit a released
+    # migration: append a new one.
+    migrations = ()
+    schema_migrations_ddl = None
+
+    # --- Schema migrations ---
+    # Applied versions are recorded in schema_migrations, so starting against
+    # an up-to-date database costs one query on a pooled connection.
+    def latest_schema_version(self):
+        return self.migrations[-1][0] if self.migrations else 0
+
+    def schema_version(self):
+        # None when the database or the schema_migrations table is missing.
+        try:
+            with self.cursor() as (_, cursor):
+                cursor.execute("SELECT MAX(version) FROM schema_migrations")
+                return cursor.fetchone()[0] or 0
+        except DatabaseError:
+            return None
+
+    def migrate(self):
+        # Applies missing migrations in order and returns their versions.
+        version = self.schema_version()
+        if version is not None and version >= self.latest_schema_version():
+            return []
+        self.create_database()
+        applied = []
+        with self.cursor() as (conn, cursor):
+            self.lock_schema(cursor)
+            try:
+                cursor.execute(self.schema_migrations_ddl)
+                cursor.execute("SELECT version FROM schema_migrations")
+                done = {row[0] for row in cursor.fetchall()}
+                for version, name, steps in self.migrations:
+                    if version in done:
+                        continue
+                    for step in steps:
+                        if callable(step):
+                            step(self, cursor)
+                        else:
+                            self.run_migration_statement(cursor, step)
+                    cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+                    applied.append(version)
+                    print(f"Applied migration {version}: {name}")
+                conn.commit()
+            finally:
+                self.unlock_schema(cursor)
+        return applied
+
+    def setup(self):
+        applied = self.migrate()
+        if applied:
+            print(f"Database schema at version {applied[-1]} ({self.name}).")
+        return applied
+
+    # --- Connections ---
+    @contextmanager
+    def cursor(self, dictionary=False):
+        try:
+            with self.pool.connection() as conn:
+                raw = self.raw_cursor(conn, dictionary)
+                try:
+                    yield conn, Cursor(self, raw, dictionary)
+                finally:
+                    raw.close()
+        except self.Error as err:
+            raise DatabaseError(str(err), getattr(err, 'errno', None), isinstance(err, self.DataError)) from err
+
+    def close(self):
+        self.pool.close()
+
+    # Statements issued by the calling thread; a Flask request is served on a
+    # single thread, so the difference across a request is its query count.
+    def count_query(self):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def thread_query_count(self):
+        return getattr(self._local, 'queries', 0)
+
+    def seed_placeholder_products(self, cursor):
+        cursor.execute("SELECT COUNT(*) FROM products")
+        if cursor.fetchone()[0] == 0:
+            print("Inserting placeholder products...")
+            cursor.executemany(
+                "INSERT INTO products "
+                "(name, description, price, image_url, stock, variations, sold_count) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                PLACEHOLDER_PRODUCTS
+            )
+            print("Placeholder products inserted.")
+
+    def backfill_analytics(self, cursor):
+        # Rebuilds the analytics counters from orders and products.
+        cursor.execute("DELETE FROM daily_sales")
+        cursor.execute(
+            "INSERT INTO daily_sales (day, product_id, units, revenue) "
+            "SELECT DATE(o.created_at), i.product_id, SUM(i.quantity), SUM(i.quantity * i.unit_price) "
+            "FROM order_items i JOIN orders o ON o.id = i.order_id "
+            "GROUP BY DATE(o.created_at), i.product_id"
+        )
+        cursor.execute("DELETE FROM sales_by_day")
+        cursor.execute(
+            "INSERT INTO sales_by_day (day, slot, order_count, units, revenue) "
+            "SELECT DATE(created_at), 0, COUNT(*), SUM(item_count), SUM(total) FROM orders "
+            "GROUP BY DATE(created_at)"
+        )
+        cursor.execute("DELETE FROM inventory_stats")
+        cursor.execute(
+            "INSERT INTO inventory_stats (slot, product_count, units_in_stock, stock_value) "
+            "SELECT 0, COUNT(*), COALESCE(SUM(stock), 0), COALESCE(SUM(stock * price), 0) FROM products"
+        )
+        cursor.executemany("INSERT INTO inventory_stats (slot) VALUES (%s)",
+                           [(slot,) for slot in range(1, STATS_SLOTS)])
+
+    def backfill_variations(self, cursor):
+        # One product_variations row per name in the legacy column. Stock was
+        # tracked per product only, so it is spread evenly and the products'
+        # totals are unchanged.
+        cursor.execute("DELETE FROM product_variations")
+        cursor.execute("SELECT id, stock, variations FROM products WHERE variations IS NOT NULL")
+        rows = []
+        names_by_product = []
+        for product_id, stock, text in cursor.fetchall():
+            names = variation_names(text)
+            names_by_product.append((','.join(names) or None, product_id))
+            rows.extend((product_id, name, share, 0)
+                        for name, share in zip(names, split_stock(stock, len(names))))
+        if rows:
+            cursor.executemany(
+                "INSERT INTO product_variations (product_id, name, stock, price_delta) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+        if names_by_product:
+            cursor.executemany("UPDATE products SET variations = %s WHERE id = %s", names_by_product)
+
+    # --- Catalog version ---
+    def catalog_version(self):
+        with self.cursor() as (_, cursor):
+            cursor.execute("SELECT version FROM catalog_meta WHERE id = 1")
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def bump_catalog_version(self, cursor):
+        # Runs inside the writer's transaction so the bump commits with the change.
+        cursor.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+
+    # --- Inventory counters ---
+    # Admin writes subtract the affected products' contribution before the
+    # change and add it back after it, in the writer's transaction.
+    def adjust_inventory_stats(self, cursor, product_ids, sign):
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(
+            f"UPDATE inventory_stats SET "
+            f"product_count = product_count + %s * (SELECT COUNT(*) FROM products WHERE id IN ({placeholders})), "
+            f"units_in_stock = units_in_stock + %s * "
+            f"(SELECT COALESCE(SUM(stock), 0) FROM products WHERE id IN ({placeholders})), "
+            f"stock_value = stock_value + %s * "
+            f"(SELECT COALESCE(SUM(stock * price), 0) FROM products WHERE id IN ({placeholders})) "
+            f"WHERE slot = 0",
+            [sign, *product_ids] * 3
+        )
+
+    def stock_level(self):
+        # Units in stock across the catalog. Between two catalog versions only
+        # checkouts change stock, and each one lowers this, so (catalog
+        # version, stock level) identifies the inventory's state.
+        with self.cursor() as (_, cursor):
+            cursor.execute("SELECT SUM(units_in_stock) FROM inventory_stats")
+            return cursor.fetchone()[0] or 0
+
+    # --- Products ---
+    def fetch_all_products(self):
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute("SELECT * FROM products ORDER BY id DESC")
+            return cursor.fetchall()
+
+    def fetch_product(self, product_id):
+        products = self.fetch_products([product_id])
+        return products[0] if products else None
+
+    def fetch_products(self, product_ids):
+        # Products with their variations (as 'variation_list', in the order
+        # they were entered) in one joined query, in id order.
+        if not product_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute(
+                f"SELECT p.*, v.name AS v_name, v.stock AS v_stock, v.price_delta AS v_price_delta "
+                f"FROM products p LEFT JOIN product_variations v ON v.product_id = p.id "
+                f"WHERE p.id IN ({placeholders}) ORDER BY p.id, v.id",
+                list(product_ids)
+            )
+            rows = cursor.fetchall()
+        products = []
+        for row in rows:
+            variation = {'name': row.pop('v_name'), 'stock': row.pop('v_stock'),
+                         'price_delta': row.pop('v_price_delta')}
+            if not products or products[-1]['id'] != row['id']:
+                row['variation_list'] = []
+                products.append(row)
+            if variation['name'] is not None:
+                products[-1]['variation_list'].append(variation)
+        return products
+
+    def fetch_variations(self, product_ids):
+        # {product_id: [variation, ...]} for a page of products.
+        if not product_ids:
+            return {}
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute(
+                f"SELECT product_id, name, stock, price_delta FROM product_variations "
+                f"WHERE product_id IN ({placeholders}) ORDER BY product_id, id",
+                list(product_ids)
+            )
+            rows = cursor.fetchall()
+        variations = {}
+        for row in rows:
+            variations.setdefault(row.pop('product_id'), []).append(row)
+        return variations
+
+    def fetch_product_stock(self, product_id):
+        # Live stock and sold count of one product, with each variation's
+        # stock by name; None if the product does not exist.
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute(
+                "SELECT p.stock, p.sold_count, v.name AS v_name, v.stock AS v_stock "
+                "FROM products p LEFT JOIN product_variations v ON v.product_id = p.id "
+                "WHERE p.id = %s ORDER BY v.id",
+                (product_id,)
+            )
+            rows = cursor.fetchall()
+        if not rows:
+            return None
+        return {
+            'stock': rows[0]['stock'],
+            'sold_count': rows[0]['sold_count'],
+            'variations': {row['v_name']: row['v_stock'] for row in rows if row['v_name'] is not None},
+        }
+
+    def search_products(self, words, limit):
+        # Unindexed fallback for shared.search while its index is being
+        # built: every word appears in the name, variations or description.
+        match = "(LOWER(name) LIKE %s OR LOWER(variations) LIKE %s OR LOWER(description) LIKE %s)"
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute(
+                f"SELECT id, name, price, image_url, sold_count FROM products "
+                f"WHERE {' AND '.join([match] * len(words))} ORDER BY sold_count DESC, id DESC LIMIT %s",
+                [f"%{word}%" for word in words for _ in range(3)] + [limit]
+            )
+            return cursor.fetchall()
+
+    def fetch_products_with_variation(self, name, limit):
+        # Products offering `name` with stock left; served by the
+        # (name, product_id) index.
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute(
+                "SELECT p.id, p.name, p.price + v.price_delta AS price, v.stock "
+                "FROM product_variations v JOIN products p ON p.id = v.product_id "
+                "WHERE v.name = %s AND v.stock > 0 ORDER BY v.product_id DESC LIMIT %s",
+                (name, limit)
+            )
+            return cursor.fetchall()
+
+    def fetch_products_page(self, limit, after, before, columns):
+        select_list = ", ".join(f"`{c}`" for c in columns)
+        with self.cursor(dictionary=True) as (_, cursor):
+            if before is not None:
+                # Walk towards newer rows, then flip back into display order.
+                cursor.execute(
+                    f"SELECT {select_list} FROM products WHERE id > %s ORDER BY id ASC LIMIT %s",
+                    (before, limit + 1)
+                )
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = list(reversed(rows[:limit]))
+                has_newer, has_older = has_more, True
+            else:
+                if after is not None:
+                    cursor.execute(
+                        f"SELECT {select_list} FROM products WHERE id < %s ORDER BY id DESC LIMIT %s",
+                        (after, limit + 1)
+                    )
+                else:
+                    cursor.execute(
+                        f"SELECT {select_list} FROM products ORDER BY id DESC LIMIT %s",
+                        (limit + 1,)
+                    )
+                rows = cursor.fetchall()
+                has_older = len(rows) > limit
+                rows = rows[:limit]
+                has_newer = after is not None
+        return {
+            'items': rows,
+            'next': rows[-1]['id'] if rows and has_older else None,
+            'prev': rows[0]['id'] if rows and has_newer else None,
+        }
+
+    def iter_products(self, batch_size, columns):
+        # Keyset batches in id order; one connection checkout per batch.
+        select_list = ", ".join(f"`{c}`" for c in columns)
+        last_id = 0
+        while True:
+            with self.cursor(dictionary=True) as (_, cursor):
+                cursor.execute(
+                    f"SELECT {select_list} FROM products WHERE id > %s ORDER BY id ASC LIMIT %s",
+                    (last_id, batch_size)
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            if 'variations' in columns:
+                variations = self.fetch_variations([row['id'] for row in rows])
+                for row in rows:
+                    row['variation_list'] = variations.get(row['id'], [])
+            yield from rows
+            last_id = rows[-1]['id']
+
+    def replace_variations(self, cursor, variations_by_product):
+        # Maps product id -> [(name, stock, price_delta), ...] and replaces
+        # each product's set. A product with variations is stocked through
+        # them: its stock becomes their total. An empty list removes them and
+        # leaves the product's stock as it was.
+        product_ids = sorted(variations_by_product)
+        if not product_ids:
+            return
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cursor.execute(f"DELETE FROM product_variations WHERE product_id IN ({placeholders})", product_ids)
+        rows = [(product_id, name, stock, price_delta)
+                for product_id in product_ids
+                for name, stock, price_delta in variations_by_product[product_id]]
+        if rows:
+            cursor.executemany(
+                "INSERT INTO product_variations (product_id, name, stock, price_delta) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+        cursor.executemany(
+            "UPDATE products SET variations = %s, stock = COALESCE(%s, stock) WHERE id = %s",
+            [(','.join(name for name, _, _ in variations_by_product[product_id]) or None,
+              sum(stock for _, stock, _ in variations_by_product[product_id])
+              if variations_by_product[product_id] else None,
+              product_id)
+             for product_id in product_ids]
+        )
+
+    def insert_product(self, name, stock, price, image_url, description, variations=None):
+        with self.cursor() as (conn, cursor):
+            cursor.execute(
+                "INSERT INTO products (name, stock, price, image_url, description) VALUES (%s, %s, %s, %s, %s)",
+                (name, stock, price, image_url, description)
+            )
+            product_id = cursor.lastrowid
+            if variations is not None:
+                self.replace_variations(cursor, {product_id: variations})
+            self.adjust_inventory_stats(cursor, [product_id], 1)
+            self.bump_catalog_version(cursor)
+            conn.commit()
+        return product_id
+
+    def update_product(self, product_id, name, stock, price, image_url=None, variations=None):
+        # `variations` None keeps the product's variations; while it has any,
+        # `stock` is ignored in favour of their total.
+        with self.cursor() as (conn, cursor):
+            self.adjust_inventory_stats(cursor, [product_id], -1)
+            cursor.execute(
+                "UPDATE products SET name = %s, price = %s, image_url = COALESCE(%s, image_url), "
+                "stock = CASE WHEN variations IS NULL THEN %s ELSE stock END WHERE id = %s",
+                (name, price, image_url, stock, product_id)
+            )
+            if variations is not None and cursor.rowcount:
+                self.replace_variations(cursor, {product_id: variations})
+            self.adjust_inventory_stats(cursor, [product_id], 1)
+            self.bump_catalog_version(cursor)
+            conn.commit()
+
+    def delete_product(self, product_id):
+        with self.cursor() as (conn, cursor):
+            self.adjust_inventory_stats(cursor, [product_id], -1)
+            cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
+            cursor.execute("DELETE FROM product_variations WHERE product_id = %s", (product_id,))
+            self.bump_catalog_version(cursor)
+            conn.commit()
+
+    def upsert_products(self, rows):
+        # Rows are (id, name, description, price, image_url, stock, variations)
+        # where variations is None (keep) or [(name, stock, price_delta), ...]
+        # whose stocks add up to the row's. Rows without an id are always
+        # new, so their counters come from the row values rather than a
+        # re-read; those with variations are inserted one by one for their ids.
+        product_ids = sorted({row[0] for row in rows if row[0] is not None})
+        new_rows = [row for row in rows if row[0] is None]
+        params = lambda row: row[:6] + (None if row[6] is None else ','.join(v[0] for v in row[6]) or None,)
+        variations = {row[0]: row[6] for row in rows if row[0] is not None and row[6] is not None}
+        with self.cursor() as (conn, cursor):
+            self.adjust_inventory_stats(cursor, product_ids, -1)
+            batched = [params(row) for row in rows if row[0] is not None or row[6] is None]
+            if batched:
+                cursor.executemany(self.upsert_product_query, batched)
+            for row in rows:
+                if row[0] is None and row[6] is not None:
+                    cursor.execute(self.upsert_product_query, params(row))
+                    variations[cursor.lastrowid] = row[6]
+            self.replace_variations(cursor, variations)
+            self.adjust_inventory_stats(cursor, product_ids, 1)
+            if new_rows:
+                cursor.execute(
+                    "UPDATE inventory_stats SET product_count = product_count + %s, "
+                    "units_in_stock = units_in_stock + %s, stock_value = stock_value + %s WHERE slot = 0",
+                    (len(new_rows), sum(row[5] for row in new_rows), sum(row[5] * row[3] for row in new_rows))
+                )
+            self.bump_catalog_version(cursor)
+            conn.commit()
+
+    # --- Users ---
+    def insert_user(self, name, email, password_hash):
+        with self.cursor() as (conn, cursor):
+            cursor.execute(
+                "INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)",
+                (name, email, password_hash)
+            )
+            user_id = cursor.lastrowid
+            conn.commit()
+        return user_id
+
+    def fetch_user_credentials(self, email):
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute("SELECT id, password_hash FROM users WHERE email = %s", (email,))
+            return cursor.fetchone()
+
+    def update_password_hash(self, user_id, old_hash, new_hash):
+        # Only replaces the hash that was verified, so a concurrent password
+        # change is not overwritten. Returns whether it was replaced.
+        with self.cursor() as (conn, cursor):
+            cursor.execute(
+                "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (new_hash, user_id, old_hash)
+            )
+            updated = cursor.rowcount
+            conn.commit()
+        return updated > 0
+
+    # --- Events ---
+    def insert_events(self, batches):
+        # Writes queued events in one transaction. `batches` maps a table to
+        # (columns, rows); both come from shared.events, never from input.
+        with self.cursor() as (conn, cursor):
+            for table, (columns, rows) in batches.items():
+                placeholders = ", ".join(["%s"] * len(columns))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                    rows
+                )
+            conn.commit()
+
+    # --- Carts ---
+    def save_carts(self, carts):
+        # Replaces the stored contents of each cart in one transaction.
+        # `carts` maps session id -> [(product_id, variation, quantity), ...].
+        if not carts:
+            return
+        session_ids = list(carts)
+        rows = [(sid, product_id, variation, quantity)
+                for sid, items in carts.items()
+                for product_id, variation, quantity in items if quantity > 0]
+        placeholders = ", ".join(["%s"] * len(session_ids))
+        with self.cursor() as (conn, cursor):
+            cursor.execute(f"DELETE FROM carts WHERE session_id IN ({placeholders})", session_ids)
+            if rows:
+                cursor.executemany(
+                    "INSERT INTO carts (session_id, product_id, variation, quantity) VALUES (%s, %s, %s, %s)",
+                    rows
+                )
+            conn.commit()
+
+    def add_cart_item(self, session_id, product_id, variation, quantity, max_quantity):
+        # Adds to one line in a single statement, capped at `max_quantity`,
+        # so concurrent adds to the same cart from different workers all count.
+        with self.cursor() as (conn, cursor):
+            cursor.execute(self.cart_add_query,
+                           (session_id, product_id, variation, min(quantity, max_quantity), max_quantity))
+            conn.commit()
+
+    def set_cart_item(self, session_id, product_id, variation, quantity):
+        # Sets or (quantity <= 0) removes one line, leaving the others alone.
+        with self.cursor() as (conn, cursor):
+            if quantity <= 0:
+                cursor.execute(
+                    "DELETE FROM carts WHERE session_id = %s AND product_id = %s AND variation = %s",
+                    (session_id, product_id, variation)
+                )
+            else:
+                cursor.execute(self.cart_set_query, (session_id, product_id, variation, quantity))
+            conn.commit()
+
+    def load_cart(self, session_id):
+        with self.cursor() as (_, cursor):
+            cursor.execute(
+                "SELECT product_id, variation, quantity FROM carts WHERE session_id = %s ORDER BY product_id",
+                (session_id,)
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    # --- Orders ---
+    def place_order(self, session_id, user_id, items):
+        # `items` is [(product_id, variation, quantity), ...]. Each product's
+        # stock is taken with a conditional UPDATE, so concurrent buyers can
+        # never push it below zero; products are updated in id order so two
+        # checkouts always lock rows in the same order. Lines with a variation
+        # also take that variation's stock (a unique-key lookup), after the
+        # product row; lines without one only fit products without
+        # variations. Any shortfall rolls the whole order back.
+        wanted = {}
+        by_variation = {}
+        plain = set()
+        for product_id, variation, quantity in items:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+            if variation:
+                key = (product_id, variation)
+                by_variation[key] = by_variation.get(key, 0) + quantity
+            else:
+                plain.add(product_id)
+        product_ids = sorted(wanted)
+        with self.cursor() as (conn, cursor):
+            for product_id in product_ids:
+                cursor.execute(
+                    "UPDATE products SET stock = stock - %s, sold_count = sold_count + %s "
+                    "WHERE id = %s AND stock >= %s" + (" AND variations IS NULL" if product_id in plain else ""),
+                    (wanted[product_id], wanted[product_id], product_id, wanted[product_id])
+                )
+                if cursor.rowcount != 1:
+                    conn.rollback()
+                    raise OutOfStock(product_id, wanted[product_id])
+            for product_id, variation in sorted(by_variation):
+                quantity = by_variation[(product_id, variation)]
+                cursor.execute(
+                    "UPDATE product_variations SET stock = stock - %s "
+                    "WHERE product_id = %s AND name = %s AND stock >= %s",
+                    (quantity, product_id, variation, quantity)
+                )
+                if cursor.rowcount != 1:
+                    conn.rollback()
+                    raise OutOfStock(product_id, quantity)
+
+            placeholders = ", ".join(["%s"] * len(product_ids))
+            cursor.execute(f"SELECT id, price, sold_count FROM products WHERE id IN ({placeholders})", product_ids)
+            rows = cursor.fetchall()
+            prices = {row[0]: row[1] for row in rows}
+            sold = {row[0]: {'sold_count': row[2], 'variations': {}} for row in rows}
+            deltas = {}
+            if by_variation:
+                cursor.execute(
+                    f"SELECT product_id, name, price_delta FROM product_variations "
+                    f"WHERE product_id IN ({placeholders})", product_ids)
+                deltas = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+            unit_prices = {(product_id, variation): prices[product_id] + deltas.get((product_id, variation), 0)
+                           for product_id, variation, _ in items}
+            total = sum(unit_prices[(product_id, variation)] * quantity for product_id, variation, quantity in items)
+            # Stock is valued at base prices (see inventory_stats).
+            stock_value = sum(prices[product_id] * quantity for product_id, quantity in wanted.items())
+
+            cursor.execute(
+                "INSERT INTO orders (user_id, session_id, status, total, item_count) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                (user_id, session_id, 'placed', total, sum(wanted.values()))
+            )
+            order_id = cursor.lastrowid
+            if user_id is not None:
+                cursor.execute(self.order_summary_query, (user_id, sum(wanted.values()), total))
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, product_id, variation, quantity, unit_price) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [(order_id, product_id, variation, quantity, unit_prices[(product_id, variation)])
+                 for product_id, variation, quantity in items]
+            )
+
+            if by_variation:
+                keys = sorted(by_variation)
+                cursor.executemany(self.variation_sales_query,
+                                   [(product_id, variation, by_variation[(product_id, variation)])
+                                    for product_id, variation in keys])
+                cursor.execute(
+                    f"SELECT product_id, variation, sold_count FROM product_variation_sales "
+                    f"WHERE product_id IN ({placeholders})", product_ids)
+                for product_id, variation, count in cursor.fetchall():
+                    if (product_id, variation) in by_variation:
+                        sold[product_id]['variations'][variation] = count
+
+            # Analytics counters, striped by order id.
+            slot = order_id % STATS_SLOTS
+            revenue = {}
+            for product_id, variation, quantity in items:
+                revenue[product_id] = revenue.get(product_id, 0) + unit_prices[(product_id, variation)] * quantity
+            cursor.executemany(self.daily_sales_query,
+                               [(product_id, wanted[product_id], revenue[product_id]) for product_id in product_ids])
+            cursor.execute(self.sales_by_day_query, (slot, sum(wanted.values()), total))
+            cursor.execute(
+                "UPDATE inventory_stats SET units_in_stock = units_in_stock - %s, stock_value = stock_value - %s "
+                "WHERE slot = %s",
+                (sum(wanted.values()), stock_value, slot)
+            )
+            conn.commit()
+        # `sold` holds the committed sold counts of every product (and
+        # variation) in the order, for in-memory rankings.
+        return order_id, total, sold
+
+    def fetch_top_sellers(self, limit):
+        # Served by the sold_count index: reads `limit` index entries.
+        with self.cursor() as (_, cursor):
+            cursor.execute("SELECT id, sold_count FROM products ORDER BY sold_count DESC, id DESC LIMIT %s", (limit,))
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def fetch_variation_names(self):
+        # Every variation name in the catalog, from the (name, product_id) index.
+        with self.cursor() as (_, cursor):
+            cursor.execute("SELECT DISTINCT name FROM product_variations")
+            return [row[0] for row in cursor.fetchall()]
+
+    def fetch_top_variation_sellers(self, variation, limit):
+        with self.cursor() as (_, cursor):
+            cursor.execute(
+                "SELECT product_id, sold_count FROM product_variation_sales WHERE variation = %s "
+                "ORDER BY sold_count DESC, product_id DESC LIMIT %s",
+                (variation, limit)
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+
+    def fetch_order(self, order_id):
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute("SELECT * FROM orders WHERE id = %s", (order_id,))
+            order = cursor.fetchone()
+            if order is None:
+                return None
+            cursor.execute(
+                "SELECT oi.product_id, oi.variation, oi.quantity, oi.unit_price, p.name "
+                "FROM order_items oi LEFT JOIN products p ON p.id = oi.product_id "
+                "WHERE oi.order_id = %s ORDER BY oi.id",
+                (order_id,)
+            )
+            order['items'] = cursor.fetchall()
+        return order
+
+    def fetch_orders_page(self, user_id, limit, after, before):
+        # Keyset pagination over one user's orders, newest first, served by
+        # the (user_id, created_at) index. `after`/`before` are (created_at,
+        # id) positions; id breaks ties between orders placed the same second.
+        columns = "id, status, total, item_count, created_at"
+        with self.cursor(dictionary=True) as (_, cursor):
+            if before is not None:
+                cursor.execute(
+                    f"SELECT {columns} FROM orders WHERE user_id = %s "
+                    "AND (created_at > %s OR (created_at = %s AND id > %s)) "
+                    "ORDER BY created_at ASC, id ASC LIMIT %s",
+                    (user_id, before[0], before[0], before[1], limit + 1)
+                )
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = list(reversed(rows[:limit]))
+                has_newer, has_older = has_more, True
+            else:
+                if after is not None:
+                    cursor.execute(
+                        f"SELECT {columns} FROM orders WHERE user_id = %s "
+                        "AND (created_at < %s OR (created_at = %s AND id < %s)) "
+                        "ORDER BY created_at DESC, id DESC LIMIT %s",
+                        (user_id, after[0], after[0], after[1], limit + 1)
+                    )
+                else:
+                    cursor.execute(
+                        f"SELECT {columns} FROM orders WHERE user_id = %s "
+                        "ORDER BY created_at DESC, id DESC LIMIT %s",
+                        (user_id, limit + 1)
+                    )
+                rows = cursor.fetchall()
+                has_older = len(rows) > limit
+                rows = rows[:limit]
+                has_newer = after is not None
+        return {
+            'items': rows,
+            'next': (str(rows[-1]['created_at']), rows[-1]['id']) if rows and has_older else None,
+            'prev': (str(rows[0]['created_at']), rows[0]['id']) if rows and has_newer else None,
+        }
+
+    def fetch_order_summary(self, user_id):
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute(
+                "SELECT order_count, item_count, total_spent FROM order_summaries WHERE user_id = %s",
+                (user_id,)
+            )
+            return cursor.fetchone()
+
+    # --- Analytics ---
+    def fetch_analytics(self, days, top_limit, low_stock, low_stock_limit):
+        # Reads the pre-aggregated counters: a fixed number of queries over
+        # at most `days` days of summary rows, whatever the order volume.
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute("SELECT CURRENT_DATE AS today")
+            today = datetime.date.fromisoformat(str(cursor.fetchone()['today']))
+            start = (today - datetime.timedelta(days=days - 1)).isoformat()
+            cursor.execute(
+                "SELECT day, SUM(order_count) AS order_count, SUM(units) AS units, SUM(revenue) AS revenue "
+                "FROM sales_by_day WHERE day >= %s GROUP BY day ORDER BY day DESC",
+                (start,)
+            )
+            sales = cursor.fetchall()
+            cursor.execute(
+                "SELECT d.product_id, p.name, SUM(d.units) AS units, SUM(d.revenue) AS revenue "
+                "FROM daily_sales d LEFT JOIN products p ON p.id = d.product_id "
+                "WHERE d.day >= %s GROUP BY d.product_id, p.name "
+                "ORDER BY revenue DESC, d.product_id DESC LIMIT %s",
+                (start, top_limit)
+            )
+            top_products = cursor.fetchall()
+            cursor.execute(
+                "SELECT v.product_id, p.name, v.variation, v.sold_count "
+                "FROM product_variation_sales v LEFT JOIN products p ON p.id = v.product_id "
+                "ORDER BY v.sold_count DESC, v.product_id DESC LIMIT %s",
+                (top_limit,)
+            )
+            top_variations = cursor.fetchall()
+            # Products without variations by their own stock, the others by
+            # each variation's: one size running out is worth flagging even
+            # when the product's total looks healthy.
+            cursor.execute(
+                "SELECT id, name, NULL AS variation, stock, price FROM products "
+                "WHERE stock <= %s AND NOT EXISTS (SELECT 1 FROM product_variations v WHERE v.product_id = products.id) "
+                "UNION ALL "
+                "SELECT p.id, p.name, v.name, v.stock, p.price + v.price_delta "
+                "FROM product_variations v JOIN products p ON p.id = v.product_id WHERE v.stock <= %s "
+                "ORDER BY stock, id LIMIT %s",
+                (low_stock, low_stock, low_stock_limit)
+            )
+            low = cursor.fetchall()
+            cursor.execute(
+                "SELECT SUM(product_count) AS product_count, SUM(units_in_stock) AS units_in_stock, "
+                "SUM(stock_value) AS stock_value FROM inventory_stats"
+            )
+            inventory = cursor.fetchone()
+        return {
+            'today': today,
+            'start': start,
+            'sales': sales,
+            'top_products': top_products,
+            'top_variations': top_variations,
+            'low_stock': low,
+            'inventory': inventory,
+        }
@@ -0,0 +1,319 @@
+# shared/backends/mysql_backend.py
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from shared.backends.base import StorageBackend, DatabaseError
+
+DB_CONFIG = {
+    'user': 'root',
+    'password': 'Test1234!',
+    'host': '127.0.0.1',
+}
+DB_NAME = 'pup_shop_db'
+
+TABLES = {}
+TABLES['users'] = (
+    "CREATE TABLE `users` ("
+    "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+    "  `name` varchar(255) NOT NULL,"
+    "  `email` varchar(255) NOT NULL UNIQUE,"
+    "  `password_hash` varchar(255) NOT NULL,"
+    "  `address1` text,"
+    "  `address2` text,"
+    "  PRIMARY KEY (`id`)"
+    ") ENGINE=InnoDB")
+
+TABLES['products'] = (
+    "CREATE TABLE `products` ("
+    "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+    "  `name` varchar(255) NOT NULL,"
+    "  `description` text,"
+    "  `price` decimal(10, 2) NOT NULL,"
+    "  `image_url` varchar(255) NOT NULL,"
+    "  `stock` int(11) NOT NULL DEFAULT 0,"
+    "  `variations` varchar(255),"
+    "  `sold_count` INT NOT NULL DEFAULT 0,"
+    "  PRIMARY KEY (`id`),"
+    "  KEY `idx_products_sold_count` (`sold_count`)"
+    ") ENGINE=InnoDB")
+
+TABLES['catalog_meta'] = (
+    "CREATE TABLE `catalog_meta` ("
+    "  `id` tinyint NOT NULL,"
+    "  `version` bigint NOT NULL DEFAULT 0,"
+    "  PRIMARY KEY (`id`)"
+    ") ENGINE=InnoDB")
+
+TABLES['carts'] = (
+    "CREATE TABLE `carts` ("
+    "  `session_id` varchar(64) NOT NULL,"
+    "  `product_id` int(11) NOT NULL,"
+    "  `variation` varchar(255) NOT NULL DEFAULT '',"
+    "  `quantity` int(11) NOT NULL,"
+    "  `updated_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,"
+    "  PRIMARY KEY (`session_id`, `product_id`, `variation`),"
+    "  KEY `idx_carts_updated_at` (`updated_at`)"
+    ") ENGINE=InnoDB")
+
+TABLES['orders'] = (
+    "CREATE TABLE `orders` ("
+    "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+    "  `user_id` int(11),"
+    "  `session_id` varchar(64),"
+    "  `status` varchar(20) NOT NULL DEFAULT 'placed',"
+    "  `total` decimal(12, 2) NOT NULL,"
+    "  `item_count` int(11) NOT NULL,"
+    "  `created_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+    "  PRIMARY KEY (`id`),"
+    "  KEY `idx_orders_session_id` (`session_id`),"
+    "  KEY `idx_orders_user_created` (`user_id`, `created_at`)"
+    ") ENGINE=InnoDB")
+
+TABLES['order_items'] = (
+    "CREATE TABLE `order_items` ("
+    "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+    "  `order_id` int(11) NOT NULL,"
+    "  `product_id` int(11) NOT NULL,"
+    "  `variation` varchar(255) NOT NULL DEFAULT '',"
+    "  `quantity` int(11) NOT NULL,"
+    "  `unit_price` decimal(10, 2) NOT NULL,"
+    "  PRIMARY KEY (`id`),"
+    "  KEY `idx_order_items_order_id` (`order_id`),"
+    "  CONSTRAINT `fk_order_items_order` FOREIGN KEY (`order_id`) REFERENCES `orders` (`id`) ON DELETE CASCADE"
+    ") ENGINE=InnoDB")
+
+TABLES['order_summaries'] = (
+    "CREATE TABLE `order_summaries` ("
+    "  `user_id` int(11) NOT NULL,"
+    "  `order_count` int(11) NOT NULL DEFAULT 0,"
+    "  `item_count` int(11) NOT NULL DEFAULT 0,"
+    "  `total_spent` decimal(14, 2) NOT NULL DEFAULT 0,"
+    "  `last_order_at` datetime,"
+    "  PRIMARY KEY (`user_id`)"
+    ") ENGINE=InnoDB")
+
+TABLES['product_variation_sales'] = (
+    "CREATE TABLE `product_variation_sales` ("
+    "  `product_id` int(11) NOT NULL,"
+    "  `variation` varchar(255) NOT NULL,"
+    "  `sold_count` int(11) NOT NULL DEFAULT 0,"
+    "  PRIMARY KEY (`product_id`, `variation`),"
+    "  KEY `idx_variation_sales_rank` (`variation`, `sold_count`)"
+    ") ENGINE=InnoDB")
+
+# Indexes added after the first release; CREATE TABLE above only applies to
+# new databases.
+INDEXES = {
+    'idx_products_sold_count': "ALTER TABLE `products` ADD INDEX `idx_products_sold_count` (`sold_count`)",
+}
+
+SCHEMA_MIGRATIONS = (
+    "CREATE TABLE IF NOT EXISTS `schema_migrations` ("
+    "  `version` int(11) NOT NULL,"
+    "  `name` varchar(255) NOT NULL,"
+    "  `applied_at` datetime NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+    "  PRIMARY KEY (`version`)"
+    ") ENGINE=InnoDB")
+
+# Version 1 is the schema as it stood when migrations were introduced. Its
+# statements run against databases created before then too, so "already
+# exists" errors are skipped (see run_migration_statement).
+MIGRATIONS = (
+    (1, 'baseline', list(TABLES.values()) + list(INDEXES.values()) + [
+        "INSERT IGNORE INTO catalog_meta (id, version) VALUES (1, 0)",
+        StorageBackend.seed_placeholder_products,
+    ]),
+    (2, 'event ingestion tables', [
+        "CREATE TABLE `feedback` ("
+        "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+        "  `name` varchar(255),"
+        "  `email` varchar(255),"
+        "  `message` text NOT NULL,"
+        "  `created_at` datetime NOT NULL,"
+        "  PRIMARY KEY (`id`)"
+        ") ENGINE=InnoDB",
+        "CREATE TABLE `events` ("
+        "  `id` bigint NOT NULL AUTO_INCREMENT,"
+        "  `kind` varchar(32) NOT NULL,"
+        "  `session_id` varchar(64),"
+        "  `user_id` int(11),"
+        "  `product_id` int(11),"
+        "  `quantity` int(11),"
+        "  `path` varchar(255),"
+        "  `created_at` datetime NOT NULL,"
+        "  PRIMARY KEY (`id`),"
+        "  KEY `idx_events_created_at` (`created_at`)"
+        ") ENGINE=InnoDB",
+        "CREATE TABLE `email_outbox` ("
+        "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+        "  `user_id` int(11),"
+        "  `email` varchar(255) NOT NULL,"
+        "  `template` varchar(64) NOT NULL,"
+        "  `created_at` datetime NOT NULL,"
+        "  `sent_at` datetime,"
+        "  PRIMARY KEY (`id`),"
+        "  KEY `idx_email_outbox_sent_at` (`sent_at`)"
+        ") ENGINE=InnoDB",
+    ]),
+    (3, 'analytics summary tables', [
+        "CREATE TABLE `daily_sales` ("
+        "  `day` date NOT NULL,"
+        "  `product_id` int(11) NOT NULL,"
+        "  `units` int(11) NOT NULL DEFAULT 0,"
+        "  `revenue` decimal(14, 2) NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (`day`, `product_id`)"
+        ") ENGINE=InnoDB",
+        "CREATE TABLE `sales_by_day` ("
+        "  `day` date NOT NULL,"
+        "  `slot` tinyint NOT NULL,"
+        "  `order_count` int(11) NOT NULL DEFAULT 0,"
+        "  `units` int(11) NOT NULL DEFAULT 0,"
+        "  `revenue` decimal(14, 2) NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (`day`, `slot`)"
+        ") ENGINE=InnoDB",
+        "CREATE TABLE `inventory_stats` ("
+        "  `slot` tinyint NOT NULL,"
+        "  `product_count` int(11) NOT NULL DEFAULT 0,"
+        "  `units_in_stock` bigint NOT NULL DEFAULT 0,"
+        "  `stock_value` decimal(16, 2) NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (`slot`)"
+        ") ENGINE=InnoDB",
+        "ALTER TABLE `products` ADD INDEX `idx_products_stock` (`stock`)",
+        "ALTER TABLE `product_variation_sales` ADD INDEX `idx_variation_sales_sold` (`sold_count`)",
+        StorageBackend.backfill_analytics,
+    ]),
+    (4, 'product variations', [
+        "CREATE TABLE `product_variations` ("
+        "  `id` int(11) NOT NULL AUTO_INCREMENT,"
+        "  `product_id` int(11) NOT NULL,"
+        "  `name` varchar(255) NOT NULL,"
+        "  `stock` int(11) NOT NULL DEFAULT 0,"
+        "  `price_delta` decimal(10, 2) NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (`id`),"
+        "  UNIQUE KEY `uq_product_variations` (`product_id`, `name`),"
+        "  KEY `idx_product_variations_name` (`name`, `product_id`)"
+        ") ENGINE=InnoDB",
+        StorageBackend.backfill_variations,
+    ]),
+)
+
+# Errors that mean a migration statement already took effect.
+ALREADY_APPLIED_ERRNOS = (errorcode.ER_TABLE_EXISTS_ERROR, errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME)
+SCHEMA_LOCK = 'pup_shop_schema'
+SCHEMA_LOCK_TIMEOUT = 60
+
+# Deadlock and lock wait timeout: InnoDB rolled the transaction back.
+TRANSIENT_ERRNOS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+class MySQLBackend(StorageBackend):
+    name = 'mysql'
+    Error = mysql.connector.Error
+    DataError = (mysql.connector.DataError, mysql.connector.IntegrityError)
+
+    # Blank description/variations/image_url keep the stored value on update.
+    # Stock of a product with variations is their total (set afterwards by
+    # replace_variations); stock is assigned before variations changes.
+    upsert_product_query = (
+        "INSERT INTO products (id, name, description, price, image_url, stock, variations) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE "
+        "name = VALUES(name), price = VALUES(price), "
+        "stock = IF(variations IS NULL, VALUES(stock), stock), "
+        "description = COALESCE(VALUES(description), description), "
+        "variations = COALESCE(VALUES(variations), variations), "
+        "image_url = IF(VALUES(image_url) = '', image_url, VALUES(image_url))"
+    )
+
+    order_summary_query = (
+        "INSERT INTO order_summaries (user_id, order_count, item_count, total_spent, last_order_at) "
+        "VALUES (%s, 1, %s, %s, CURRENT_TIMESTAMP) "
+        "ON DUPLICATE KEY UPDATE "
+        "order_count = order_count + 1, item_count = item_count + VALUES(item_count), "
+        "total_spent = total_spent + VALUES(total_spent), last_order_at = VALUES(last_order_at)"
+    )
+
+    variation_sales_query = (
+        "INSERT INTO product_variation_sales (product_id, variation, sold_count) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE sold_count = sold_count + VALUES(sold_count)"
+    )
+
+    daily_sales_query = (
+        "INSERT INTO daily_sales (day, product_id, units, revenue) VALUES (CURRENT_DATE, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE units = units + VALUES(units), revenue = revenue + VALUES(revenue)"
+    )
+
+    sales_by_day_query = (
+        "INSERT INTO sales_by_day (day, slot, order_count, units, revenue) VALUES (CURRENT_DATE, %s, 1, %s, %s) "
+        "ON DUPLICATE KEY UPDATE "
+        "order_count = order_count + 1, units = units + VALUES(units), revenue = revenue + VALUES(revenue)"
+    )
+
+    cart_add_query = (
+        "INSERT INTO carts (session_id, product_id, variation, quantity) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE quantity = LEAST(%s, quantity + VALUES(quantity))"
+    )
+
+    cart_set_query = (
+        "INSERT INTO carts (session_id, product_id, variation, quantity) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)"
+    )
+
+    migrations = MIGRATIONS
+    schema_migrations_ddl = SCHEMA_MIGRATIONS
+
+    def __init__(self, config=None, database=DB_NAME, **pool_options):
+        self.config = dict(config or DB_CONFIG)
+        self.database = database
+        super().__init__(**pool_options)
+
+    def connect(self):
+        return mysql.connector.connect(database=self.database, **self.config)
+
+    def ping(self, conn):
+        conn.ping(reconnect=False)
+
+    def is_transient(self, err):
+        return err.errno in TRANSIENT_ERRNOS
+
+    def raw_cursor(self, conn, dictionary):
+        return conn.cursor(dictionary=dictionary)
+
+    def create_database(self):
+        try:
+            cnx = mysql.connector.connect(**self.config)
+            try:
+                cnx.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {self.database} DEFAULT CHARACTER SET 'utf8'")
+            finally:
+                cnx.close()
+        except mysql.connector.Error as err:
+            raise DatabaseError(str(err), err.errno) from err
+
+    def explain(self, sql, params):
+        with self.cursor(dictionary=True) as (_, cursor):
+            cursor.execute("EXPLAIN " + sql, params)
+            rows = cursor.fetchall()
+        return [{
+            'table': row['table'],
+            'access': f"{row['type']} via {row['key']}" if row['key'] else row['type'],
+            'rows': row['rows'],
+            'full_scan': row['type'] == 'ALL',
+            'filesort': 'filesort' in (row['Extra'] or '') or 'temporary' in (row['Extra'] or ''),
+        } for row in rows]
+
+    def lock_schema(self, cursor):
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (SCHEMA_LOCK, SCHEMA_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise DatabaseError("Timed out waiting for another process to finish migrating")
+
+    def unlock_schema(self, cursor):
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK,))
+        cursor.fetchone()
+
+    def run_migration_statement(self, cursor, statement):
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as err:
+            if err.errno not in ALREADY_APPLIED_ERRNOS:
+                raise
@@ -0,0 +1,331 @@
+# shared/backends/sqlite_backend.py
+
+import re
+import sqlite3
+import threading
+import uuid
+from decimal import Decimal
+
+from shared.backends.base import StorageBackend
+
+# For explain(): table references with optional aliases, and scan steps.
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIASES = {'WHERE', 'ON', 'SET', 'JOIN', 'LEFT', 'INNER', 'GROUP', 'ORDER', 'LIMIT', 'VALUES', 'SELECT'}
+_SCAN = re.compile(r"SCAN (?:TABLE )?(\w+)")
+
+# SQLite has no DECIMAL type; store prices as exact text, read back as numbers.
+sqlite3.register_adapter(Decimal, str)
+
+TABLES = {}
+TABLES['users'] = (
+    "CREATE TABLE IF NOT EXISTS users ("
+    "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "  name TEXT NOT NULL,"
+    "  email TEXT NOT NULL UNIQUE,"
+    "  password_hash TEXT NOT NULL,"
+    "  address1 TEXT,"
+    "  address2 TEXT"
+    ")")
+
+TABLES['products'] = (
+    "CREATE TABLE IF NOT EXISTS products ("
+    "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "  name TEXT NOT NULL,"
+    "  description TEXT,"
+    "  price NUMERIC NOT NULL,"
+    "  image_url TEXT NOT NULL,"
+    "  stock INTEGER NOT NULL DEFAULT 0,"
+    "  variations TEXT,"
+    "  sold_count INTEGER NOT NULL DEFAULT 0"
+    ")")
+
+TABLES['idx_products_sold_count'] = (
+    "CREATE INDEX IF NOT EXISTS idx_products_sold_count ON products (sold_count)")
+
+TABLES['catalog_meta'] = (
+    "CREATE TABLE IF NOT EXISTS catalog_meta ("
+    "  id INTEGER PRIMARY KEY,"
+    "  version INTEGER NOT NULL DEFAULT 0"
+    ")")
+
+TABLES['carts'] = (
+    "CREATE TABLE IF NOT EXISTS carts ("
+    "  session_id TEXT NOT NULL,"
+    "  product_id INTEGER NOT NULL,"
+    "  variation TEXT NOT NULL DEFAULT '',"
+    "  quantity INTEGER NOT NULL,"
+    "  updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+    "  PRIMARY KEY (session_id, product_id, variation)"
+    ")")
+
+TABLES['idx_carts_updated_at'] = (
+    "CREATE INDEX IF NOT EXISTS idx_carts_updated_at ON carts (updated_at)")
+
+TABLES['orders'] = (
+    "CREATE TABLE IF NOT EXISTS orders ("
+    "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "  user_id INTEGER,"
+    "  session_id TEXT,"
+    "  status TEXT NOT NULL DEFAULT 'placed',"
+    "  total NUMERIC NOT NULL,"
+    "  item_count INTEGER NOT NULL,"
+    "  created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"
+    ")")
+
+TABLES['idx_orders_session_id'] = (
+    "CREATE INDEX IF NOT EXISTS idx_orders_session_id ON orders (session_id)")
+
+TABLES['idx_orders_user_created'] = (
+    "CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at)")
+
+TABLES['order_items'] = (
+    "CREATE TABLE IF NOT EXISTS order_items ("
+    "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    "  order_id INTEGER NOT NULL REFERENCES orders (id) ON DELETE CASCADE,"
+    "  product_id INTEGER NOT NULL,"
+    "  variation TEXT NOT NULL DEFAULT '',"
+    "  quantity INTEGER NOT NULL,"
+    "  unit_price NUMERIC NOT NULL"
+    ")")
+
+TABLES['idx_order_items_order_id'] = (
+    "CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)")
+
+TABLES['order_summaries'] = (
+    "CREATE TABLE IF NOT EXISTS order_summaries ("
+    "  user_id INTEGER PRIMARY KEY,"
+    "  order_count INTEGER NOT NULL DEFAULT 0,"
+    "  item_count INTEGER NOT NULL DEFAULT 0,"
+    "  total_spent NUMERIC NOT NULL DEFAULT 0,"
+    "  last_order_at TIMESTAMP"
+    ")")
+
+TABLES['product_variation_sales'] = (
+    "CREATE TABLE IF NOT EXISTS product_variation_sales ("
+    "  product_id INTEGER NOT NULL,"
+    "  variation TEXT NOT NULL,"
+    "  sold_count INTEGER NOT NULL DEFAULT 0,"
+    "  PRIMARY KEY (product_id, variation)"
+    ")")
+
+TABLES['idx_variation_sales_rank'] = (
+    "CREATE INDEX IF NOT EXISTS idx_variation_sales_rank ON product_variation_sales (variation, sold_count)")
+
+SCHEMA_MIGRATIONS = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    "  version INTEGER PRIMARY KEY,"
+    "  name TEXT NOT NULL,"
+    "  applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP"
+    ")")
+
+# Version 1 is the schema as it stood when migrations were introduced; its
+# IF NOT EXISTS statements adopt databases created before then.
+MIGRATIONS = (
+    (1, 'baseline', list(TABLES.values()) + [
+        "INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0)",
+        StorageBackend.seed_placeholder_products,
+    ]),
+    (2, 'event ingestion tables', [
+        "CREATE TABLE IF NOT EXISTS feedback ("
+        "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        "  name TEXT,"
+        "  email TEXT,"
+        "  message TEXT NOT NULL,"
+        "  created_at TIMESTAMP NOT NULL"
+        ")",
+        "CREATE TABLE IF NOT EXISTS events ("
+        "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        "  kind TEXT NOT NULL,"
+        "  session_id TEXT,"
+        "  user_id INTEGER,"
+        "  product_id INTEGER,"
+        "  quantity INTEGER,"
+        "  path TEXT,"
+        "  created_at TIMESTAMP NOT NULL"
+        ")",
+        "CREATE INDEX IF NOT EXISTS idx_events_created_at ON events (created_at)",
+        "CREATE TABLE IF NOT EXISTS email_outbox ("
+        "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        "  user_id INTEGER,"
+        "  email TEXT NOT NULL,"
+        "  template TEXT NOT NULL,"
+        "  created_at TIMESTAMP NOT NULL,"
+        "  sent_at TIMESTAMP"
+        ")",
+        "CREATE INDEX IF NOT EXISTS idx_email_outbox_sent_at ON email_outbox (sent_at)",
+    ]),
+    (3, 'analytics summary tables', [
+        "CREATE TABLE IF NOT EXISTS daily_sales ("
+        "  day DATE NOT NULL,"
+        "  product_id INTEGER NOT NULL,"
+        "  units INTEGER NOT NULL DEFAULT 0,"
+        "  revenue NUMERIC NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (day, product_id)"
+        ")",
+        "CREATE TABLE IF NOT EXISTS sales_by_day ("
+        "  day DATE NOT NULL,"
+        "  slot INTEGER NOT NULL,"
+        "  order_count INTEGER NOT NULL DEFAULT 0,"
+        "  units INTEGER NOT NULL DEFAULT 0,"
+        "  revenue NUMERIC NOT NULL DEFAULT 0,"
+        "  PRIMARY KEY (day, slot)"
+        ")",
+        "CREATE TABLE IF NOT EXISTS inventory_stats ("
+        "  slot INTEGER PRIMARY KEY,"
+        "  product_count INTEGER NOT NULL DEFAULT 0,"
+        "  units_in_stock INTEGER NOT NULL DEFAULT 0,"
+        "  stock_value NUMERIC NOT NULL DEFAULT 0"
+        ")",
+        "CREATE INDEX IF NOT EXISTS idx_products_stock ON products (stock)",
+        "CREATE INDEX IF NOT EXISTS idx_variation_sales_sold ON product_variation_sales (sold_count)",
+        StorageBackend.backfill_analytics,
+    ]),
+    (4, 'product variations', [
+        "CREATE TABLE IF NOT EXISTS product_variations ("
+        "  id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        "  product_id INTEGER NOT NULL,"
+        "  name TEXT NOT NULL,"
+        "  stock INTEGER NOT NULL DEFAULT 0,"
+        "  price_delta NUMERIC NOT NULL DEFAULT 0,"
+        "  UNIQUE (product_id, name)"
+        ")",
+        "CREATE INDEX IF NOT EXISTS idx_product_variations_name ON product_variations (name, product_id)",
+        StorageBackend.backfill_variations,
+    ]),
+)
+
+
+class SQLiteBackend(StorageBackend):
+    # `path` is a database file or ':memory:'. An in-memory database lives as
+    # long as the process, is shared by every pooled connection and is
+    # limited to one connection at a time (SQLite's shared cache has no
+    # busy-wait for concurrent writers).
+    name = 'sqlite'
+    Error = sqlite3.Error
+    DataError = (sqlite3.DataError, sqlite3.IntegrityError, sqlite3.InterfaceError)
+
+    upsert_product_query = (
+        "INSERT INTO products (id, name, description, price, image_url, stock, variations) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+        "ON CONFLICT(id) DO UPDATE SET "
+        "name = excluded.name, price = excluded.price, "
+        "stock = CASE WHEN variations IS NULL THEN excluded.stock ELSE stock END, "
+        "description = COALESCE(excluded.description, description), "
+        "variations = COALESCE(excluded.variations, variations), "
+        "image_url = CASE WHEN excluded.image_url = '' THEN image_url ELSE excluded.image_url END"
+    )
+
+    order_summary_query = (
+        "INSERT INTO order_summaries (user_id, order_count, item_count, total_spent, last_order_at) "
+        "VALUES (%s, 1, %s, %s, CURRENT_TIMESTAMP) "
+        "ON CONFLICT(user_id) DO UPDATE SET "
+        "order_count = order_count + 1, item_count = item_count + excluded.item_count, "
+        "total_spent = total_spent + excluded.total_spent, last_order_at = excluded.last_order_at"
+    )
+
+    variation_sales_query = (
+        "INSERT INTO product_variation_sales (product_id, variation, sold_count) VALUES (%s, %s, %s) "
+        "ON CONFLICT(product_id, variation) DO UPDATE SET sold_count = sold_count + excluded.sold_count"
+    )
+
+    daily_sales_query = (
+        "INSERT INTO daily_sales (day, product_id, units, revenue) VALUES (CURRENT_DATE, %s, %s, %s) "
+        "ON CONFLICT(day, product_id) DO UPDATE SET "
+        "units = units + excluded.units, revenue = revenue + excluded.revenue"
+    )
+
+    sales_by_day_query = (
+        "INSERT INTO sales_by_day (day, slot, order_count, units, revenue) VALUES (CURRENT_DATE, %s, 1, %s, %s) "
+        "ON CONFLICT(day, slot) DO UPDATE SET "
+        "order_count = order_count + 1, units = units + excluded.units, revenue = revenue + excluded.revenue"
+    )
+
+    cart_add_query = (
+        "INSERT INTO carts (session_id, product_id, variation, quantity) VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT(session_id, product_id, variation) DO UPDATE SET "
+        "quantity = MIN(%s, quantity + excluded.quantity), updated_at = CURRENT_TIMESTAMP"
+    )
+
+    cart_set_query = (
+        "INSERT INTO carts (session_id, product_id, variation, quantity) VALUES (%s, %s, %s, %s) "
+        "ON CONFLICT(session_id, product_id, variation) DO UPDATE SET "
+        "quantity = excluded.quantity, updated_at = CURRENT_TIMESTAMP"
+    )
+
+    migrations = MIGRATIONS
+    schema_migrations_ddl = SCHEMA_MIGRATIONS
+
+    def __init__(self, path=':memory:', busy_timeout=5.0, **pool_options):
+        self.in_memory = path == ':memory:'
+        if self.in_memory:
+            self.uri = f"file:pup_shop_{uuid.uuid4().hex}?mode=memory&cache=shared"
+            pool_options['pool_size'] = 1
+            pool_options['idle_timeout'] = float('inf')
+        else:
+            self.uri = f"file:{path}"
+        self.busy_timeout = busy_timeout
+        self._translated = {}
+        self._translate_lock = threading.Lock()
+        super().__init__(**pool_options)
+        # Keeps an in-memory database alive between pooled connections.
+        self._keeper = self.connect() if self.in_memory else None
+
+    def connect(self):
+        conn = sqlite3.connect(self.uri, uri=True, timeout=self.busy_timeout, check_same_thread=False)
+        if not self.in_memory:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def ping(self, conn):
+        conn.execute("SELECT 1")
+
+    def is_transient(self, err):
+        return 'locked' in str(err) or 'busy' in str(err)
+
+    def translate(self, sql):
+        translated = self._translated.get(sql)
+        if translated is None:
+            translated = sql.replace('%s', '?')
+            with self._translate_lock:
+                self._translated[sql] = translated
+        return translated
+
+    def explain(self, sql, params):
+        # EXPLAIN QUERY PLAN names tables by alias and has no row estimates;
+        # a full scan is costed at the table's current size.
+        tables = {}
+        for table, alias in _TABLE_REFERENCE.findall(sql):
+            tables[table] = table
+            if alias and alias.upper() not in _NOT_ALIASES:
+                tables[alias] = table
+        plan = []
+        with self.cursor() as (_, cursor):
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            details = [row[3] for row in cursor.fetchall()]
+            for detail in details:
+                match = _SCAN.match(detail)
+                full_scan = match is not None and match.group(1) in tables and 'INDEX' not in detail
+                rows = None
+                if full_scan:
+                    cursor.execute(f"SELECT COUNT(*) FROM {tables[match.group(1)]}")
+                    rows = cursor.fetchone()[0]
+                plan.append({
+                    'table': tables.get(match.group(1)) if match else None,
+                    'access': detail,
+                    'rows': rows,
+                    'full_scan': full_scan,
+                    'filesort': 'TEMP B-TREE' in detail,
+                })
+        return plan
+
+    def lock_schema(self, cursor):
+        # SQLite DDL is transactional: the whole run commits or rolls back
+        # as one, and a second process waits here until it is done.
+        cursor.execute("BEGIN IMMEDIATE")
+
+    def close(self):
+        super().close()
+        if self._keeper is not None:
+            self._keeper.close()
@@ -0,0 +1,174 @@
+# shared/bestsellers.py
+#
+# Best-seller rankings kept in memory and updated as checkouts commit. Each
+# ranking holds only its top CAPACITY entries: sold counts never go down, so
+# a product outside the top can only get in by passing the smallest entry,
+# and the committed count that every checkout reports is enough to tell.
+# Rankings are seeded from the sold_count indexes (a LIMIT read, never a
+# scan of the products table) and reseeded when the catalog version moves
+# or every PUP_BEST_SELLERS_REFRESH seconds, which also picks up sales made
+# by other processes. A ranking that fails to load is retried after
+# PUP_BEST_SELLERS_RETRY seconds rather than on every request. Per-variation
+# rankings exist only for variation names the catalog has.
+
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from shared import database as db
+from shared.backends import DB_ERRORS
+
+logger = logging.getLogger(__name__)
+
+BEST_SELLERS_K = int(os.environ.get('PUP_BEST_SELLERS_K', 8))
+BEST_SELLERS_CAPACITY = int(os.environ.get('PUP_BEST_SELLERS_CAPACITY', 100))
+BEST_SELLERS_REFRESH = float(os.environ.get('PUP_BEST_SELLERS_REFRESH', 300))
+BEST_SELLERS_RETRY = float(os.environ.get('PUP_BEST_SELLERS_RETRY', 10))
+MAX_VARIATION_RANKINGS = 256
+
+
+class Leaderboard:
+    def __init__(self, capacity=BEST_SELLERS_CAPACITY):
+        self.capacity = capacity
+        self.loaded_at = 0.0
+        self.version = None
+        self.failed_at = None  # monotonic time of the last failed load
+        self._entries = []  # sorted (-sold_count, -product_id): best first, newer first on ties
+        self._counts = {}   # product id -> sold_count, members only
+        self._lock = threading.Lock()
+
+    def load(self, rows, version=None):
+        # rows: (product_id, sold_count), best first, at most `capacity`.
+        with self._lock:
+            self._entries = sorted((-count, -product_id) for product_id, count in rows)[:self.capacity]
+            self._counts = {-pid: -count for count, pid in self._entries}
+            self.loaded_at = time.monotonic()
+            self.version = version
+            self.failed_at = None
+
+    def update(self, product_id, sold_count):
+        with self._lock:
+            old = self._counts.get(product_id)
+            if old is not None:
+                if sold_count <= old:
+                    return
+                del self._entries[bisect_left(self._entries, (-old, -product_id))]
+            elif len(self._entries) >= self.capacity and (-sold_count, -product_id) >= self._entries[-1]:
+                return
+            insort(self._entries, (-sold_count, -product_id))
+            self._counts[product_id] = sold_count
+            if len(self._entries) > self.capacity:
+                _, dropped = self._entries.pop()
+                del self._counts[-dropped]
+
+    def discard(self, product_id):
+        # The entry below the old last one is unknown, so the caller reloads.
+        with self._lock:
+            count = self._counts.pop(product_id, None)
+            if count is not None:
+                del self._entries[bisect_left(self._entries, (-count, -product_id))]
+                self.loaded_at = 0.0
+
+    def top(self, k):
+        with self._lock:
+            return [(-pid, -count) for count, pid in self._entries[:k]]
+
+
+_overall = Leaderboard()
+_by_variation = {}  # variation -> Leaderboard, loaded on first request
+_refresh_lock = threading.Lock()
+_variation_names = (None, frozenset())  # (catalog version, names)
+
+
+def _stale(board, version):
+    return board.version != version or time.monotonic() - board.loaded_at > BEST_SELLERS_REFRESH
+
+
+def _refresh(board, loader):
+    # First load is synchronous; later reloads happen off the request path.
+    def reload():
+        try:
+            version = db.catalog_version()
+            board.load(loader(), version)
+        except DB_ERRORS as err:
+            logger.error("Failed to load best sellers: %s", err)
+            board.failed_at = board.loaded_at = time.monotonic()  # back off before retrying
+
+    if board.version is None:
+        if board.failed_at is not None and time.monotonic() - board.failed_at < BEST_SELLERS_RETRY:
+            return
+        with _refresh_lock:
+            if board.version is None:
+                reload()
+        return
+    if _refresh_lock.acquire(blocking=False):
+        def run():
+            try:
+                reload()
+            finally:
+                _refresh_lock.release()
+        threading.Thread(target=run, name='best-sellers-refresh', daemon=True).start()
+
+
+def is_variation(name):
+    # Whether some product offers the variation `name`; names are reread
+    # when the catalog version moves (on error the previous set is kept).
+    global _variation_names
+    version = db.catalog_version()
+    if _variation_names[0] != version:
+        names = db.get_variation_names()
+        if names is not None:
+            _variation_names = (version, frozenset(names))
+    return name in _variation_names[1]
+
+
+def _board(variation):
+    if not variation:
+        board, loader = _overall, lambda: db.get_backend().fetch_top_sellers(BEST_SELLERS_CAPACITY)
+    else:
+        board = _by_variation.get(variation)
+        if board is None:
+            if len(_by_variation) >= MAX_VARIATION_RANKINGS:
+                _by_variation.clear()
+            board = _by_variation.setdefault(variation, Leaderboard())
+        loader = lambda: db.get_backend().fetch_top_variation_sellers(variation, BEST_SELLERS_CAPACITY)
+    if _stale(board, db.catalog_version()):
+        _refresh(board, loader)
+    return board
+
+
+def top_sellers(k=BEST_SELLERS_K, variation=None):
+    # [(product_id, sold_count), ...], best first; O(k). Empty for a
+    # variation the catalog does not have.
+    if variation and not is_variation(variation):
+        return []
+    return _board(variation).top(k)
+
+
+def best_sellers(k=BEST_SELLERS_K, variation=None):
+    # Product rows for the top k, from the catalog cache (misses are loaded
+    # in one query).
+    ranking = top_sellers(k, variation)
+    products = {product['id']: product for product in db.get_products_by_ids([pid for pid, _ in ranking])}
+    return [dict(products[product_id], ranked_sold_count=sold_count)
+            for product_id, sold_count in ranking if product_id in products]
+
+
+def _on_catalog_change(event, product_id, data):
+    if event == 'sold':
+        _overall.update(product_id, data['sold_count'])
+        for variation, count in data['variations'].items():
+            board = _by_variation.get(variation)
+            if board is not None:
+                board.update(product_id, count)
+    elif event == 'saved':
+        _overall.update(product_id, data.get('sold_count') or 0)
+    elif event == 'deleted':
+        _overall.discard(product_id)
+        for board in list(_by_variation.values()):
+            board.discard(product_id)
+
+
+db.CATALOG_OBSERVERS.append(_on_catalog_change)
@@ -0,0 +1,342 @@
+# shared/cart.py
+#
+# Server-side shopping carts keyed by session id. Reads and writes hit an
+# in-memory LRU/TTL tier; changes are appended to a local journal right away
+# and written to the `carts` table in batches by a background thread. After a
+# crash, journal segments left by the dead process are replayed on startup.
+# The database is only read for a cart that is no longer in memory (evicted,
+# or created before this process started).
+#
+# When several server processes share the carts (PUP_CART_WRITE_THROUGH=1,
+# set automatically for multi-worker serving), a request may land on any of
+# them, so the memory tier is skipped: every read goes to the `carts` table
+# and every change is written to it, as a single-row upsert or delete,
+# before the request returns.
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from shared import database as db
+from shared.backends import DB_ERRORS
+from shared.images import PROJECT_ROOT
+from shared.procutil import owner_alive, process_id
+
+logger = logging.getLogger(__name__)
+
+CART_MAX_SESSIONS = int(os.environ.get('PUP_CART_MAX_SESSIONS', 50000))
+CART_IDLE_TTL = float(os.environ.get('PUP_CART_IDLE_TTL', 1800))
+CART_FLUSH_INTERVAL = float(os.environ.get('PUP_CART_FLUSH_INTERVAL', 1.0))
+CART_FLUSH_BATCH = int(os.environ.get('PUP_CART_FLUSH_BATCH', 500))
+CART_JOURNAL_DIR = os.environ.get('PUP_CART_JOURNAL_DIR', os.path.join(PROJECT_ROOT, 'cache', 'carts'))
+CART_JOURNAL_FSYNC = os.environ.get('PUP_CART_JOURNAL_FSYNC', '0') == '1'
+CART_WRITE_THROUGH = os.environ.get('PUP_CART_WRITE_THROUGH', '0') == '1'
+MAX_QUANTITY = 99
+
+
+class CartStore:
+    def __init__(self, max_sessions=CART_MAX_SESSIONS, idle_ttl=CART_IDLE_TTL,
+                 flush_interval=CART_FLUSH_INTERVAL, batch_size=CART_FLUSH_BATCH,
+                 journal_dir=CART_JOURNAL_DIR, write_through=False):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.journal_dir = journal_dir
+        self.write_through = write_through
+
+        # session id -> [OrderedDict((product_id, variation) -> quantity), last access]
+        self._carts = OrderedDict()
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._journal = None
+        self._segments = []  # rotated journal files awaiting a successful flush
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'hits': 0, 'loads': 0, 'flushes': 0, 'rows_flushed': 0, 'flush_errors': 0}
+
+    # --- Sessions ---
+    def new_session(self):
+        # A brand-new session has nothing stored, so it starts in memory and
+        # never needs a database read.
+        session_id = uuid.uuid4().hex
+        if self.write_through:
+            return session_id
+        with self._lock:
+            self._carts[session_id] = [OrderedDict(), time.monotonic()]
+            self._evict()
+        return session_id
+
+    # --- Reads ---
+    def get(self, session_id):
+        if self.write_through:
+            try:
+                return self._read(session_id)
+            except DB_ERRORS as err:
+                logger.error("Failed to load cart %s: %s", session_id, err)
+                return []
+        with self._lock:
+            entry = self._touch(session_id)
+        if entry is None:
+            entry = self._load(session_id)
+        with self._lock:
+            return [(pid, var, qty) for (pid, var), qty in entry[0].items()]
+
+    def count(self, session_id):
+        return sum(qty for _, _, qty in self.get(session_id))
+
+    # --- Writes ---
+    def add(self, session_id, product_id, variation='', quantity=1):
+        self._mutate(
+            session_id,
+            lambda items: items.__setitem__(
+                (product_id, variation),
+                min(MAX_QUANTITY, items.get((product_id, variation), 0) + quantity)),
+            lambda backend: backend.add_cart_item(session_id, product_id, variation, quantity, MAX_QUANTITY))
+
+    def set_quantity(self, session_id, product_id, variation, quantity):
+        def apply(items):
+            if quantity <= 0:
+                items.pop((product_id, variation), None)
+            else:
+                items[(product_id, variation)] = min(MAX_QUANTITY, quantity)
+        self._mutate(
+            session_id, apply,
+            lambda backend: backend.set_cart_item(session_id, product_id, variation, min(MAX_QUANTITY, quantity)))
+
+    def clear(self, session_id):
+        self._mutate(session_id, lambda items: items.clear(),
+                     lambda backend: backend.save_carts({session_id: []}))
+
+    def _mutate(self, session_id, apply, write):
+        # `apply` changes the in-memory items; `write` makes the same change
+        # directly in the database when the memory tier is bypassed.
+        if self.write_through:
+            self._write_through(session_id, write)
+            return
+        with self._lock:
+            entry = self._touch(session_id)
+        if entry is None:
+            entry = self._load(session_id)
+        with self._lock:
+            apply(entry[0])
+            self._dirty.add(session_id)
+            self._append_journal(session_id, entry[0])
+
+    # --- Memory tier ---
+    def _touch(self, session_id):
+        entry = self._carts.get(session_id)
+        if entry is not None:
+            entry[1] = time.monotonic()
+            self._carts.move_to_end(session_id)
+            self.stats['hits'] += 1
+        return entry
+
+    def _read(self, session_id):
+        return db.get_backend().load_cart(session_id)
+
+    def _load(self, session_id):
+        # Cold path: the cart is not in memory. New sessions have nothing
+        # stored, so callers only pay this for carts that were evicted or
+        # created by an earlier process.
+        items = OrderedDict()
+        try:
+            for product_id, variation, quantity in self._read(session_id):
+                items[(product_id, variation)] = quantity
+        except DB_ERRORS as err:
+            logger.error("Failed to load cart %s: %s", session_id, err)
+        with self._lock:
+            existing = self._carts.get(session_id)
+            if existing is not None:
+                return existing
+            entry = self._carts[session_id] = [items, time.monotonic()]
+            self.stats['loads'] += 1
+            self._evict()
+            return entry
+
+    def _evict(self):
+        # Never drop a cart with unflushed changes; it goes after the flush.
+        now = time.monotonic()
+        for session_id in list(self._carts):
+            if len(self._carts) <= self.max_sessions and now - self._carts[session_id][1] <= self.idle_ttl:
+                break
+            if session_id not in self._dirty:
+                del self._carts[session_id]
+
+    def _write_through(self, session_id, write):
+        # One statement per change on one (session, product, variation) row:
+        # concurrent requests for a cart on different workers never rewrite
+        # each other's lines.
+        try:
+            write(db.get_backend())
+        except DB_ERRORS as err:
+            logger.error("Failed to save cart %s: %s", session_id, err)
+
+    # --- Journal ---
+    def _journal_path(self):
+        return os.path.join(self.journal_dir, f"cart-journal-{process_id()}.log")
+
+    def _append_journal(self, session_id, items):
+        if self._journal is None:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._journal = open(self._journal_path(), 'a', encoding='utf-8')
+        record = {'s': session_id, 'i': [[pid, var, qty] for (pid, var), qty in items.items()]}
+        self._journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        if CART_JOURNAL_FSYNC:
+            os.fsync(self._journal.fileno())
+
+    def _rotate_journal(self):
+        if self._journal is None:
+            return
+        self._journal.close()
+        self._journal = None
+        segment = f"{self._journal_path()}.{time.time_ns()}"
+        os.replace(self._journal_path(), segment)
+        self._segments.append(segment)
+
+    def recover(self):
+        # Replays journals left behind by processes that are no longer
+        # running, then writes the recovered carts to the database.
+        pattern = os.path.join(self.journal_dir, 'cart-journal-*.log*')
+        carts = {}
+        claimed = []
+        # Oldest first: each record holds the whole cart, so the last one wins.
+        for path in sorted(glob.glob(pattern), key=lambda p: (os.stat(p).st_mtime_ns, p)):
+            owner = _journal_owner(path)
+            if owner is None or owner_alive(owner):
+                continue
+            claim = f"{path}.recovering-{process_id()}"
+            try:
+                os.replace(path, claim)
+            except OSError:
+                continue  # another process claimed it first
+            claimed.append(claim)
+            with open(claim, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn final write
+                    carts[record['s']] = [tuple(item) for item in record['i']]
+        if not carts:
+            for claim in claimed:
+                os.remove(claim)
+            return 0
+        try:
+            for start in range(0, len(carts), self.batch_size):
+                chunk = dict(list(carts.items())[start:start + self.batch_size])
+                db.get_backend().save_carts(chunk)
+        except DB_ERRORS as err:
+            logger.error("Cart recovery failed, journals kept for the next start: %s", err)
+            return 0
+        for claim in claimed:
+            os.remove(claim)
+        logger.warning("Recovered %d cart(s) from journal", len(carts))
+        return len(carts)
+
+    # --- Write-behind ---
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return 0
+                snapshot = {sid: [(pid, var, qty) for (pid, var), qty in self._carts[sid][0].items()]
+                            for sid in self._dirty if sid in self._carts}
+                self._dirty.clear()
+                self._rotate_journal()
+
+            written, failed = 0, []
+            session_ids = list(snapshot)
+            for start in range(0, len(session_ids), self.batch_size):
+                chunk = {sid: snapshot[sid] for sid in session_ids[start:start + self.batch_size]}
+                try:
+                    db.get_backend().save_carts(chunk)
+                    written += len(chunk)
+                except DB_ERRORS as err:
+                    logger.error("Cart flush failed for %d cart(s): %s", len(chunk), err)
+                    self.stats['flush_errors'] += 1
+                    failed.extend(chunk)
+
+            with self._lock:
+                if failed:
+                    # Retry next round; the journal segments stay until then.
+                    self._dirty.update(failed)
+                else:
+                    for segment in self._segments:
+                        try:
+                            os.remove(segment)
+                        except OSError:
+                            pass
+                    self._segments.clear()
+                self._evict()
+            self.stats['flushes'] += 1
+            self.stats['rows_flushed'] += written
+            return written
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Unexpected error in cart flusher")
+
+    def start(self):
+        if self._thread is None:
+            self.recover()
+            self._thread = threading.Thread(target=self._run, name='cart-flusher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if not self._dirty:
+                for segment in self._segments:
+                    try:
+                        os.remove(segment)
+                    except OSError:
+                        pass
+                self._segments.clear()
+
+
+def _journal_owner(path):
+    # The process_id() in "cart-journal-<owner>.log[.<segment>]".
+    name = os.path.basename(path)
+    if not name.startswith('cart-journal-'):
+        return None
+    return name[len('cart-journal-'):].split('.')[0] or None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cart_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CartStore(write_through=CART_WRITE_THROUGH).start()
+                atexit.register(_store.stop)
+    return _store
+
+
+def stop_cart_store():
+    # Flushes pending carts; a no-op if this process never used the store.
+    if _store is not None:
+        _store.stop()
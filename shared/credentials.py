@@ -0,0 +1,172 @@
+# shared/credentials.py
+#
+# Password hashing. Hashes are salted scrypt with a tunable cost, stored with
+# the parameters they were made with:
+#
+#   scrypt$n=16384,r=8,p=1$<salt>$<key>      (salt and key in base64)
+#
+# Raising the cost (PUP_SCRYPT_N / _R / _P) only applies to new hashes; older
+# ones still verify, and database.authenticate() replaces them at the user's
+# next login. Hashes from before this module (unsalted SHA-256 hex) are
+# accepted and upgraded the same way.
+#
+# scrypt is deliberately slow and memory-hard (128 * n * r bytes per hash,
+# 16 MiB at the defaults), so hashing runs on a bounded process pool of
+# PUP_HASH_WORKERS processes (0 hashes on the calling thread). Every serve
+# worker has its own pool, so by default each gets an equal share of the
+# cores (the CPU count divided by PUP_SERVE_WORKERS, or by the --workers
+# given to shared.server) and a registration spike uses every core without
+# oversubscribing them. At most PUP_HASH_QUEUE_LIMIT hashes wait for a
+# worker; beyond that a caller waits up to PUP_HASH_TIMEOUT seconds for a
+# slot and then gets CredentialsBusy, which the shop shows as "try again".
+#
+# Workers are spawned, not forked: the parent holds database connections and
+# threads that a forked child must not inherit. A spawned worker imports this
+# module and, like every spawned multiprocessing child, re-imports the
+# parent's __main__ module (as __mp_main__), so the entry points keep their
+# start-up work under `if __name__ == '__main__'`; their module-level imports
+# are paid once per worker when the pool starts.
+
+import base64
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+SCRYPT_N = int(os.environ.get('PUP_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('PUP_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('PUP_SCRYPT_P', 1))
+HASH_WORKERS = int(os.environ.get(
+    'PUP_HASH_WORKERS', max(1, (os.cpu_count() or 1) // max(1, int(os.environ.get('PUP_SERVE_WORKERS', 1))))))
+HASH_QUEUE_LIMIT = int(os.environ.get('PUP_HASH_QUEUE_LIMIT', 64))
+HASH_TIMEOUT = float(os.environ.get('PUP_HASH_TIMEOUT', 10))
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_LEGACY_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+
+class CredentialsBusy(Exception):
+    pass
+
+
+def share_cores(processes):
+    # Called before `processes` serve workers start: unless PUP_HASH_WORKERS
+    # is set, each one's pool gets an equal share of the cores.
+    global HASH_WORKERS
+    if 'PUP_HASH_WORKERS' not in os.environ:
+        HASH_WORKERS = max(1, (os.cpu_count() or 1) // max(1, processes))
+
+
+def current_params():
+    return {'n': SCRYPT_N, 'r': SCRYPT_R, 'p': SCRYPT_P}
+
+
+# --- Hash format ---
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _parse(stored):
+    # (algorithm, params, salt, key); raises ValueError for unknown formats.
+    if _LEGACY_SHA256.fullmatch(stored):
+        return 'sha256', None, None, stored
+    algorithm, params, salt, key = stored.split('$')
+    if algorithm != 'scrypt':
+        raise ValueError(f"unknown password hash algorithm {algorithm!r}")
+    params = {name: int(value) for name, value in (item.split('=') for item in params.split(','))}
+    return algorithm, params, base64.b64decode(salt), base64.b64decode(key)
+
+
+def _derive(password, salt, n, r, p):
+    # OpenSSL refuses scrypt above `maxmem`; allow what the parameters need.
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r * p, dklen=KEY_BYTES)
+
+
+# --- Worker functions (run in the pool) ---
+def _hash(password, params):
+    salt = os.urandom(SALT_BYTES)
+    key = _derive(password, salt, params['n'], params['r'], params['p'])
+    encoded = ','.join(f"{name}={params[name]}" for name in ('n', 'r', 'p'))
+    return f"scrypt${encoded}${_b64(salt)}${_b64(key)}"
+
+
+def _verify(password, stored):
+    algorithm, params, salt, key = _parse(stored)
+    if algorithm == 'sha256':
+        candidate = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(candidate, key)
+    return hmac.compare_digest(_derive(password, salt, params['n'], params['r'], params['p']), key)
+
+
+# --- Pool ---
+def _get_pool():
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _slots = threading.BoundedSemaphore(HASH_WORKERS + HASH_QUEUE_LIMIT)
+        return _pool, _slots
+
+
+def _run(fn, *args):
+    if HASH_WORKERS <= 0:
+        return fn(*args)
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=HASH_TIMEOUT):
+        logger.warning("No password hashing slot free after %.0fs", HASH_TIMEOUT)
+        raise CredentialsBusy(f"no hashing slot free after {HASH_TIMEOUT:.0f}s")
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time.
+        logger.error("Password hashing pool broke; restarting it")
+        shutdown(wait=False)
+        raise CredentialsBusy("password hashing pool restarted")
+    finally:
+        slots.release()
+
+
+def shutdown(wait=True):
+    # Stops the pool; the next hash starts one with the current settings.
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+# --- Public API ---
+def hash_password(password):
+    return _run(_hash, password, current_params())
+
+
+def verify_password(password, stored):
+    try:
+        _parse(stored)
+    except ValueError:
+        logger.warning("Unrecognised password hash format")
+        return False
+    return _run(_verify, password, stored)
+
+
+def needs_rehash(stored):
+    # True when `stored` was made with another algorithm or parameters.
+    try:
+        algorithm, params, _, _ = _parse(stored)
+    except ValueError:
+        return False
+    return algorithm != 'scrypt' or params != current_params()
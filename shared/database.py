@@ -1,201 +1,509 @@
-import mysql.connector
-from mysql.connector import errorcode
-import hashlib
-
-DB_CONFIG = {
-    'user': 'root',
-    'password': 'Test1234!',
-    'host': '127.0.0.1',
-}
-DB_NAME = 'pup_shop_db'
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def create_connection():
-    try:
-        cnx = mysql.connector.connect(**DB_CONFIG)
-        return cnx
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL: {err}")
-        return None
+import os
+import logging
+import threading
+import time
+
+from shared.backends import create_backend, DB_ERRORS, QUERY_OBSERVERS, DatabaseError, OutOfStock
+from shared.cache import LRUCache
+from shared import credentials
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + '.slow')
+
+# --- Storage Backend Settings ---
+# PUP_DB_BACKEND selects the implementation: 'mysql' (default) or 'sqlite'.
+# PUP_SQLITE_PATH is a database file or ':memory:'.
+DB_BACKEND = os.environ.get('PUP_DB_BACKEND', 'mysql')
+SQLITE_PATH = os.environ.get('PUP_SQLITE_PATH', 'pup_shop.db')
+
+# --- Query Instrumentation Settings ---
+# Statements slower than this are logged with their SQL and parameters.
+SLOW_QUERY_MS = float(os.environ.get('PUP_SLOW_QUERY_MS', 100))
+# Per-statement timings and EXPLAIN plans (see shared/profiler.py).
+QUERY_PROFILE = os.environ.get('PUP_QUERY_PROFILE', '0') == '1'
+
+# --- Connection Pool Settings ---
+# Both Flask apps share one pool per process; override through the environment.
+POOL_SIZE = int(os.environ.get('PUP_DB_POOL_SIZE', 8))
+POOL_IDLE_TIMEOUT = float(os.environ.get('PUP_DB_POOL_IDLE_TIMEOUT', 300))
+POOL_CHECK_AFTER = float(os.environ.get('PUP_DB_POOL_CHECK_AFTER', 30))
+POOL_CHECKOUT_TIMEOUT = float(os.environ.get('PUP_DB_POOL_CHECKOUT_TIMEOUT', 10))
+
+# --- Catalog Cache Settings ---
+# Entries are keyed by catalog version, so a bump made by either app (shop on
+# port 5000, admin on port 5001) retires every cached listing and product.
+CATALOG_CACHE_SIZE = int(os.environ.get('PUP_CATALOG_CACHE_SIZE', 2048))
+CATALOG_CACHE_TTL = float(os.environ.get('PUP_CATALOG_CACHE_TTL', 300))
+CATALOG_VERSION_CHECK_INTERVAL = float(os.environ.get('PUP_CATALOG_VERSION_CHECK_INTERVAL', 1.0))
+
+# --- Pagination Settings ---
+PAGE_SIZE = int(os.environ.get('PUP_PAGE_SIZE', 24))
+ADMIN_PAGE_SIZE = int(os.environ.get('PUP_ADMIN_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = 200
+
+# --- Bulk Import/Export Settings ---
+IMPORT_BATCH_SIZE = int(os.environ.get('PUP_IMPORT_BATCH_SIZE', 500))
+EXPORT_BATCH_SIZE = int(os.environ.get('PUP_EXPORT_BATCH_SIZE', 1000))
+EXPORT_COLUMNS = ('id', 'name', 'description', 'price', 'image_url', 'stock', 'variations', 'sold_count')
+DEFAULT_IMAGE_URL = '/static/images/pup_logo.png'
+
+# Only these columns are selected for paged views; they are trusted identifiers.
+LISTING_COLUMNS = ('id', 'name', 'price', 'image_url')
+INVENTORY_COLUMNS = ('id', 'name', 'stock', 'price')
+
+# --- Checkout Settings ---
+# Attempts for a checkout that lost a lock conflict (deadlock, busy database).
+CHECKOUT_RETRIES = int(os.environ.get('PUP_CHECKOUT_RETRIES', 3))
+
+# --- Order History Settings ---
+# Per-user order summaries are cached here and updated in place by checkouts
+# in this process; the TTL bounds staleness from checkouts in other processes.
+ORDER_PAGE_SIZE = int(os.environ.get('PUP_ORDER_PAGE_SIZE', 20))
+ORDER_SUMMARY_CACHE_SIZE = int(os.environ.get('PUP_ORDER_SUMMARY_CACHE_SIZE', 10000))
+ORDER_SUMMARY_CACHE_TTL = float(os.environ.get('PUP_ORDER_SUMMARY_CACHE_TTL', 60))
+EMPTY_ORDER_SUMMARY = {'order_count': 0, 'item_count': 0, 'total_spent': 0}
+
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+_query_stats = {'queries': 0, 'total_time': 0.0, 'slow_queries': 0}
+_query_stats_lock = threading.Lock()
+_metrics_hook = None
+
+_catalog_cache = LRUCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL)
+_catalog_version = None
+_version_checked_at = 0.0
+_version_lock = threading.Lock()
+
+# Called as observer(event, product_id, data) after a catalog change made by
+# this process commits, so in-process indexes can update incrementally:
+#   'saved'   product_id, the product row (insert or update)
+#   'deleted' product_id, None
+#   'sold'    product_id, {'sold_count': n, 'variations': {variation: n}} with
+#             the committed totals (stock/sold_count only; no version bump)
+#   'bulk'    None, None (an import touched many rows)
+# Changes made by other processes only show up as catalog version moves.
+# Observers must be cheap and must not raise.
+CATALOG_OBSERVERS = []
+
+_summary_cache = LRUCache(maxsize=ORDER_SUMMARY_CACHE_SIZE, ttl=ORDER_SUMMARY_CACHE_TTL)
+_summary_lock = threading.Lock()
+
+# --- Backend ---
+def _create_configured_backend():
+    pool_options = dict(
+        pool_size=POOL_SIZE,
+        idle_timeout=POOL_IDLE_TIMEOUT,
+        check_after=POOL_CHECK_AFTER,
+        checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+    )
+    if DB_BACKEND == 'sqlite':
+        return create_backend('sqlite', path=SQLITE_PATH, **pool_options)
+    return create_backend(DB_BACKEND, **pool_options)
+
+def get_backend():
+    global _backend, _backend_pid
+    # A forked worker must not reuse sockets inherited from its parent.
+    if _backend is None or _backend_pid != os.getpid():
+        with _backend_lock:
+            if _backend is None or _backend_pid != os.getpid():
+                _backend = _create_configured_backend()
+                _backend_pid = os.getpid()
+    return _backend
+
+def use_backend(backend):
+    # Swap in an explicitly built backend (benchmarks, tooling).
+    global _backend, _backend_pid
+    with _backend_lock:
+        if _backend is not None and _backend is not backend:
+            _backend.close()
+        _backend = backend
+        _backend_pid = os.getpid()
+    invalidate_catalog_cache()
+    return backend
+
+def close_backend():
+    # Drops this process's connections, e.g. before forking server workers.
+    global _backend, _backend_pid
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+        _backend = None
+        _backend_pid = None
+
+def get_pool():
+    return get_backend().pool
+
+def pool_stats():
+    return get_pool().stats()
 
 def setup_database():
-    cnx = create_connection()
-    if not cnx:
-        print("Could not establish connection to MySQL. Aborting setup.")
-        return
-        
-    cursor = cnx.cursor()
-    try:
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME} DEFAULT CHARACTER SET 'utf8'")
-        print(f"Database '{DB_NAME}' created or already exists.")
-        DB_CONFIG['database'] = DB_NAME
-    except mysql.connector.Error as err:
-        print(f"Failed creating database: {err}")
-        exit(1)
-    
-    cnx.close()
-
-    db_cnx = mysql.connector.connect(**DB_CONFIG)
-    cursor = db_cnx.cursor()
-
-    tables = {}
-    tables['users'] = (
-        "CREATE TABLE `users` ("
-        "  `id` int(11) NOT NULL AUTO_INCREMENT,"
-        "  `name` varchar(255) NOT NULL,"
-        "  `email` varchar(255) NOT NULL UNIQUE,"
-        "  `password_hash` varchar(255) NOT NULL,"
-        "  `address1` text,"
-        "  `address2` text,"
-        "  PRIMARY KEY (`id`)"
-        ") ENGINE=InnoDB")
-
-    tables['products'] = (
-        "CREATE TABLE `products` ("
-        "  `id` int(11) NOT NULL AUTO_INCREMENT,"
-        "  `name` varchar(255) NOT NULL,"
-        "  `description` text,"
-        "  `price` decimal(10, 2) NOT NULL,"
-        "  `image_url` varchar(255) NOT NULL,"
-        "  `stock` int(11) NOT NULL DEFAULT 0,"
-        "  `variations` varchar(255),"
-        "  `sold_count` INT NOT NULL DEFAULT 0,"
-        "  PRIMARY KEY (`id`)"
-        ") ENGINE=InnoDB")
-    
-    for table_name in tables:
-        table_description = tables[table_name]
+    # Applies missing schema migrations; a no-op version check otherwise.
+    try:
+        return get_backend().setup()
+    except DB_ERRORS as err:
+        logger.error("Database setup failed: %s", err)
+        return None
+
+# --- Query Instrumentation ---
+def _statement_kind(sql):
+    return sql.lstrip().split(None, 1)[0].upper()
+
+def _observe_query(backend, sql, params, elapsed):
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    with _query_stats_lock:
+        _query_stats['queries'] += 1
+        _query_stats['total_time'] += elapsed
+        if slow:
+            _query_stats['slow_queries'] += 1
+    if slow:
+        slow_query_logger.warning("Slow query (%.1f ms) on %s: %s params=%.500r",
+                                  elapsed * 1000, backend.name, ' '.join(sql.split()), params)
+    if _metrics_hook is not None:
+        _metrics_hook(_statement_kind(sql), elapsed, slow)
+
+def query_stats():
+    with _query_stats_lock:
+        return dict(_query_stats)
+
+def set_metrics_hook(hook):
+    # hook(operation, elapsed_seconds, slow) feeds the /metrics exporter.
+    global _metrics_hook
+    _metrics_hook = hook
+
+QUERY_OBSERVERS.append(_observe_query)
+
+if QUERY_PROFILE:
+    from shared import profiler
+    profiler.enable()
+
+# --- Catalog Version & Cache ---
+def catalog_version():
+    global _catalog_version, _version_checked_at
+    now = time.monotonic()
+    if _catalog_version is not None and now - _version_checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+        return _catalog_version
+    with _version_lock:
+        if _catalog_version is not None and now - _version_checked_at < CATALOG_VERSION_CHECK_INTERVAL:
+            return _catalog_version
         try:
-            print(f"Creating table {table_name}: ", end='')
-            cursor.execute(table_description)
-            print("OK")
-        except mysql.connector.Error as err:
-            if err.errno == errorcode.ER_TABLE_EXISTS_ERROR:
-                print("already exists.")
-            else:
-                print(err.msg)
-
-    cursor.execute("SELECT COUNT(*) FROM products")
-    if cursor.fetchone()[0] == 0:
-        print("Inserting placeholder products...")
-        placeholder_products = [
-            ('PUP Minimalist Baybayin Lanyard', 'Stylish lanyard with Baybayin script.', 140.00, '/static/images/product_lanyard_1.png', 100, 'Coquette,Classic', 50),
-            ('PUP Jeepney Signage', 'Fun sticker for your laptop.', 20.00, '/static/images/product_jeepney.png', 200, 'Iskolar Script', 120),
-            ('PUP Iskolar TOTE BAG (V1)', 'Canvas tote bag for every Iskolar.', 160.00, '/static/images/product_tote_1.png', 150, 'White', 30),
-            ('PUP Iskolar TOTE BAG (V2)', 'Another great tote bag design.', 160.00, '/static/images/product_tote_2.png', 150, 'Cream', 45),
-            ('PUP STUDY WITH STYLE Shirt', 'Premium quality shirt.', 450.00, '/static/images/product_shirt.png', 80, 'S,M,L,XL', 22),
-            ('PUP Baybayin Lanyard (Classic)', 'Classic edition lanyard.', 140.00, '/static/images/product_lanyard_2.png', 100, 'Classic', 65),
-        ]
-        insert_query = ("INSERT INTO products "
-                        "(name, description, price, image_url, stock, variations, sold_count) "
-                        "VALUES (%s, %s, %s, %s, %s, %s, %s)")
-        cursor.executemany(insert_query, placeholder_products)
-        db_cnx.commit()
-        print("Placeholder products inserted.")
-    
-    cursor.close()
-    db_cnx.close()
-
-def get_db_connection():
-    try:
-        if 'database' not in DB_CONFIG:
-            DB_CONFIG['database'] = DB_NAME
-        cnx = mysql.connector.connect(**DB_CONFIG)
-        return cnx
-    except mysql.connector.Error as err:
-        print(f"Database connection failed: {err}")
+            version = get_backend().catalog_version()
+        except DB_ERRORS as err:
+            logger.error("Failed to read catalog version: %s", err)
+            return _catalog_version or 0
+        if version != _catalog_version:
+            # Entries for older versions can never be hit again.
+            _catalog_cache.clear()
+        _catalog_version = version
+        _version_checked_at = now
+        return version
+
+def stock_level():
+    # None when unknown, so callers can skip whatever depends on it.
+    try:
+        return get_backend().stock_level()
+    except DB_ERRORS as err:
+        logger.error("Failed to read stock level: %s", err)
         return None
 
+def invalidate_catalog_cache():
+    global _version_checked_at
+    _catalog_cache.clear()
+    _version_checked_at = 0.0
+
+def catalog_cache_stats():
+    return _catalog_cache.stats()
+
+def _cached(key, loader):
+    return _catalog_cache.get_or_load((catalog_version(),) + key, loader)
+
+def _notify(event, product_id=None, data=None):
+    for observer in CATALOG_OBSERVERS:
+        observer(event, product_id, data)
+
+def _notify_saved(product_id):
+    if not CATALOG_OBSERVERS:
+        return
+    try:
+        product = get_backend().fetch_product(product_id)
+    except DB_ERRORS as err:
+        logger.error("Failed to reload product %s for observers: %s", product_id, err)
+        return
+    if product is not None:
+        _notify('saved', product_id, product)
+
+# --- Products ---
 def get_all_products():
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM products ORDER BY id DESC")
-    products = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return products
+    try:
+        return _cached(('listing', 'all'), get_backend().fetch_all_products)
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch products: %s", err)
+        return []
 
 def get_product_by_id(product_id):
-    conn = get_db_connection()
-    if not conn: return None
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM products WHERE id = %s", (product_id,))
-    product = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    return product
-
-def add_product(name, quantity, price):
-    conn = get_db_connection()
-    if not conn: return False
-    cursor = conn.cursor()
-    image_url = '/static/images/pup_logo.png'
+    try:
+        return _cached(('product', product_id), lambda: get_backend().fetch_product(product_id))
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch product %s: %s", product_id, err)
+        return None
+
+def get_products_by_ids(product_ids):
+    # Products in the given order, skipping missing ones. Cache misses are
+    # loaded together (with their variations) in one query.
+    version = catalog_version()
+    found = {}
+    missing = []
+    for product_id in dict.fromkeys(product_ids):
+        product = _catalog_cache.get((version, 'product', product_id))
+        if product is None:
+            missing.append(product_id)
+        else:
+            found[product_id] = product
+    if missing:
+        try:
+            loaded = get_backend().fetch_products(missing)
+        except DB_ERRORS as err:
+            logger.error("Failed to fetch products %s: %s", missing, err)
+            loaded = []
+        for product in loaded:
+            _catalog_cache.set((version, 'product', product['id']), product)
+            found[product['id']] = product
+    return [found[product_id] for product_id in product_ids if product_id in found]
+
+def get_variations(product_ids):
+    # Live per-variation stock for a page of products: {id: [variation, ...]}.
+    try:
+        return get_backend().fetch_variations(list(product_ids))
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch variations: %s", err)
+        return {}
+
+def get_product_stock(product_id):
+    # Uncached: checkouts change stock and sold counts without bumping the
+    # catalog version. None when unknown.
+    try:
+        return get_backend().fetch_product_stock(product_id)
+    except DB_ERRORS as err:
+        logger.error("Failed to read stock of product %s: %s", product_id, err)
+        return None
+
+def get_variation_names():
+    # Set of variation names offered by any product; None on error.
+    try:
+        return set(get_backend().fetch_variation_names())
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch variation names: %s", err)
+        return None
+
+def get_products_with_variation(name, limit=PAGE_SIZE):
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    try:
+        return get_backend().fetch_products_with_variation(name, limit)
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch products with variation %r: %s", name, err)
+        return []
+
+def get_products_page(limit=PAGE_SIZE, after=None, before=None, columns=LISTING_COLUMNS, cached=True):
+    # Keyset pagination over products, newest first. `after` continues past
+    # the last id of a page, `before` walks back from the first id of a page.
+    # Pass cached=False for views that must show live stock (checkouts do not
+    # bump the catalog version).
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if 'id' not in columns:
+        columns = ('id',) + tuple(columns)
+    load = lambda: get_backend().fetch_products_page(limit, after, before, columns)
+    try:
+        if not cached:
+            return load()
+        return _cached(('page', tuple(columns), limit, after, before), load)
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch product page: %s", err)
+        return {'items': [], 'next': None, 'prev': None}
+
+def add_product(name, quantity, price, image_url=None, variations=None):
+    # `variations` is [(name, stock, price_delta), ...]; the product's stock
+    # is then their total.
+    image_url = image_url or DEFAULT_IMAGE_URL
     description = 'Newly added item.'
     try:
-        cursor.execute(
-            "INSERT INTO products (name, stock, price, image_url, description) VALUES (%s, %s, %s, %s, %s)",
-            (name, quantity, price, image_url, description)
-        )
-        conn.commit()
-        return True
-    except mysql.connector.Error as err:
-        print(f"Failed to add product: {err}")
+        product_id = get_backend().insert_product(name, quantity, price, image_url, description, variations)
+        invalidate_catalog_cache()
+    except DB_ERRORS as err:
+        logger.error("Failed to add product: %s", err)
         return False
-    finally:
-        cursor.close()
-        conn.close()
-
-def update_product(product_id, name, quantity, price):
-    conn = get_db_connection()
-    if not conn: return False
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE products SET name = %s, stock = %s, price = %s WHERE id = %s",
-            (name, quantity, price, product_id)
-        )
-        conn.commit()
-        return True
-    except mysql.connector.Error as err:
-        print(f"Failed to update product: {err}")
+    _notify_saved(product_id)
+    return True
+
+def update_product(product_id, name, quantity, price, image_url=None, variations=None):
+    # `variations` None keeps the current ones; `quantity` only applies to
+    # products without variations.
+    try:
+        get_backend().update_product(product_id, name, quantity, price, image_url, variations)
+        invalidate_catalog_cache()
+    except DB_ERRORS as err:
+        logger.error("Failed to update product: %s", err)
         return False
-    finally:
-        cursor.close()
-        conn.close()
+    _notify_saved(product_id)
+    return True
 
 def delete_product(product_id):
-    conn = get_db_connection()
-    if not conn: return False
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
-        conn.commit()
-        return True
-    except mysql.connector.Error as err:
-        print(f"Failed to delete product: {err}")
+    try:
+        get_backend().delete_product(product_id)
+        invalidate_catalog_cache()
+    except DB_ERRORS as err:
+        logger.error("Failed to delete product: %s", err)
         return False
+    _notify('deleted', product_id)
+    return True
+
+# --- Bulk Import/Export ---
+def _write_batch(batch, report):
+    # One transaction and one multi-row INSERT per batch. If the batch fails,
+    # retry it row by row so the error can be pinned to the offending line.
+    backend = get_backend()
+    try:
+        backend.upsert_products([row for _, row in batch])
+        report['written'] += len(batch)
+        report['batches'] += 1
+        return
+    except DB_ERRORS as err:
+        logger.warning("Import batch failed, retrying row by row: %s", err)
+
+    for line_no, row in batch:
+        try:
+            backend.upsert_products([row])
+            report['written'] += 1
+        except DB_ERRORS as err:
+            report['errors'].append((line_no, str(err)))
+    report['batches'] += 1
+
+def bulk_upsert_products(rows, batch_size=IMPORT_BATCH_SIZE):
+    # `rows` yields (line_no, row_tuple) or (line_no, ValueError) from a parser,
+    # so only one batch is ever held in memory. Rows are (id, name,
+    # description, price, image_url, stock, variations): no id inserts, an id
+    # updates in place, and blank optional fields keep the stored value.
+    report = {'written': 0, 'batches': 0, 'errors': []}
+    batch = []
+    try:
+        for line_no, row in rows:
+            if isinstance(row, Exception):
+                report['errors'].append((line_no, str(row)))
+                continue
+            batch.append((line_no, row))
+            if len(batch) >= batch_size:
+                _write_batch(batch, report)
+                batch = []
+        if batch:
+            _write_batch(batch, report)
     finally:
-        cursor.close()
-        conn.close()
+        if report['batches']:
+            invalidate_catalog_cache()
+            _notify('bulk')
+    return report
 
+def iter_products(batch_size=EXPORT_BATCH_SIZE, columns=EXPORT_COLUMNS):
+    # Streams the whole table in id order; bypasses the catalog cache so an
+    # export does not flush it.
+    return get_backend().iter_products(batch_size, columns)
+
+# --- Users ---
 def create_user(name, email, password):
-    conn = get_db_connection()
-    if not conn: return False
-    cursor = conn.cursor()
-    hashed_pw = hash_password(password)
-    try:
-        cursor.execute(
-            "INSERT INTO users (name, email, password_hash) VALUES (%s, %s, %s)",
-            (name, email, hashed_pw)
-        )
-        conn.commit()
-        return True
-    except mysql.connector.Error as err:
-        print(f"Error creating user: {err}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
+    # Returns the new user's id, or None when the user could not be created.
+    # Hashing waits for a worker in the credentials pool; raises
+    # CredentialsBusy when none frees up, so the caller can ask the user to
+    # try again.
+    password_hash = credentials.hash_password(password)
+    try:
+        return get_backend().insert_user(name, email, password_hash)
+    except DB_ERRORS as err:
+        logger.error("Error creating user: %s", err)
+        return None
+
+def authenticate(email, password):
+    # Returns the user's id when the password matches, else None. A hash made
+    # with other parameters than the current ones is replaced on the way; if
+    # that fails the login still succeeds and the next one tries again.
+    # Raises CredentialsBusy when no hashing worker frees up to verify.
+    backend = get_backend()
+    try:
+        user = backend.fetch_user_credentials(email)
+        if user is None or not credentials.verify_password(password, user['password_hash']):
+            return None
+    except DB_ERRORS as err:
+        logger.error("Error authenticating user: %s", err)
+        return None
+    if credentials.needs_rehash(user['password_hash']):
+        try:
+            backend.update_password_hash(user['id'], user['password_hash'], credentials.hash_password(password))
+        except credentials.CredentialsBusy as err:
+            logger.warning("Skipped rehashing the password of user %s: %s", user['id'], err)
+        except DB_ERRORS as err:
+            logger.error("Failed to rehash the password of user %s: %s", user['id'], err)
+    return user['id']
+
+# --- Orders ---
+def place_order(session_id, items, user_id=None):
+    # Returns the new order id, or None when the database failed. Raises
+    # OutOfStock when any line cannot be filled; nothing is written then.
+    # Stock changes do not bump the catalog version, so a flash sale does not
+    # flush every cached page; cached stock and sold counts catch up on the
+    # next catalog write or TTL expiry.
+    if not items:
+        return None
+    backend = get_backend()
+    for attempt in range(CHECKOUT_RETRIES):
+        try:
+            order_id, total, sold = backend.place_order(session_id, user_id, items)
+            break
+        except DatabaseError as err:
+            if attempt + 1 < CHECKOUT_RETRIES and backend.is_transient(err):
+                time.sleep(0.01 * (attempt + 1))
+                continue
+            logger.error("Checkout failed: %s", err)
+            return None
+        except DB_ERRORS as err:
+            logger.error("Checkout failed: %s", err)
+            return None
+    if user_id is not None:
+        _record_order(user_id, sum(quantity for _, _, quantity in items), total)
+    for product_id, counts in sold.items():
+        _notify('sold', product_id, counts)
+    return order_id
+
+def _record_order(user_id, item_count, total):
+    # Mirrors the order_summaries upsert done inside the checkout transaction.
+    with _summary_lock:
+        summary = _summary_cache.get(user_id)
+        if summary is not None:
+            _summary_cache.set(user_id, {
+                'order_count': summary['order_count'] + 1,
+                'item_count': summary['item_count'] + item_count,
+                'total_spent': summary['total_spent'] + total,
+            })
+
+def get_order(order_id):
+    try:
+        return get_backend().fetch_order(order_id)
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch order %s: %s", order_id, err)
+        return None
+
+def get_orders_page(user_id, limit=ORDER_PAGE_SIZE, after=None, before=None):
+    # `after`/`before` are the (created_at, id) positions handed out as a
+    # page's 'next'/'prev'.
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    try:
+        return get_backend().fetch_orders_page(user_id, limit, after, before)
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch orders for user %s: %s", user_id, err)
+        return {'items': [], 'next': None, 'prev': None}
+
+def get_order_summary(user_id):
+    def load():
+        return get_backend().fetch_order_summary(user_id) or dict(EMPTY_ORDER_SUMMARY)
+    try:
+        return _summary_cache.get_or_load(user_id, load)
+    except DB_ERRORS as err:
+        logger.error("Failed to fetch order summary for user %s: %s", user_id, err)
+        return dict(EMPTY_ORDER_SUMMARY)
@@ -0,0 +1,322 @@
+# shared/events.py
+#
+# Background ingestion for write-mostly events: feedback messages, page-view
+# and add-to-cart analytics, and welcome-email stubs. Requests put events on
+# a bounded in-memory queue and return at once; worker threads drain it and
+# write each batch in one transaction (one executemany per table).
+#
+# Nothing is dropped. When the queue is full an event waits briefly
+# (backpressure), then goes to a spill file on disk. A batch that cannot be
+# written because the database is unreachable is spilled too. Workers replay
+# spill files when the queue runs dry, including files left behind by
+# processes that crashed. On shutdown the queue is drained to the database,
+# or to the spill file if it is down. Delivery is at least once: a crash
+# between a replayed batch's commit and the removal of its file writes that
+# batch again.
+#
+# A batch rejected for its data (a value the column cannot hold) is retried
+# one event at a time; the events still rejected go to a dead-letter file
+# (events-dead-letter.jsonl) for inspection instead of poisoning every
+# replay. emit() truncates text to the column sizes, so overlong input is
+# stored cut short rather than rejected.
+
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from shared import database as db
+from shared.backends import DB_ERRORS, DatabaseError
+from shared.images import PROJECT_ROOT
+from shared.procutil import owner_alive, process_id
+
+logger = logging.getLogger(__name__)
+
+EVENTS_QUEUE_SIZE = int(os.environ.get('PUP_EVENTS_QUEUE_SIZE', 10000))
+EVENTS_WORKERS = int(os.environ.get('PUP_EVENTS_WORKERS', 2))
+EVENTS_BATCH_SIZE = int(os.environ.get('PUP_EVENTS_BATCH_SIZE', 500))
+EVENTS_FLUSH_INTERVAL = float(os.environ.get('PUP_EVENTS_FLUSH_INTERVAL', 0.5))
+# How long emit() may block on a full queue before spilling to disk.
+EVENTS_PUT_TIMEOUT = float(os.environ.get('PUP_EVENTS_PUT_TIMEOUT', 0.01))
+EVENTS_SPILL_DIR = os.environ.get('PUP_EVENTS_SPILL_DIR', os.path.join(PROJECT_ROOT, 'cache', 'events'))
+REPLAY_RETRY_INTERVAL = 5.0
+
+# Columns written per table; they are trusted identifiers.
+TABLE_COLUMNS = {
+    'feedback': ('name', 'email', 'message', 'created_at'),
+    'events': ('kind', 'session_id', 'user_id', 'product_id', 'quantity', 'path', 'created_at'),
+    'email_outbox': ('user_id', 'email', 'template', 'created_at'),
+}
+# VARCHAR sizes of the MySQL schema; longer text is truncated in emit().
+FIELD_LIMITS = {
+    'name': 255,
+    'email': 255,
+    'path': 255,
+    'session_id': 64,
+    'template': 64,
+    'kind': 32,
+}
+KINDS = {
+    'feedback': 'feedback',
+    'page_view': 'events',
+    'add_to_cart': 'events',
+    'welcome_email': 'email_outbox',
+}
+
+
+class EventQueue:
+    def __init__(self, maxsize=EVENTS_QUEUE_SIZE, workers=EVENTS_WORKERS, batch_size=EVENTS_BATCH_SIZE,
+                 flush_interval=EVENTS_FLUSH_INTERVAL, spill_dir=EVENTS_SPILL_DIR):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+
+        self._queue = queue.Queue(maxsize=maxsize)  # (table, row)
+        self._spill = None
+        self._spill_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._replay_after = 0.0
+        self._stop = threading.Event()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'spilled': 0, 'replayed': 0, 'write_errors': 0,
+                      'dead_lettered': 0}
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    # --- Producers ---
+    def emit(self, kind, **fields):
+        table = KINDS[kind]
+        fields['kind'] = kind
+        fields['created_at'] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        for field, limit in FIELD_LIMITS.items():
+            value = fields.get(field)
+            if isinstance(value, str) and len(value) > limit:
+                fields[field] = value[:limit]
+        event = (table, [fields.get(column) for column in TABLE_COLUMNS[table]])
+        try:
+            self._queue.put(event, timeout=EVENTS_PUT_TIMEOUT)
+            self._count('queued')
+        except queue.Full:
+            self._spill_events([event])
+
+    def depth(self):
+        return self._queue.qsize()
+
+    # --- Spill files ---
+    def _spill_path(self):
+        return os.path.join(self.spill_dir, f"events-spill-{process_id()}.jsonl")
+
+    def _spill_events(self, events):
+        with self._spill_lock:
+            if self._spill is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                self._spill = open(self._spill_path(), 'a', encoding='utf-8')
+            for table, row in events:
+                self._spill.write(json.dumps([table, row], separators=(',', ':')) + '\n')
+            self._spill.flush()
+        self._count('spilled', len(events))
+
+    def _rotate_spill(self):
+        with self._spill_lock:
+            if self._spill is None:
+                return
+            self._spill.close()
+            self._spill = None
+            os.replace(self._spill_path(), f"{self._spill_path()}.{time.time_ns()}")
+
+    def _dead_letter(self, event, err):
+        # Events the database rejects on their own; kept for inspection.
+        table, row = event
+        with self._spill_lock:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(os.path.join(self.spill_dir, 'events-dead-letter.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps([table, row, str(err)], separators=(',', ':'), default=str) + '\n')
+        self._count('dead_lettered')
+        logger.error("Dead-lettered a %s event the database rejected: %s", table, err)
+
+    def _claimable(self, path):
+        # Rotated segments, and the live file of a process that is gone
+        # (named by process_id(), so a restart that reuses the pid still
+        # replays its predecessor's file).
+        name = os.path.basename(path)
+        if '.recovering-' in name:
+            return False
+        if not name.endswith('.jsonl'):
+            return True
+        owner = name[len('events-spill-'):-len('.jsonl')]
+        if not owner.partition('-')[0].isdigit():
+            return False
+        return not owner_alive(owner)
+
+    def replay(self):
+        # Writes spilled events back to the database; returns how many.
+        if time.monotonic() < self._replay_after or not self._replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            self._rotate_spill()
+            written = 0
+            for path in sorted(glob.glob(os.path.join(self.spill_dir, 'events-spill-*'))):
+                if not self._claimable(path):
+                    continue
+                claim = f"{path}.recovering-{process_id()}"
+                try:
+                    os.replace(path, claim)
+                except OSError:
+                    continue  # another process claimed it first
+                events = []
+                with open(claim, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            table, row = json.loads(line)
+                        except ValueError:
+                            break  # torn final write
+                        events.append((table, row))
+                start = 0
+                try:
+                    for start in range(0, len(events), self.batch_size):
+                        self._write_checked(events[start:start + self.batch_size])
+                except DB_ERRORS as err:
+                    # Whatever was not written goes back to a spill file.
+                    logger.error("Event replay failed, retrying later: %s", err)
+                    self._spill_events(events[start:])
+                    os.remove(claim)
+                    self._replay_after = time.monotonic() + REPLAY_RETRY_INTERVAL
+                    break
+                os.remove(claim)
+                written += len(events)
+            if written:
+                self._count('replayed', written)
+                logger.warning("Replayed %d spilled event(s)", written)
+            return written
+        finally:
+            self._replay_lock.release()
+
+    # --- Consumers ---
+    def _write(self, events):
+        batches = {}
+        for table, row in events:
+            batches.setdefault(table, (TABLE_COLUMNS[table], []))[1].append(row)
+        db.get_backend().insert_events(batches)
+        self._count('written', len(events))
+        self._count('batches')
+
+    def _write_checked(self, events):
+        # Like _write, but a batch rejected for its data is retried one event
+        # at a time and the events still rejected are dead-lettered. Other
+        # errors propagate; events written one by one before such an error
+        # are written again by the caller's retry (at least once).
+        try:
+            self._write(events)
+            return
+        except DatabaseError as err:
+            if not err.data_error:
+                raise
+            logger.warning("Database rejected a batch of %d event(s), writing them one by one: %s",
+                           len(events), err)
+        for event in events:
+            try:
+                self._write([event])
+            except DatabaseError as err:
+                if not err.data_error:
+                    raise
+                self._dead_letter(event, err)
+
+    def _take_batch(self, timeout):
+        # Blocks for the first event, then takes whatever else is waiting.
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_or_spill(self, batch):
+        try:
+            self._write_checked(batch)
+        except DB_ERRORS as err:
+            logger.error("Failed to write %d event(s), spilling to disk: %s", len(batch), err)
+            self._count('write_errors')
+            self._spill_events(batch)
+            self._replay_after = time.monotonic() + REPLAY_RETRY_INTERVAL
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self._take_batch(self.flush_interval)
+                if batch:
+                    self._write_or_spill(batch)
+                elif not self._stop.is_set():
+                    self.replay()
+            except Exception:
+                logger.exception("Unexpected error in event worker")
+
+    def flush(self):
+        # Drains everything queued so far on the calling thread.
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                return
+            self._write_or_spill(batch)
+
+    def start(self):
+        if not self._threads:
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'event-writer-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=self.flush_interval + 5)
+        self._threads = []
+        self.flush()
+        with self._spill_lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_event_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = EventQueue().start()
+                atexit.register(_queue.stop)
+    return _queue
+
+
+def emit(kind, **fields):
+    get_event_queue().emit(kind, **fields)
+
+
+def queue_stats():
+    # Counters and current depth, or None if this process never emitted.
+    if _queue is None:
+        return None
+    with _queue._stats_lock:
+        return dict(_queue.stats, depth=_queue.depth())
+
+
+def stop_event_queue():
+    # Drains queued events; a no-op if this process never emitted any.
+    if _queue is not None:
+        _queue.stop()
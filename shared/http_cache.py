@@ -0,0 +1,65 @@
+# shared/http_cache.py
+#
+# Conditional GET for dynamic pages. A route declares a validator: a cheap
+# function of the request (catalog version, product id, in-memory ranking)
+# that changes whenever the rendered page would. The validator is hashed
+# into a weak ETag; a request whose If-None-Match matches gets a 304 before
+# the view runs, so nothing is rendered and the page's own queries are
+# skipped. Weak, because the tag is computed from the state the page shows,
+# not from the response bytes: two responses with the same tag are
+# equivalent but are not promised to be byte-identical, which a strong ETag
+# would claim (and range requests would rely on).
+#
+# Each route has a Cache-Control policy, overridable per endpoint with
+# PUP_CACHE_CONTROL_<ENDPOINT>, e.g. PUP_CACHE_CONTROL_HOME="public, max-age=30".
+
+import functools
+import hashlib
+import os
+
+from flask import Response, g, make_response, request
+
+CONDITIONAL_GET = os.environ.get('PUP_CONDITIONAL_GET', '1') != '0'
+# Revalidate on every use: cheap now that a match costs no rendering.
+REVALIDATE = 'no-cache'
+PRIVATE_REVALIDATE = 'private, no-cache'
+# Mixed into every ETag; set it per deployment so a release that changes
+# templates does not match pages cached from the previous one.
+BUILD_ID = os.environ.get('PUP_BUILD_ID', '')
+
+
+def cache_policy(endpoint, default):
+    return os.environ.get(f"PUP_CACHE_CONTROL_{endpoint.upper()}", default)
+
+
+def make_etag(*parts):
+    key = '|'.join(str(part) for part in (BUILD_ID,) + parts)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def conditional(validator, cache_control=REVALIDATE):
+    # `validator` gets the view's arguments and returns a tuple of parts, or
+    # None to serve the page without a validator.
+    def decorate(view):
+        policy = cache_policy(view.__name__, cache_control)
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = validator(*args, **kwargs) if CONDITIONAL_GET else None
+            if parts is None:
+                response = make_response(view(*args, **kwargs))
+                response.headers.setdefault('Cache-Control', policy)
+                return response
+            etag = make_etag(request.full_path, *parts)
+            if request.if_none_match.contains_weak(etag):
+                g.not_modified = True
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = policy
+            return response
+        return wrapper
+    return decorate
@@ -0,0 +1,182 @@
+# shared/images.py
+#
+# Resized, recompressed product image derivatives. Pages reference
+#   /img/<content hash>/<width>/<format>/<path under assets>
+# and the derivative is created on first request (or eagerly when an admin
+# uploads an image), stored on disk under a content-hash filename and served
+# as immutable.
+
+import hashlib
+import io
+import os
+import threading
+import uuid
+
+from flask import abort, redirect, send_file
+from PIL import Image, ImageOps, features
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSETS_DIR = os.path.join(PROJECT_ROOT, 'assets')
+STATIC_PREFIX = '/static/'
+
+IMAGE_CACHE_DIR = os.environ.get('PUP_IMAGE_CACHE_DIR', os.path.join(PROJECT_ROOT, 'cache', 'images'))
+UPLOAD_SUBDIR = os.path.join('images', 'uploads')
+IMAGE_WIDTHS = tuple(int(w) for w in os.environ.get('PUP_IMAGE_WIDTHS', '160,320,640').split(','))
+DEFAULT_WIDTH = 320
+IMAGE_QUALITY = int(os.environ.get('PUP_IMAGE_QUALITY', 80))
+IMAGE_FORMAT = os.environ.get('PUP_IMAGE_FORMAT', 'webp' if features.check('webp') else 'jpeg')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+UPLOAD_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp', 'GIF': 'gif'}
+
+_digests = {}  # path -> (mtime, size, digest)
+_generate_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+# --- Sources ---
+def source_path(image_url):
+    # Maps '/static/images/x.png' to a file under assets/, or None when the
+    # URL is not a local asset (external links, missing files, '..' tricks).
+    if not image_url or not image_url.startswith(STATIC_PREFIX):
+        return None
+    relative = image_url[len(STATIC_PREFIX):]
+    path = os.path.realpath(os.path.join(ASSETS_DIR, relative))
+    if not path.startswith(os.path.realpath(ASSETS_DIR) + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def content_digest(path):
+    stat = os.stat(path)
+    cached = _digests.get(path)
+    if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+        return cached[2]
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            sha.update(block)
+    digest = sha.hexdigest()[:16]
+    _digests[path] = (stat.st_mtime, stat.st_size, digest)
+    return digest
+
+
+# --- Derivatives ---
+def derivative_url(image_url, width, fmt=None):
+    path = source_path(image_url)
+    if path is None:
+        return image_url
+    relative = image_url[len(STATIC_PREFIX):]
+    return f"/img/{content_digest(path)}/{width}/{fmt or IMAGE_FORMAT}/{relative}"
+
+
+def responsive_attrs(image_url, sizes):
+    # Attributes for an <img>: a mid-size `src` for clients without srcset
+    # support (such as the Tk HtmlFrame) plus the full `srcset`.
+    if source_path(image_url) is None:
+        return {'src': image_url}
+    return {
+        'src': derivative_url(image_url, DEFAULT_WIDTH),
+        'srcset': ', '.join(f"{derivative_url(image_url, w)} {w}w" for w in IMAGE_WIDTHS),
+        'sizes': sizes,
+    }
+
+
+def derivative_file(path, digest, width, fmt):
+    pil_format, _ = FORMATS[fmt]
+    filename = f"{digest}-{width}q{IMAGE_QUALITY}.{fmt}"
+    target = os.path.join(IMAGE_CACHE_DIR, filename)
+    if os.path.exists(target):
+        return target
+    with _generate_lock:
+        if os.path.exists(target):
+            return target
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        with Image.open(path) as source:
+            image = ImageOps.exif_transpose(source)
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                # JPEG has no alpha channel; flatten onto white.
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode == 'P':
+                image = image.convert('RGBA')
+            # Write then rename so readers never see a half-written file.
+            temp = f"{target}.{uuid.uuid4().hex}.tmp"
+            image.save(temp, pil_format, quality=IMAGE_QUALITY, optimize=True)
+            os.replace(temp, target)
+    return target
+
+
+def pregenerate(image_url):
+    path = source_path(image_url)
+    if path is None:
+        return
+    digest = content_digest(path)
+    for width in IMAGE_WIDTHS:
+        derivative_file(path, digest, width, IMAGE_FORMAT)
+
+
+# --- Uploads ---
+def save_upload(file_storage):
+    # Validates an uploaded image, stores it under its content hash and
+    # builds its derivatives right away. Returns the new /static/ URL.
+    data = file_storage.read()
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+            pil_format = probe.format
+    except Exception as err:
+        raise InvalidImage(f"Not a valid image: {err}")
+    extension = UPLOAD_EXTENSIONS.get(pil_format)
+    if extension is None:
+        raise InvalidImage(f"Unsupported image format {pil_format}")
+
+    filename = f"{hashlib.sha256(data).hexdigest()[:16]}.{extension}"
+    directory = os.path.join(ASSETS_DIR, UPLOAD_SUBDIR)
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, filename)
+    if not os.path.exists(target):
+        temp = f"{target}.{uuid.uuid4().hex}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        os.replace(temp, target)
+
+    image_url = f"{STATIC_PREFIX}{UPLOAD_SUBDIR.replace(os.sep, '/')}/{filename}"
+    pregenerate(image_url)
+    return image_url
+
+
+# --- Flask ---
+def install(app):
+    def serve_derivative(digest, width, fmt, source):
+        if width not in IMAGE_WIDTHS or fmt not in FORMATS:
+            abort(404)
+        image_url = STATIC_PREFIX + source
+        path = source_path(image_url)
+        if path is None:
+            abort(404)
+        current = content_digest(path)
+        if current != digest:
+            # The source changed since the page was rendered.
+            return redirect(derivative_url(image_url, width, fmt))
+        try:
+            target = derivative_file(path, current, width, fmt)
+        except (OSError, Image.DecompressionBombError):
+            # Pillow cannot decode the source; let the client have the original.
+            return redirect(image_url)
+        response = send_file(target, mimetype=FORMATS[fmt][1], conditional=True, etag=True)
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    app.add_url_rule('/img/<digest>/<int:width>/<fmt>/<path:source>', 'image_derivative', serve_derivative)
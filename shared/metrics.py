@@ -0,0 +1,269 @@
+# shared/metrics.py
+#
+# Low-overhead request and database instrumentation, exposed as Prometheus
+# text on /metrics. Each observation is a couple of perf_counter() calls, a
+# dict lookup and a short lock, so it is meant to stay on in production.
+#
+# The output includes pool, cache and event-queue internals, so /metrics only
+# answers clients in PUP_METRICS_ALLOW (comma-separated addresses or
+# networks, default loopback); everyone else gets a 404.
+
+import ipaddress
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, abort, request
+
+from shared import database as db
+from shared import events
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+METRICS_ALLOW = tuple(ipaddress.ip_network(net.strip(), strict=False)
+                      for net in os.environ.get('PUP_METRICS_ALLOW', '127.0.0.0/8,::1').split(',')
+                      if net.strip())
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        names = self.labels + ('le',)
+        for label_values, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, label_values + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(names, label_values + ('+Inf',))} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        # `collect()` returns (name, type, help, {label tuple: value}, label names)
+        # for values read at scrape time, such as pool or cache statistics.
+        self._collectors.append(collect)
+
+    def expose(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        for collect in self._collectors:
+            for name, kind, help_text, values, label_names in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for label_values, value in values.items():
+                    lines.append(f"{name}{_format_labels(label_names, label_values)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'pup_http_request_duration_seconds', "Time spent handling a request.", ('app', 'route', 'method', 'status'))
+RESPONSE_BYTES = registry.histogram(
+    'pup_http_response_size_bytes', "Size of response bodies.", ('app', 'route'), SIZE_BUCKETS)
+RENDER_SECONDS = registry.histogram(
+    'pup_http_render_seconds', "Time spent rendering HTML per request, excluding DB time.", ('app', 'route'))
+REQUEST_DB_SECONDS = registry.histogram(
+    'pup_http_db_seconds', "Time spent in database calls per request.", ('app', 'route'))
+DB_QUERY_SECONDS = registry.histogram(
+    'pup_db_query_duration_seconds', "Duration of individual database statements.", ('operation',))
+DB_SLOW_QUERIES = registry.counter(
+    'pup_db_slow_queries_total', "Statements slower than the slow-query threshold.", ('operation',))
+
+
+def _collect_database():
+    pool = db.pool_stats()
+    cache = db.catalog_cache_stats()
+    queries = db.query_stats()
+    return [
+        ('pup_db_pool_connections', 'gauge', "Pooled connections by state.",
+         {('in_use',): pool['in_use'], ('idle',): pool['idle'], ('open',): pool['open']}, ('state',)),
+        ('pup_db_pool_waits_total', 'counter', "Checkouts that had to wait for a connection.",
+         {(): pool['waits']}, ()),
+        ('pup_db_pool_wait_seconds_total', 'counter', "Total time spent waiting for a connection.",
+         {(): pool['wait_time']}, ()),
+        ('pup_db_pool_timeouts_total', 'counter', "Checkouts that gave up waiting.",
+         {(): pool['timeouts']}, ()),
+        ('pup_db_queries_total', 'counter', "Statements executed.",
+         {(): queries['queries']}, ()),
+        ('pup_db_query_seconds_total', 'counter', "Total time spent executing statements.",
+         {(): queries['total_time']}, ()),
+        ('pup_catalog_cache_requests_total', 'counter', "Catalog cache lookups by result.",
+         {('hit',): cache['hits'], ('miss',): cache['misses']}, ('result',)),
+        ('pup_catalog_cache_entries', 'gauge', "Entries held in the catalog cache.",
+         {(): cache['size']}, ()),
+    ]
+
+
+registry.add_collector(_collect_database)
+
+
+def _collect_events():
+    stats = events.queue_stats()
+    if stats is None:
+        return []
+    return [
+        ('pup_events_queue_depth', 'gauge', "Events waiting for a writer thread.",
+         {(): stats['depth']}, ()),
+        ('pup_events_total', 'counter',
+         "Events by outcome: queued, written, spilled to disk, replayed or dead-lettered.",
+         {(outcome,): stats[outcome] for outcome in ('queued', 'written', 'spilled', 'replayed', 'dead_lettered')},
+         ('outcome',)),
+        ('pup_events_batches_total', 'counter', "Batches written to the database.",
+         {(): stats['batches']}, ()),
+        ('pup_events_write_errors_total', 'counter', "Batches that could not be written and were spilled.",
+         {(): stats['write_errors']}, ()),
+    ]
+
+
+registry.add_collector(_collect_events)
+
+# Per-request accumulators; a request is served start to finish on one thread.
+_request = threading.local()
+
+
+def _route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def observe_query(operation, elapsed, slow):
+    DB_QUERY_SECONDS.observe(elapsed, operation)
+    if slow:
+        DB_SLOW_QUERIES.inc(operation)
+    if getattr(_request, 'active', False):
+        _request.db += elapsed
+
+
+db.set_metrics_hook(observe_query)
+
+
+@contextmanager
+def render_phase():
+    # Times a rendering block; DB calls made while rendering are subtracted
+    # so render and DB time never overlap.
+    if not getattr(_request, 'active', False):
+        yield
+        return
+    start = time.perf_counter()
+    db_before = _request.db
+    try:
+        yield
+    finally:
+        _request.render += (time.perf_counter() - start) - (_request.db - db_before)
+
+
+def scrape_allowed(address):
+    try:
+        address = ipaddress.ip_address(address or '')
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOW)
+
+
+def install(app, app_name):
+    # Adds timing hooks and a /metrics route to a Flask app.
+    def start_timer():
+        _request.active = True
+        _request.start = time.perf_counter()
+        _request.db = 0.0
+        _request.render = 0.0
+
+    def record(response):
+        if not getattr(_request, 'active', False):
+            return response
+        elapsed = time.perf_counter() - _request.start
+        route = _route_label()
+        REQUEST_SECONDS.observe(elapsed, app_name, route, request.method, response.status_code)
+        REQUEST_DB_SECONDS.observe(_request.db, app_name, route)
+        RENDER_SECONDS.observe(_request.render, app_name, route)
+        size = response.calculate_content_length()
+        if size is not None:
+            RESPONSE_BYTES.observe(size, app_name, route)
+        return response
+
+    def finish(_exc):
+        _request.active = False
+
+    app.before_request(start_timer)
+    app.after_request(record)
+    app.teardown_request(finish)
+
+    def metrics():
+        if not scrape_allowed(request.remote_addr):
+            abort(404)
+        return Response(registry.expose(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -0,0 +1,167 @@
+# shared/pool.py
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    # A small, thread-safe pool of reusable DB-API connections.
+    #   factory      -> callable returning a new connection
+    #   validate     -> callable(conn) raising/returning False when conn is dead
+    #   size         -> maximum number of open connections
+    #   idle_timeout -> idle connections older than this are closed
+    #   check_after  -> only health-check connections idle longer than this
+    def __init__(self, factory, size=5, validate=None, idle_timeout=300,
+                 check_after=30, checkout_timeout=10):
+        self.factory = factory
+        self.validate = validate
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()  # (conn, last_used)
+        self._open = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'evicted': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+        }
+
+    # --- Checkout / Checkin ---
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                self._evict_idle_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn, last_used = None, None
+                    break
+                if waited is None:
+                    waited = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['wait_time'] += time.monotonic() - waited
+                    raise PoolTimeout(f"No connection available after {self.checkout_timeout}s")
+                self._cond.wait(remaining)
+            if waited is not None:
+                self._stats['wait_time'] += time.monotonic() - waited
+            self._stats['checkouts'] += 1
+
+        # Connecting and pinging happen outside the lock.
+        if conn is not None and time.monotonic() - last_used > self.check_after:
+            if not self._is_healthy(conn):
+                self._close(conn)
+                with self._cond:
+                    self._stats['discarded'] += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self.factory()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            if discard or self._closed:
+                self._open -= 1
+                self._stats['discarded'] += 1 if discard else 0
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._cond.notify()
+        if conn is not None:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=not self._reset(conn))
+            raise
+        else:
+            self.release(conn, discard=not self._reset(conn))
+
+    # --- Maintenance ---
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._open -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        return stats
+
+    def _evict_idle_locked(self):
+        # Oldest connections sit at the left end of the deque.
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._open -= 1
+            self._stats['evicted'] += 1
+            self._close(conn)
+
+    def _is_healthy(self, conn):
+        if self.validate is None:
+            return True
+        try:
+            return self.validate(conn) is not False
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset(conn):
+        # End any open transaction so the next borrower never sees a stale
+        # snapshot or half-finished writes.
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,63 @@
+# shared/procutil.py
+#
+# Process helpers shared by the modules that leave per-process files behind
+# (cart journals, event spill files) and must tell whether their owner is
+# still running. Files are named by process_id(), not the bare pid: after a
+# crash the restarted process often gets the same pid (always 1 in a
+# container), and must still see the old files as left by a dead process.
+
+import os
+import uuid
+
+_process_id = None  # (pid, id) for the process that computed it
+
+
+def pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows, and the desktop
+        # launchers run a single server process there anyway.
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def start_time(pid):
+    # When `pid` started, in clock ticks since boot; None without /proc.
+    try:
+        with open(f"/proc/{pid}/stat", encoding='ascii', errors='replace') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_id():
+    # "<pid>-<start time>" (or "<pid>-<uuid>" without /proc): unique to this
+    # process even when its pid is reused. Recomputed after a fork.
+    global _process_id
+    pid = os.getpid()
+    if _process_id is None or _process_id[0] != pid:
+        started = start_time(pid)
+        _process_id = (pid, f"{pid}-{started if started is not None else uuid.uuid4().hex}")
+    return _process_id[1]
+
+
+def owner_alive(owner):
+    # Whether the process that named itself `owner` (a process_id(), or a
+    # bare pid from older file names) is still running.
+    pid, _, stamp = owner.partition('-')
+    try:
+        pid = int(pid)
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return owner == process_id()
+    if not pid_alive(pid):
+        return False
+    started = start_time(pid)
+    return started is None or not stamp.isdigit() or str(started) == stamp
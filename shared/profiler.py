@@ -0,0 +1,256 @@
+# shared/profiler.py
+#
+# Opt-in query profiling (PUP_QUERY_PROFILE=1). Every statement run through
+# a backend cursor is grouped by shape (whitespace collapsed, IN lists of
+# any length folded together) with its count, total and max time. A
+# background thread runs EXPLAIN on each new shape, and again every
+# PUP_QUERY_PROFILE_EXPLAIN_INTERVAL seconds while it keeps running, since
+# plans and row counts change as tables grow. Shapes whose plan has a full
+# table scan or a sort/temporary table are flagged.
+#
+# Each process writes its profile to PUP_QUERY_PROFILE_DIR. The report
+# merges the files: /admin/query-profile those of running processes (a file
+# whose process has exited, or that has not been rewritten for a few dump
+# intervals, is left out), the CLI below also the final profiles of
+# processes that have finished, such as a load test:
+#
+#   PUP_QUERY_PROFILE=1 PUP_DB_BACKEND=sqlite python -m benchmarks.load_test
+#   python -m shared.profiler --top 20
+
+import argparse
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+
+from shared.backends import DB_ERRORS, QUERY_OBSERVERS
+from shared.images import PROJECT_ROOT
+from shared.procutil import owner_alive, process_id
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get('PUP_QUERY_PROFILE_DIR', os.path.join(PROJECT_ROOT, 'cache', 'profile'))
+EXPLAIN_INTERVAL = float(os.environ.get('PUP_QUERY_PROFILE_EXPLAIN_INTERVAL', 60))
+DUMP_INTERVAL = float(os.environ.get('PUP_QUERY_PROFILE_DUMP_INTERVAL', 10))
+STALE_AFTER = 3 * DUMP_INTERVAL
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+
+_shapes = {}  # shape -> stats dict
+_lock = threading.Lock()
+_explain_queue = queue.Queue()
+_local = threading.local()
+_thread = None
+
+
+def shape_of(sql):
+    return _IN_LIST.sub("IN (...)", ' '.join(sql.split()))
+
+
+# --- Recording ---
+def _observe(backend, sql, params, elapsed):
+    if getattr(_local, 'explaining', False):
+        return
+    shape = shape_of(sql)
+    now = time.monotonic()
+    with _lock:
+        stats = _shapes.get(shape)
+        if stats is None:
+            stats = _shapes[shape] = {
+                'shape': shape, 'backend': backend.name, 'count': 0, 'total': 0.0, 'max': 0.0,
+                'plan': None, 'explain_error': None, 'explained_at': None, 'pending': False,
+            }
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        explain = (not stats['pending'] and shape.split(None, 1)[0].upper() in EXPLAINABLE
+                   and (stats['explained_at'] is None or now - stats['explained_at'] > EXPLAIN_INTERVAL))
+        if explain:
+            stats['pending'] = True
+    if explain:
+        # executemany passes a sequence of parameter tuples; one is enough.
+        if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        _explain_queue.put((backend, shape, sql, params))
+
+
+def _explain(backend, shape, sql, params):
+    _local.explaining = True
+    try:
+        plan, error = backend.explain(sql, params), None
+    except DB_ERRORS as err:
+        plan, error = None, str(err)
+    finally:
+        _local.explaining = False
+    with _lock:
+        stats = _shapes[shape]
+        stats['plan'], stats['explain_error'] = plan, error
+        stats['explained_at'] = time.monotonic()
+        stats['pending'] = False
+
+
+def _run():
+    dumped_at = time.monotonic()
+    while True:
+        try:
+            _explain(*_explain_queue.get(timeout=DUMP_INTERVAL))
+        except queue.Empty:
+            pass
+        except Exception:
+            logger.exception("Unexpected error while explaining a query")
+        if time.monotonic() - dumped_at >= DUMP_INTERVAL:
+            dump()
+            dumped_at = time.monotonic()
+
+
+def enable():
+    global _thread
+    if _thread is not None:
+        return
+    QUERY_OBSERVERS.append(_observe)
+    _thread = threading.Thread(target=_run, name='query-profiler', daemon=True)
+    _thread.start()
+    atexit.register(dump)
+
+
+def enabled():
+    return _thread is not None
+
+
+# --- Reports ---
+def snapshot():
+    with _lock:
+        return [{key: value for key, value in stats.items() if key not in ('explained_at', 'pending')}
+                for stats in _shapes.values()]
+
+
+def _profile_path():
+    return os.path.join(PROFILE_DIR, f"profile-{process_id()}.json")
+
+
+def dump():
+    # Replaces this process's profile file.
+    if not _shapes:
+        return
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = _profile_path()
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'pid': os.getpid(), 'process': process_id(), 'written_at': time.time(),
+                   'shapes': snapshot()}, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_profiles(finished=False):
+    # Statements of every running process merged by shape; with `finished`,
+    # also those of processes that have exited. This process's live figures
+    # replace its file, which may be a few seconds old.
+    merged = {}
+    profiles = []
+    for path in glob.glob(os.path.join(PROFILE_DIR, 'profile-*.json')):
+        if path == _profile_path() and enabled():
+            continue
+        try:
+            with open(path, encoding='utf-8') as f:
+                profile = json.load(f)
+            owner, shapes = profile.get('process') or str(profile['pid']), profile['shapes']
+        except (OSError, ValueError, KeyError) as err:
+            logger.warning("Skipping unreadable profile %s: %s", path, err)
+            continue
+        if not finished and (not owner_alive(owner) or time.time() - profile.get('written_at', 0) > STALE_AFTER):
+            continue
+        profiles.append(shapes)
+    if enabled():
+        profiles.append(snapshot())
+    for shapes in profiles:
+        for stats in shapes:
+            entry = merged.get(stats['shape'])
+            if entry is None:
+                merged[stats['shape']] = dict(stats)
+                continue
+            entry['count'] += stats['count']
+            entry['total'] += stats['total']
+            entry['max'] = max(entry['max'], stats['max'])
+            if stats['plan'] is not None:
+                entry['plan'] = stats['plan']
+    return merged
+
+
+def report(top=None, finished=False):
+    # Statements by total time, with their plan flags and the rows their
+    # plan examines per call (estimated; None when the plan gives none).
+    rows = []
+    for stats in load_profiles(finished).values():
+        plan = stats['plan'] or []
+        examined = [step['rows'] for step in plan if step['rows'] is not None]
+        rows.append(dict(
+            stats,
+            mean=stats['total'] / stats['count'] if stats['count'] else 0.0,
+            rows_examined=sum(examined) if examined else None,
+            full_scans=sorted({step['table'] or '?' for step in plan if step['full_scan']}),
+            filesort=any(step['filesort'] for step in plan),
+        ))
+    rows.sort(key=lambda row: row['total'], reverse=True)
+    return rows[:top] if top else rows
+
+
+def format_report(rows):
+    lines = [f"{'count':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>8}  flags / statement"]
+    for row in rows:
+        flags = [f"FULL SCAN {table}" for table in row['full_scans']]
+        if row['filesort']:
+            flags.append("FILESORT")
+        if row['explain_error']:
+            flags.append(f"EXPLAIN FAILED: {row['explain_error']}")
+        examined = '-' if row['rows_examined'] is None else row['rows_examined']
+        lines.append(f"{row['count']:>8} {row['total'] * 1000:>10.1f} {row['mean'] * 1000:>9.2f} "
+                     f"{row['max'] * 1000:>9.2f} {examined:>8}  {'; '.join(flags)}")
+        lines.append(f"{'':>49}{row['shape']}")
+    return "\n".join(lines)
+
+
+def reset():
+    with _lock:
+        _shapes.clear()
+    for path in glob.glob(os.path.join(PROFILE_DIR, 'profile-*.json')):
+        os.remove(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query profile collected with PUP_QUERY_PROFILE=1.")
+    parser.add_argument('--top', type=int, default=None, help="only the N statements with the most total time")
+    parser.add_argument('--flagged', action='store_true', help="only statements with a full scan or filesort")
+    parser.add_argument('--json', action='store_true', help="print JSON instead of a table")
+    parser.add_argument('--output', help="write the report to this file instead of stdout")
+    parser.add_argument('--running', action='store_true',
+                        help="only processes still running, as /admin/query-profile shows")
+    parser.add_argument('--reset', action='store_true', help="delete the collected profiles")
+    args = parser.parse_args(argv)
+
+    if args.reset:
+        reset()
+        print(f"Removed query profiles in {PROFILE_DIR}")
+        return 0
+    rows = report(finished=not args.running)
+    if args.flagged:
+        rows = [row for row in rows if row['full_scans'] or row['filesort']]
+    if args.top:
+        rows = rows[:args.top]
+    text = json.dumps(rows, indent=2, default=str) if args.json else format_report(rows)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+        print(f"Wrote {len(rows)} statement(s) to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# shared/rendering.py
+
+import hashlib
+import os
+from html import escape
+
+import dominate
+from dominate.tags import div, comment
+from dominate.util import container, raw
+
+from shared.cache import LRUCache
+from shared import database as db
+
+FRAGMENT_CACHE_ENABLED = os.environ.get('PUP_FRAGMENT_CACHE', '1') != '0'
+FRAGMENT_CACHE_SIZE = int(os.environ.get('PUP_FRAGMENT_CACHE_SIZE', 4096))
+
+_TITLE_MARKER = 'PUP-SHELL-TITLE'
+_BODY_MARKER = 'PUP-SHELL-BODY'
+
+
+class PageShell:
+    # The static part of a page (doctype, head, container) is rendered once
+    # and split around the title and body; each request only joins strings.
+    def __init__(self, build_head, **container_attrs):
+        doc = dominate.document(title=_TITLE_MARKER)
+        with doc.head:
+            build_head()
+        with doc.body:
+            with div(**container_attrs):
+                comment(_BODY_MARKER)
+        html = doc.render()
+        self._before_title, rest = html.split(_TITLE_MARKER, 1)
+        self._before_body, self._after_body = rest.split(f"<!--{_BODY_MARKER}-->", 1)
+        # Changes with the head (fingerprinted asset URLs); part of page ETags.
+        self.digest = hashlib.sha1(html.encode('utf-8')).hexdigest()[:12]
+
+    def render(self, title, body_html):
+        return ''.join((self._before_title, escape(title), self._before_body,
+                        body_html, self._after_body))
+
+
+def render_fragment(content_func, *args):
+    # Renders the tags created by content_func without a wrapping element.
+    with container() as fragment:
+        content_func(*args)
+    # Created inside another `with` block, the container would be attached to
+    # it on exit; mark it used (as dominate does for decorators) to detach it.
+    if fragment._ctx is not None:
+        fragment._ctx.used.add(fragment)
+    return fragment.render()
+
+
+class FragmentCache:
+    # HTML fragments derived from the catalog, keyed by catalog version. A
+    # version change (a local write or one seen from the other app) evicts
+    # everything rendered from the old catalog.
+    def __init__(self, maxsize=FRAGMENT_CACHE_SIZE):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._version = None
+
+    def get_or_render(self, key, content_func, *args):
+        if not FRAGMENT_CACHE_ENABLED:
+            return render_fragment(content_func, *args)
+        version = db.catalog_version()
+        if version != self._version:
+            self._cache.clear()
+            self._version = version
+        return self._cache.get_or_load((version,) + key,
+                                       lambda: render_fragment(content_func, *args))
+
+    def include(self, key, content_func, *args):
+        # Inline a cached fragment into the current dominate context.
+        return raw(self.get_or_render(key, content_func, *args))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,380 @@
+# shared/search.py
+#
+# In-process product search. An inverted index over name, variations and
+# description is built from the catalog in the background when a server
+# process starts (start()), kept current by the data layer's catalog
+# observers for writes made in this process, and rebuilt in the background
+# when the catalog version moves because of a write from another process
+# (for example the admin app). Until the first build finishes, searches run
+# a plain SQL match instead, so no request waits for the build.
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from heapq import heappush, heapreplace, merge
+
+from shared import database as db
+from shared.backends import DB_ERRORS
+from shared.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = int(os.environ.get('PUP_SEARCH_LIMIT', 24))
+MAX_PREFIX_EXPANSIONS = int(os.environ.get('PUP_SEARCH_MAX_PREFIX_EXPANSIONS', 50))
+SOLD_BOOST = float(os.environ.get('PUP_SEARCH_SOLD_BOOST', 0.1))
+# How long per-term rankings and cached results may lag behind sales.
+TOP_LIST_TTL = float(os.environ.get('PUP_SEARCH_TOP_TTL', 300))
+# Multi-word queries stop after this many best-first candidates of their
+# rarest word, bounding the cost when every word is common.
+MAX_SCAN = int(os.environ.get('PUP_SEARCH_MAX_SCAN', 500))
+RESULT_CACHE_SIZE = int(os.environ.get('PUP_SEARCH_RESULT_CACHE_SIZE', 1024))
+
+INDEX_COLUMNS = ('id', 'name', 'description', 'variations', 'price', 'image_url', 'sold_count')
+# Stored per document so result lists render without a database round trip.
+STORED_FIELDS = ('id', 'name', 'price', 'image_url', 'sold_count')
+FIELD_WEIGHTS = (('name', 3.0), ('variations', 2.0), ('description', 1.0))
+
+# How strongly each kind of term match counts.
+EXACT, PREFIX, TYPO = 1.0, 0.7, 0.5
+MIN_PREFIX_LENGTH = 2
+MIN_TYPO_LENGTH = 4
+
+# --- Tokenization ---
+# English and Filipino function words; they match nearly every product.
+STOPWORDS = frozenset("""
+    a an and are as at be by for from in is it of on or the to with
+    ang ay mga na nang ng ni para sa si at kay ko mo po
+""".split())
+
+_WORD = re.compile(r"[0-9a-z]+")
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+
+def normalize(text):
+    # Lowercase and drop accents so "Niño" and "nino" are the same word.
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(word):
+    # Light English plural folding (bags -> bag, accessories -> accessory).
+    # Filipino marks plurals with "mga" instead, which is a stopword.
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    # Hyphenated Filipino words (pang-araw-araw) split into their parts.
+    if not text:
+        return []
+    return [stem(word) for word in _WORD.findall(normalize(text))
+            if word not in STOPWORDS and (len(word) > 1 or word.isdigit())]
+
+
+def _edits1(word):
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    deletes = [l + r[1:] for l, r in splits if r]
+    transposes = [l + r[1] + r[0] + r[2:] for l, r in splits if len(r) > 1]
+    replaces = [l + c + r[1:] for l, r in splits if r for c in _ALPHABET]
+    inserts = [l + c + r for l, r in splits for c in _ALPHABET]
+    return set(deletes + transposes + replaces + inserts)
+
+
+# --- Index ---
+class SearchIndex:
+    # Each term keeps an "impact" list of its products sorted by field
+    # weight x sales boost, built lazily and reused for TOP_LIST_TTL seconds.
+    # A query walks those lists best-first and stops once the top `limit`
+    # results are settled, so its cost depends on `limit` rather than on how
+    # many products share a common word.
+    def __init__(self, version=None):
+        self.version = version
+        self.docs = {}        # product id -> stored fields
+        self.doc_terms = {}   # product id -> {term: weight}
+        self.postings = {}    # term -> {product id: weight}
+        self.terms = []       # sorted vocabulary, for prefix lookups
+        self.boost = {}       # product id -> 1 + SOLD_BOOST * log(1 + sold_count)
+        self._impacts = {}    # term -> (built at, [(weight * boost, product id), ...])
+        self._results = LRUCache(maxsize=RESULT_CACHE_SIZE, ttl=TOP_LIST_TTL)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _weights(self, product):
+        weights = {}
+        for field, field_weight in FIELD_WEIGHTS:
+            for term in tokenize(product.get(field)):
+                weights[term] = weights.get(term, 0.0) + field_weight
+        return weights
+
+    def _set_boost(self, product_id, sold_count):
+        boost = 1 + SOLD_BOOST * math.log1p(max(0, sold_count or 0))
+        self.boost[product_id] = boost
+
+    def add(self, product):
+        with self._lock:
+            product_id = product['id']
+            if product_id in self.docs:
+                self.remove(product_id)
+            weights = self._weights(product)
+            self.docs[product_id] = {field: product.get(field) for field in STORED_FIELDS}
+            self.doc_terms[product_id] = weights
+            self._set_boost(product_id, product.get('sold_count'))
+            for term, weight in weights.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    self.terms.insert(bisect_left(self.terms, term), term)
+                posting[product_id] = weight
+                self._impacts.pop(term, None)
+            self._results.clear()
+
+    def remove(self, product_id):
+        with self._lock:
+            self.docs.pop(product_id, None)
+            self.boost.pop(product_id, None)
+            for term in self.doc_terms.pop(product_id, {}):
+                posting = self.postings[term]
+                posting.pop(product_id, None)
+                self._impacts.pop(term, None)
+                if not posting:
+                    del self.postings[term]
+                    del self.terms[bisect_left(self.terms, term)]
+            self._results.clear()
+
+    def record_sale(self, product_id, sold_count):
+        # Cheap on purpose: impact lists and cached results pick the new
+        # boost up when they expire (TOP_LIST_TTL).
+        with self._lock:
+            doc = self.docs.get(product_id)
+            if doc is not None:
+                doc['sold_count'] = sold_count
+                self._set_boost(product_id, sold_count)
+
+    def _impact_list(self, term):
+        entry = self._impacts.get(term)
+        now = time.monotonic()
+        if entry is None or now - entry[0] > TOP_LIST_TTL:
+            boost = self.boost
+            impacts = sorted(((weight * boost[pid], pid) for pid, weight in self.postings[term].items()),
+                             reverse=True)
+            entry = self._impacts[term] = (now, impacts)
+        return entry[1]
+
+    def _candidates(self, token):
+        # term -> match factor for one query token.
+        candidates = {}
+        if token in self.postings:
+            candidates[token] = EXACT
+        if len(token) >= MIN_PREFIX_LENGTH:
+            start = bisect_left(self.terms, token)
+            for term in self.terms[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+                if not term.startswith(token):
+                    break
+                candidates.setdefault(term, PREFIX)
+        if not candidates and len(token) >= MIN_TYPO_LENGTH:
+            for term in _edits1(token):
+                if term in self.postings:
+                    candidates[term] = TYPO
+        return candidates
+
+    def _scales(self, candidates):
+        # term -> idf x match factor.
+        total = len(self.docs)
+        return {term: math.log(1 + total / len(self.postings[term])) * factor
+                for term, factor in candidates.items()}
+
+    def _stream(self, scales):
+        # (score, product id) best-first across all of a token's terms; a
+        # product's first appearance carries its best-matching term.
+        streams = [((impact * scale, pid) for impact, pid in self._impact_list(term))
+                   for term, scale in scales.items()]
+        return merge(*streams, reverse=True)
+
+    def _relevance(self, scales, product_id):
+        best = 0.0
+        for term, scale in scales.items():
+            weight = self.postings[term].get(product_id)
+            if weight is not None and weight * scale > best:
+                best = weight * scale
+        return best
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        # Every query token must match (exactly, as a prefix, or within one
+        # typo). Score = sum of token relevance x sales boost.
+        tokens = tuple(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        key = (tokens, limit)
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            per_token = [self._scales(self._candidates(token)) for token in tokens]
+            if not all(per_token):
+                return []
+            # Drive from the rarest token; the others only need lookups.
+            per_token.sort(key=lambda scales: sum(len(self.postings[t]) for t in scales))
+            driver, others = per_token[0], per_token[1:]
+            # Best score any unseen product could still get from the others
+            # (the head of each impact list is that term's best weight x boost).
+            others_max = sum(max(self._impact_list(t)[0][0] * scale for t, scale in scales.items())
+                             for scales in others)
+
+            found = set()
+            results = []  # min-heap of (score, product id)
+            for score, pid in self._stream(driver):
+                if len(results) >= limit and score + others_max <= results[0][0]:
+                    break
+                if pid in found:
+                    continue
+                found.add(pid)
+                if len(found) > MAX_SCAN:
+                    break
+                if others:
+                    extra = 0.0
+                    for scales in others:
+                        relevance = self._relevance(scales, pid)
+                        if not relevance:
+                            break
+                        extra += relevance
+                    else:
+                        score += extra * self.boost[pid]
+                        self._keep(results, limit, score, pid)
+                    continue
+                self._keep(results, limit, score, pid)
+                if len(results) >= limit:
+                    break  # single token: the stream is already best-first
+
+            ranked = [dict(self.docs[pid], score=round(score, 4))
+                      for score, pid in sorted(results, reverse=True)]
+            self._results.set(key, ranked)
+        return ranked
+
+    @staticmethod
+    def _keep(results, limit, score, pid):
+        if len(results) < limit:
+            heappush(results, (score, pid))
+        elif score > results[0][0]:
+            heapreplace(results, (score, pid))
+
+
+def build_index():
+    # The version is read first: a write that lands while products are being
+    # read bumps it again, so the next check schedules another rebuild.
+    version = db.get_backend().catalog_version()
+    index = SearchIndex(version)
+    for product in db.get_backend().iter_products(db.EXPORT_BATCH_SIZE, INDEX_COLUMNS):
+        index.add(product)
+    return index
+
+
+# --- Process-wide index ---
+_index = None
+_index_lock = threading.Lock()
+_rebuilding = False
+_local_writes = 0  # version bumps made by this process since the index was built
+
+
+def start():
+    # Starts the first build on a background thread.
+    if _index is None:
+        _schedule_rebuild()
+
+
+def get_index():
+    # The current index, or None while the first build is still running.
+    if _index is None:
+        _schedule_rebuild()
+        return None
+    _check_version()
+    return _index
+
+
+def _check_version():
+    # Each catalog write bumps the version by one. If the bumps since the
+    # build are all ours (already applied incrementally), just adopt the new
+    # version; otherwise another process changed the catalog.
+    global _local_writes
+    version = db.catalog_version()
+    with _index_lock:
+        index = _index
+        if version == index.version:
+            return
+        if version - index.version == _local_writes:
+            index.version = version
+            _local_writes = 0
+            return
+    _schedule_rebuild()
+
+
+def _schedule_rebuild():
+    global _rebuilding
+    with _index_lock:
+        if _rebuilding:
+            return
+        _rebuilding = True
+    threading.Thread(target=_rebuild, name='search-rebuild', daemon=True).start()
+
+
+def _rebuild():
+    global _index, _rebuilding, _local_writes
+    try:
+        started = time.perf_counter()
+        index = build_index()
+        with _index_lock:
+            _index = index
+            _local_writes = 0
+        logger.info("Search index built: %d products in %.2f s", len(index), time.perf_counter() - started)
+    except DB_ERRORS as err:
+        logger.error("Search index rebuild failed: %s", err)
+    finally:
+        _rebuilding = False
+
+
+def _on_catalog_change(event, product_id, data):
+    global _local_writes
+    index = _index
+    if index is None:
+        return  # built from the database on first use
+    if event in ('saved', 'deleted'):
+        if event == 'saved':
+            index.add(data)
+        else:
+            index.remove(product_id)
+        with _index_lock:
+            _local_writes += 1
+    elif event == 'sold':
+        index.record_sale(product_id, data['sold_count'])
+    elif event == 'bulk':
+        _schedule_rebuild()
+
+
+db.CATALOG_OBSERVERS.append(_on_catalog_change)
+
+
+def _search_database(query, limit):
+    words = tuple(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+    return [dict(row, score=None) for row in db.get_backend().search_products(words, limit)]
+
+
+def search(query, limit=SEARCH_LIMIT):
+    try:
+        index = get_index()
+        if index is None:
+            return _search_database(query, limit)
+        return index.search(query, limit)
+    except DB_ERRORS as err:
+        logger.error("Search failed: %s", err)
+        return []
@@ -0,0 +1,360 @@
+# shared/server.py
+#
+# Production serving for the shop and admin apps. Each worker process runs
+# the Flask app under waitress with a fixed pool of request threads; with
+# PUP_SERVE_WORKERS > 1 the workers are forked from a master process and
+# share one listening socket, so requests spread across cores. The master
+# restarts workers that die and, on SIGTERM/SIGINT, asks every worker to stop
+# accepting connections and finish the requests it already has.
+#
+# /ready answers 200 once the database is set up and the worker is
+# accepting, and 503 while draining, so launchers and load balancers can
+# wait on it.
+
+import argparse
+import importlib
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from flask import jsonify
+from waitress.server import create_server
+
+from shared import database as db
+from shared import cart
+from shared import credentials
+from shared import events
+from shared import startup
+from shared.images import PROJECT_ROOT
+
+logger = logging.getLogger(__name__)
+
+SERVE_HOST = os.environ.get('PUP_SERVE_HOST', '127.0.0.1')
+SERVE_WORKERS = int(os.environ.get('PUP_SERVE_WORKERS', 1))
+SERVE_THREADS = int(os.environ.get('PUP_SERVE_THREADS', 8))
+SHUTDOWN_TIMEOUT = float(os.environ.get('PUP_SERVE_SHUTDOWN_TIMEOUT', 10))
+READY_TIMEOUT = float(os.environ.get('PUP_SERVE_READY_TIMEOUT', 30))
+# Used when PUP_SECRET_KEY is unset; see secret_key().
+SECRET_KEY_FILE = os.environ.get('PUP_SECRET_KEY_FILE', os.path.join(PROJECT_ROOT, 'cache', 'secret_key'))
+LISTEN_BACKLOG = 1024
+LOOP_TIMEOUT = 0.5        # how quickly a worker notices a stop request
+RESPAWN_BACKOFF = 1.0     # pause before replacing a worker that died young
+
+# name -> (module with a Flask `app`, default port)
+APPS = {
+    'shop': ('shop_app.web_pages', 5000),
+    'admin': ('admin_app.admin_pages', 5001),
+}
+
+_ready = threading.Event()
+_stopping = threading.Event()
+_start_hooks = []
+
+
+# --- Start hooks ---
+def on_start(hook):
+    # `hook()` runs in every serving process (each forked worker, or the
+    # in-process server) once the database is set up, e.g. to start warming
+    # an in-memory index. It must not block.
+    _start_hooks.append(hook)
+
+
+def _run_start_hooks():
+    for hook in _start_hooks:
+        try:
+            hook()
+        except Exception:
+            logger.exception("Start hook %r failed", hook)
+
+
+# --- Session Secret ---
+def secret_key():
+    # PUP_SECRET_KEY, or else a random key generated on first start and kept
+    # in SECRET_KEY_FILE, so restarts and the other workers on this host sign
+    # sessions with the same key. Hosts behind one load balancer must still
+    # share an explicit PUP_SECRET_KEY.
+    key = os.environ.get('PUP_SECRET_KEY')
+    if key:
+        return key
+    try:
+        with open(SECRET_KEY_FILE, 'rb') as f:
+            key = f.read().strip()
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(SECRET_KEY_FILE), exist_ok=True)
+        # Written aside and linked into place, so a worker starting at the
+        # same moment either sees no file or the complete key.
+        tmp = f"{SECRET_KEY_FILE}.{os.getpid()}.tmp"
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            f.write(os.urandom(32).hex().encode('ascii'))
+        try:
+            os.link(tmp, SECRET_KEY_FILE)
+            logger.warning("PUP_SECRET_KEY is not set; generated a session key in %s", SECRET_KEY_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+        with open(SECRET_KEY_FILE, 'rb') as f:
+            key = f.read().strip()
+    if len(key) < 32:
+        raise RuntimeError(f"Session key file {SECRET_KEY_FILE} is truncated; delete it or set PUP_SECRET_KEY")
+    return key
+
+
+# --- Readiness ---
+def install(app):
+    # Adds the /ready probe to a Flask app.
+    def ready():
+        if _ready.is_set() and not _stopping.is_set():
+            return jsonify({'status': 'ready', 'pid': os.getpid()})
+        return jsonify({'status': 'starting' if not _stopping.is_set() else 'stopping'}), 503
+
+    app.add_url_rule('/ready', 'ready', ready)
+
+
+def wait_until_ready(url, timeout=READY_TIMEOUT):
+    # Polls a /ready URL; True once it answers 200.
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.1)
+    return False
+
+
+# --- Worker ---
+def _listen(host, port):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(LISTEN_BACKLOG)
+    return sock
+
+
+def _create_server(app, sock, threads):
+    return create_server(app, sockets=[sock], threads=threads, ident='pup-shop',
+                         asyncore_loop_timeout=LOOP_TIMEOUT)
+
+
+def _busy(channel):
+    return channel.requests or channel.total_outbufs_len
+
+
+def _run(server, stop):
+    # waitress's own run() only returns on KeyboardInterrupt and then drops
+    # in-flight responses, so the loop is driven here instead.
+    loop = server.asyncore.loop
+    use_poll = server.adj.asyncore_use_poll
+    _ready.set()
+    startup.mark('accepting')
+    while not stop.is_set():
+        loop(timeout=LOOP_TIMEOUT, map=server._map, use_poll=use_poll, count=1)
+
+    # Drain: stop accepting (the other workers keep their copy of the socket),
+    # close idle keep-alive connections, let busy ones finish.
+    _stopping.set()
+    server.accepting = False
+    server.del_channel()
+    server.socket.close()
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+    while time.monotonic() < deadline:
+        channels = list(server.active_channels.values())
+        for channel in channels:
+            if not _busy(channel):
+                channel.will_close = True
+        if not any(_busy(channel) for channel in channels):
+            break
+        loop(timeout=0.1, map=server._map, use_poll=use_poll, count=1)
+    else:
+        logger.warning("Shutdown timeout: %d connection(s) still busy", len(server.active_channels))
+    server.task_dispatcher.shutdown(timeout=max(0.0, deadline - time.monotonic()))
+    loop(timeout=0.1, map=server._map, use_poll=use_poll, count=1)
+    server.trigger.close()
+
+
+def _serve_worker(app, sock, threads):
+    # Runs in the main thread of a worker process until SIGTERM/SIGINT.
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    _run_start_hooks()
+    server = _create_server(app, sock, threads)
+    logger.info("Worker %d serving with %d thread(s)", os.getpid(), threads)
+    _run(server, stop)
+    cart.stop_cart_store()
+    events.stop_event_queue()
+    logger.info("Worker %d stopped", os.getpid())
+
+
+# --- Master ---
+def _spawn(app, sock, threads):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _serve_worker(app, sock, threads)
+        except Exception:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def _supervise(app, sock, workers, threads):
+    stop = threading.Event()
+
+    def request_stop(*_):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    children = {}  # pid -> started at
+    for _ in range(workers):
+        children[_spawn(app, sock, threads)] = time.monotonic()
+
+    while not stop.is_set():
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            stop.wait(LOOP_TIMEOUT)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stop.is_set():
+            continue
+        logger.error("Worker %d exited (status %d); starting a replacement", pid, status)
+        if time.monotonic() - started < RESPAWN_BACKOFF:
+            stop.wait(RESPAWN_BACKOFF)
+        if not stop.is_set():
+            children[_spawn(app, sock, threads)] = time.monotonic()
+
+    logger.info("Stopping %d worker(s)", len(children))
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + SHUTDOWN_TIMEOUT + 5
+    while children and time.monotonic() < deadline:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.pop(pid, None)
+        else:
+            time.sleep(0.05)
+    for pid in children:
+        logger.warning("Worker %d did not stop in time; killing it", pid)
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+
+# --- Entry points ---
+def serve(app, port, host=SERVE_HOST, workers=SERVE_WORKERS, threads=SERVE_THREADS):
+    # Blocking; call from the main thread of a headless process.
+    if workers > 1 and not hasattr(os, 'fork'):
+        logger.warning("Multiple workers need fork(); serving with one process")
+        workers = 1
+    if workers > 1:
+        # Carts are cached per process; with several workers every request
+        # may land on a different one, so the database is the shared copy.
+        cart.CART_WRITE_THROUGH = True
+    # Each worker starts its own password hashing pool.
+    credentials.share_cores(workers)
+    with startup.phase('database'):
+        db.setup_database()
+    # Workers open their own connections (see database.get_backend).
+    db.close_backend()
+    sock = _listen(host, port)
+    startup.mark('listening')
+    startup.report('listening')
+    logger.info("Serving on http://%s:%d with %d worker(s) x %d thread(s)", host, port, workers, threads)
+    try:
+        if workers > 1:
+            _supervise(app, sock, workers, threads)
+        else:
+            _serve_worker(app, sock, threads)
+    finally:
+        sock.close()
+
+
+def serve_in_background(app, port, host=SERVE_HOST, threads=SERVE_THREADS):
+    # One in-process server on a thread, for the desktop launchers. Returns a
+    # function that drains and stops it.
+    with startup.phase('database'):
+        db.setup_database()
+    _run_start_hooks()
+    sock = _listen(host, port)
+    server = _create_server(app, sock, threads)
+    stop = threading.Event()
+    thread = threading.Thread(target=_run, args=(server, stop), name='http-server', daemon=True)
+    thread.start()
+
+    def shutdown():
+        stop.set()
+        thread.join(SHUTDOWN_TIMEOUT + 5)
+        sock.close()
+
+    return shutdown
+
+
+def load_app(name):
+    module, _ = APPS[name]
+    with startup.phase('app import'):
+        return importlib.import_module(module).app
+
+
+def start_local(name, port):
+    # Starts the server behind a desktop window and returns a function that
+    # stops it. Several workers need a process of their own to fork from, so
+    # they run as `python -m shared.server <name>` in a child process.
+    if SERVE_WORKERS <= 1:
+        return serve_in_background(load_app(name), port)
+    child = subprocess.Popen([sys.executable, '-m', 'shared.server', name, '--port', str(port)])
+
+    def shutdown():
+        child.terminate()
+        try:
+            child.wait(SHUTDOWN_TIMEOUT + 5)
+        except subprocess.TimeoutExpired:
+            child.kill()
+
+    return shutdown
+
+
+def main(argv=None):
+    # Headless serving, e.g. for several hosts behind a load balancer:
+    #   python -m shared.server shop --host 0.0.0.0 --workers 4 --threads 8
+    parser = argparse.ArgumentParser(description="Serve the shop or admin app without the desktop window.")
+    parser.add_argument('app', choices=sorted(APPS))
+    parser.add_argument('--host', default=SERVE_HOST)
+    parser.add_argument('--port', type=int, help="default: 5000 for shop, 5001 for admin")
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS)
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    serve(load_app(args.app), args.port or APPS[args.app][1], args.host, max(1, args.workers), max(1, args.threads))
+    return 0
+
+
+if __name__ == '__main__':
+    # Go through the package module so readiness state is shared with the
+    # apps, which import shared.server.
+    from shared.server import main
+    sys.exit(main())
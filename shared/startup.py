@@ -0,0 +1,105 @@
+# shared/startup.py
+#
+# Startup timing. Launchers import this module first, so times are measured
+# from then (interpreter start-up itself is not included). Phases that run
+# side by side (the window and the server booting behind it) are recorded
+# with their own start offsets; milestones such as "first paint" are points.
+# The report is printed once and compared against PUP_STARTUP_BUDGET_MS.
+#
+# Kept free of heavy imports on purpose: it must not slow down what it times.
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STARTUP_BUDGET_MS = float(os.environ.get('PUP_STARTUP_BUDGET_MS', 1500))
+
+_started = time.perf_counter()
+_events = []  # (name, start ms, duration ms or None for milestones)
+_lock = threading.Lock()
+_reported = False
+
+
+def _ms(at):
+    return (at - _started) * 1000
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with _lock:
+            _events.append((name, _ms(start), (end - start) * 1000))
+
+
+def mark(name):
+    with _lock:
+        _events.append((name, _ms(time.perf_counter()), None))
+
+
+def elapsed_ms():
+    return _ms(time.perf_counter())
+
+
+def events():
+    with _lock:
+        return sorted(_events, key=lambda event: event[1])
+
+
+def report(milestone, budget_ms=STARTUP_BUDGET_MS):
+    # Prints the phases once; `milestone` is the mark the budget applies to.
+    global _reported
+    with _lock:
+        if _reported:
+            return
+        _reported = True
+    lines = [f"Startup timing (pid {os.getpid()}):"]
+    reached = None
+    for name, start, duration in events():
+        if duration is None:
+            lines.append(f"  {start:8.1f} ms  {name}")
+            if name == milestone:
+                reached = start
+        else:
+            lines.append(f"  {start:8.1f} ms  {name:<24}{duration:8.1f} ms")
+    print("\n".join(lines))
+    if reached is not None and reached > budget_ms:
+        logger.warning("Startup budget exceeded: %s at %.0f ms (budget %.0f ms)", milestone, reached, budget_ms)
+
+
+class ServerBoot:
+    # Starts an app's server on a background thread so a desktop window can
+    # paint while Flask, the app and the database load behind it. `ready` is
+    # set once the server answers /ready, or when it failed (see `error`).
+    def __init__(self, name, port):
+        self.url = f"http://127.0.0.1:{port}"
+        self.ready = threading.Event()
+        self.error = None
+        self._stop = None
+        threading.Thread(target=self._run, args=(name, port), name='server-boot', daemon=True).start()
+
+    def _run(self, name, port):
+        try:
+            with phase('server import'):
+                from shared import server
+            self._stop = server.start_local(name, port)
+            if server.wait_until_ready(self.url + '/ready'):
+                mark('server ready')
+            else:
+                self.error = f"The server did not become ready on port {port}."
+        except Exception as err:
+            logger.exception("Server failed to start")
+            self.error = f"The server failed to start: {err}"
+        finally:
+            self.ready.set()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop()
@@ -1,14 +1,12 @@
+from shared import startup  # first, so startup timing covers the imports below
 import tkinter as tk
 from tkinter import font
-import tkinterweb
-import threading
-import time
-from flask import Flask, send_from_directory
 import os
 import configparser
 
-# CHANGE THIS LINE: from .web_pages import app as flask_app
-from shop_app.web_pages import app as flask_app
+PORT = 5000
+NAV_PAGES = [("Homepage", "/home"), ("Cart", "/cart"), ("Profile", "/profile")]
+RESULT_POLL_MS = 20
 
 # --- Configuration for Splash Screen ---
 CONFIG_FILE = 'shop_app/config.ini'
@@ -25,14 +23,13 @@ def mark_launch_as_done():
     with open(CONFIG_FILE, 'w') as configfile:
         config.write(configfile)
 
-# --- Flask Server Thread ---
-def run_flask():
-    # Use a different port if 5000 is taken
-    flask_app.run(port=5000, debug=False)
-
 class PupShopApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, boot):
         super().__init__()
+        self.boot = boot
+        self.pages = None
+        self.token = 0  # bumped per navigation; older results are not shown
+        self.shown = None
         self.title("PUP E-Commerce Shop")
         self.geometry("450x800")
         self.resizable(False, False)
@@ -81,18 +78,27 @@ class PupShopApp(tk.Tk):
         self.setup_main_app()
 
     def setup_main_app(self):
-        self.html_frame = tkinterweb.HtmlFrame(self, messages_enabled=False)
+        # Deferred: the HTML engine is the slowest import of the launcher and
+        # the onboarding screens do not need it.
+        with startup.phase('html engine'):
+            import tkinterweb
+        from shop_app.page_cache import PageCache
+        self.pages = PageCache(self.boot.url)
+        # Links and forms go through the page cache instead of tkinterweb's
+        # own loader.
+        self.html_frame = tkinterweb.HtmlFrame(self, messages_enabled=False,
+                                               on_link_click=self.navigate, on_form_submit=self.submit)
         self.html_frame.pack(fill="both", expand=True)
 
         self.create_bottom_nav()
-        self.html_frame.load_url("http://127.0.0.1:5000/") # Start at login/register
+        self.after(RESULT_POLL_MS, self.poll_pages)
+        self.navigate("/") # Start at login/register
 
     def create_bottom_nav(self):
         nav_bar = tk.Frame(self, height=60, bg="#f0f0f0", relief="raised", borderwidth=1)
         nav_bar.pack(side="bottom", fill="x")
 
-        buttons = [("Homepage", "/home"), ("Cart", "/cart"), ("Profile", "/profile")]
-        for text, url in buttons:
+        for text, url in NAV_PAGES:
             btn = tk.Button(
                 nav_bar, 
                 text=text, 
@@ -103,21 +109,62 @@ class PupShopApp(tk.Tk):
             btn.pack(side="left", fill="both", expand=True)
     
     def navigate(self, url):
-        full_url = f"http://127.0.0.1:5000{url}"
-        self.html_frame.load_url(full_url)
+        # The server boots behind the window; pages load once it is ready.
+        if not self.boot.ready.is_set():
+            self.after(20, self.navigate, url)
+            return
+        if self.boot.error:
+            self.html_frame.load_html(f"<p>{self.boot.error}</p>")
+            return
+        path = self.pages.path(url)
+        if path is None:
+            self.html_frame.load_url(url)
+            return
+        self.token += 1
+        # A cached page is shown at once; the fetch below revalidates it and
+        # only comes back if it changed.
+        cached = self.pages.get(path)
+        if cached is not None:
+            self.show(cached)
+        self.pages.load(self.token, path, cached)
+
+    def submit(self, url, data, method):
+        path = self.pages.path(url)
+        if path is None or method == "GET":
+            self.navigate(url + data)
+            return
+        self.token += 1
+        self.pages.submit(self.token, path, data)
+
+    def poll_pages(self):
+        # Hands pages fetched by the workers to the HTML frame (Tk thread only).
+        while not self.pages.results.empty():
+            token, page, error = self.pages.results.get_nowait()
+            if token != self.token:
+                continue
+            if page is None:
+                self.html_frame.load_html(f"<p>Could not reach the shop: {error}</p>")
+            else:
+                self.show(page)
+        self.after(RESULT_POLL_MS, self.poll_pages)
 
+    def show(self, page):
+        first = self.shown is None
+        self.shown = page
+        self.html_frame.load_html(page.html, base_url=self.boot.url + page.path)
+        if first:
+            startup.mark('first page')
+            startup.report('first paint')
+        self.pages.prefetch([path for _, path in NAV_PAGES] + self.pages.links(page))
 
-if __name__ == "__main__":
-    # Start the Flask server in a daemon thread
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    # Wait a moment for the server to start
-    time.sleep(1)
 
-    # Initialize the database
-    from shared.database import setup_database
-    setup_database()
-    
-    app = PupShopApp()
-    app.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    # Headless serving without this window: python -m shared.server shop
+    startup.mark('launcher imports')
+    boot = startup.ServerBoot("shop", PORT)
+    app = PupShopApp(boot)
+    app.after_idle(startup.mark, 'first paint')
+    app.mainloop()
+    if app.pages is not None:
+        app.pages.close()
+    boot.stop()
@@ -0,0 +1,148 @@
+# shop_app/page_cache.py
+#
+# Page cache for the desktop shell. Pages are fetched over HTTP on worker
+# threads (one cookie jar, so the cart session survives) and kept in a
+# bounded LRU by path. A cached page is shown at once and revalidated in the
+# background: pages with an ETag come back as a cheap 304, others are
+# re-read and compared. Only a page that actually changed is handed back to
+# be re-rendered, so switching tabs does not re-parse identical HTML.
+#
+# Results are delivered through `results`, a queue the Tk thread drains;
+# workers never touch Tk widgets.
+
+import http.cookiejar
+import logging
+import os
+import queue
+import re
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+PAGE_CACHE_SIZE = int(os.environ.get('PUP_PAGE_CACHE_SIZE', 32))
+PREFETCH_WORKERS = int(os.environ.get('PUP_PREFETCH_WORKERS', 2))
+# Product links prefetched from each page, in page order.
+PREFETCH_PRODUCTS = int(os.environ.get('PUP_PREFETCH_PRODUCTS', 6))
+REQUEST_TIMEOUT = 10
+PRODUCT_LINK = re.compile(r'href="(/product/\d+)"')
+
+
+class Page:
+    def __init__(self, path, html, etag=None, status=200):
+        self.path = path
+        self.html = html
+        self.etag = etag
+        self.status = status
+
+
+class PageCache:
+    def __init__(self, base_url, maxsize=PAGE_CACHE_SIZE, workers=PREFETCH_WORKERS):
+        self.base_url = base_url
+        self.results = queue.Queue()  # (token, page or None, error or None)
+        self._pages = LRUCache(maxsize=maxsize)
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='page-fetch')
+        self._prefetching = set()
+        self._lock = threading.Lock()
+
+    def path(self, url):
+        # Server-relative path (with query) of a URL, or None for other sites.
+        if url.startswith('/'):
+            return url
+        if not url.startswith(self.base_url + '/'):
+            return None
+        parts = urllib.parse.urlsplit(url)
+        return parts.path + (f"?{parts.query}" if parts.query else '')
+
+    def get(self, path):
+        return self._pages.get(path)
+
+    # --- HTTP ---
+    def _request(self, path, data=None, etag=None, prefetch=False):
+        request = urllib.request.Request(self.base_url + path, data=data)
+        if etag:
+            request.add_header('If-None-Match', etag)
+        if prefetch:
+            # Lets the server leave prefetches out of its page-view counts.
+            request.add_header('Sec-Purpose', 'prefetch')
+        try:
+            with self._opener.open(request, timeout=REQUEST_TIMEOUT) as response:
+                return Page(self.path(response.geturl()) or path, response.read().decode('utf-8'),
+                            response.headers.get('ETag'), response.status)
+        except urllib.error.HTTPError as err:
+            if err.code == 304:
+                return None
+            return Page(path, err.read().decode('utf-8', 'replace'), status=err.code)
+
+    def _store(self, page):
+        # Only successful pages are cached.
+        if page.status == 200:
+            self._pages.set(page.path, page)
+
+    # --- Worker tasks ---
+    def _load(self, token, path, shown):
+        try:
+            page = self._request(path, etag=shown.etag if shown else None)
+        except OSError as err:
+            logger.warning("Failed to load %s: %s", path, err)
+            if shown is None:
+                self.results.put((token, None, err))
+            return
+        if page is None:
+            return  # 304: what is on screen is current
+        self._store(page)
+        if shown is None or page.html != shown.html or page.path != shown.path:
+            self.results.put((token, page, None))
+
+    def _submit(self, token, path, data):
+        try:
+            page = self._request(path, data=data)
+        except OSError as err:
+            logger.warning("Failed to submit %s: %s", path, err)
+            self.results.put((token, None, err))
+            return
+        if page.path != path:
+            self._store(page)  # the page redirected to is a plain GET
+        self.results.put((token, page, None))
+
+    def _prefetch(self, path):
+        try:
+            if self._pages.get(path) is None:
+                self._store(self._request(path, prefetch=True))
+        except OSError as err:
+            logger.debug("Prefetch of %s failed: %s", path, err)
+        finally:
+            with self._lock:
+                self._prefetching.discard(path)
+
+    # --- Called from the Tk thread ---
+    def load(self, token, path, shown=None):
+        # Fetches `path`, revalidating `shown` (the cached page on screen).
+        self._pool.submit(self._load, token, path, shown)
+
+    def submit(self, token, path, data):
+        # A POST changes session state (cart, account): pages cached without
+        # a validator could no longer be trusted.
+        self._pages.discard_if(lambda page: page.etag is None)
+        self._pool.submit(self._submit, token, path, data)
+
+    def prefetch(self, paths):
+        for path in paths:
+            with self._lock:
+                if path in self._prefetching or self._pages.get(path) is not None:
+                    continue
+                self._prefetching.add(path)
+            self._pool.submit(self._prefetch, path)
+
+    def links(self, page):
+        # Product pages linked from `page`, first ones first.
+        return list(dict.fromkeys(PRODUCT_LINK.findall(page.html)))[:PREFETCH_PRODUCTS]
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,37 +1,62 @@
 # shop_app/web_pages.py
 
 import os
-from flask import Flask, send_from_directory, render_template_string, request, redirect, url_for
+import time
+from flask import Flask, send_from_directory, render_template_string, request, redirect, url_for, jsonify, session, g
 import dominate
 from dominate.tags import *
 from shared import database as db
+from shared.rendering import PageShell, FragmentCache, render_fragment
+from shared import metrics
+from shared import images
+from shared import assets
+from shared import server
+from shared import search
+from shared import credentials
+from shared import bestsellers
+from shared import events
+from shared.http_cache import conditional
+from shared.cart import get_cart_store
 
 # --- Flask App Initialization (CORRECTED) ---
-# When running as a module from the project root, 'assets' is a top-level directory.
-# This is a simpler and more reliable way to set the path.
-app = Flask(__name__, static_folder='assets', static_url_path='/static')
+# 'assets' is a top-level directory, outside this package; the asset pipeline
+# serves it (fingerprinted under /assets/, plain under /static/).
+app = Flask(__name__, static_folder=None)
+# Signs the session cookie that carries the cart id and the logged-in user.
+app.secret_key = server.secret_key()
+metrics.install(app, 'shop')
+server.install(app)
+# Each serving process builds its search index in the background.
+server.on_start(search.start)
+images.install(app)
+assets.install(app)
 
 
 # Base page structure to avoid repetition
+def shop_head():
+    meta(charset="UTF-8")
+    meta(name="viewport", content="width=device-width, initial-scale=1.0")
+    link(rel="stylesheet", href=assets.asset_url("css/style.css"))
+
+shell = PageShell(shop_head, cls="container")
+fragments = FragmentCache()
+
 def create_base_page(page_title, content_div):
-    doc = dominate.document(title=page_title)
-    with doc.head:
-        meta(charset="UTF-8")
-        meta(name="viewport", content="width=device-width, initial-scale=1.0")
-        link(rel="stylesheet", href="/static/css/style.css")
-    
-    with doc.body:
-        with div(cls="container"):
-            content_div(app) # Pass app context if needed for url_for
-    return doc.render()
+    # Pass app context if needed for url_for
+    with metrics.render_phase():
+        return shell.render(page_title, render_fragment(content_div, app))
 
 # --- Page Content Generators ---
 def login_register_content(_):
-    img(src="/static/images/pup_logo.png", cls="logo")
+    img(src=assets.asset_url("images/pup_logo.png"), cls="logo")
     h1("Mula sayo para sa bayan", style="color: #8c1515;")
     
     with form(action="/register", method="post"):
         h2("Register")
+        if request.args.get('register') == 'busy':
+            p("Too many sign-ups right now. Please try again in a moment.", style="color: #8c1515;")
+        elif request.args.get('register') == 'failed':
+            p("Could not create the account. The email may already be registered.", style="color: #8c1515;")
         label("Name:", _for="name")
         input_(type="text", id="name", name="name", required=True)
         label("Email Address:", _for="email")
@@ -43,30 +68,89 @@ def login_register_content(_):
         button("REGISTER", type="submit", cls="btn-secondary")
     
     hr()
-    a("Already have an account? Login (Feature WIP)", href="#")
+    with form(action="/login", method="post"):
+        h2("Already have an account? Login")
+        if request.args.get('login') == 'failed':
+            p("Wrong email or password.", style="color: #8c1515;")
+        elif request.args.get('login') == 'busy':
+            p("Too many logins right now. Please try again in a moment.", style="color: #8c1515;")
+        label("Email Address:", _for="login_email")
+        input_(type="email", id="login_email", name="email", required=True)
+        label("Password:", _for="login_password")
+        input_(type="password", id="login_password", name="password", required=True)
+        button("LOGIN", type="submit", cls="btn-primary")
 
 
 def homepage_content(_):
-    img(src="/static/images/pup_logo.png", cls="logo")
+    img(src=assets.asset_url("images/pup_logo.png"), cls="logo")
     h1("Homepage")
+    search_form()
     h2("Best Sellers")
+    best_sellers_grid()
+    h2("All Products")
+
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    fragments.include(('grid', after, before), product_grid, after, before)
 
-    products = db.get_all_products()
+def product_grid(after, before):
+    page = db.get_products_page(after=after, before=before)
     with div(cls="product-grid"):
         # --- FIX: Changed loop variable from 'p' to 'product' ---
+        for product in page['items']:
+            fragments.include(('card', product['id']), product_card, product)
+    pager(page, 'home')
+
+def best_sellers_grid(variation=None):
+    # Read from the in-memory ranking, not fragment-cached as a whole: it
+    # changes with every checkout while the cards themselves rarely do.
+    products = bestsellers.best_sellers(variation=variation)
+    if not products:
+        p("No sales yet.")
+        return
+    with div(cls="product-grid"):
         for product in products:
-            with a(href=url_for('product_detail', product_id=product['id']), cls="product-item"):
-                img(src=product['image_url'])
-                h3(product['name'])
-                # Now using the 'dominate' p tag, not the dictionary
-                p(f"₱{product['price']:.2f}")
+            fragments.include(('card', product['id']), product_card, product)
+
+def product_card(product):
+    with a(href=url_for('product_detail', product_id=product['id']), cls="product-item"):
+        img(**images.responsive_attrs(product['image_url'], "(max-width: 450px) 45vw, 200px"))
+        h3(product['name'])
+        # Now using the 'dominate' p tag, not the dictionary
+        p(f"₱{product['price']:.2f}")
+
+def search_form(query=''):
+    with form(action="/search", method="get", cls="search-form"):
+        input_(type="search", name="q", value=query, placeholder="Search products", aria_label="Search products")
+        button("Search", type="submit", cls="btn-primary")
+
+def search_content(_):
+    query = request.args.get('q', '').strip()
+    h1("Search")
+    search_form(query)
+    if not query:
+        return
+    results = search.search(query)
+    if not results:
+        p(f"No products match \"{query}\".")
+        return
+    with div(cls="product-grid"):
+        for product in results:
+            fragments.include(('card', product['id']), product_card, product)
+
+def pager(page, endpoint):
+    with div(cls="pager"):
+        if page['prev'] is not None:
+            a("‹ Prev", href=url_for(endpoint, before=page['prev']))
+        if page['next'] is not None:
+            a("Next ›", href=url_for(endpoint, after=page['next']))
 
 def product_detail_content(product):
     if not product:
         h1("Product not found")
         return
 
-    img(src=product['image_url'], style="max-width: 80%; border-radius: 8px;")
+    img(style="max-width: 80%; border-radius: 8px;", **images.responsive_attrs(product['image_url'], "80vw"))
     h1(product['name'])
     h2(f"₱{product['price']:.2f}", style="color: #ff5722;")
     p(f"{product['sold_count']} sold")
@@ -77,21 +161,100 @@ def product_detail_content(product):
 
     with form(action="/add-to-cart", method="post"):
         input_(type="hidden", name="product_id", value=product['id'])
-        if product.get('variations'):
+        if product['variation_list']:
             label("Select Variation:")
-            select_tag = select(name="variation")
-            with select_tag:
-                for var in product['variations'].split(','):
-                    option(var, value=var)
+            with select(name="variation"):
+                for variation in product['variation_list']:
+                    text = variation['name']
+                    if variation['price_delta']:
+                        text += f" (₱{product['price'] + variation['price_delta']:.2f})"
+                    if variation['stock'] <= 0:
+                        option(text + " - sold out", value=variation['name'], disabled=True)
+                    else:
+                        option(text, value=variation['name'])
         
-        button("ADD TO CART", type="submit", cls="btn-primary")
-        button("BUY NOW", type="submit", cls="btn-secondary")
+        button("ADD TO CART", type="submit", name="action", value="cart", cls="btn-primary")
+        button("BUY NOW", type="submit", name="action", value="buy", cls="btn-secondary")
+
+def unit_price(product, variation):
+    for choice in product['variation_list']:
+        if choice['name'] == variation:
+            return product['price'] + choice['price_delta']
+    return product['price']
+
+def cart_session_id():
+    session_id = session.get('cart_id')
+    if session_id is None:
+        session_id = session['cart_id'] = get_cart_store().new_session()
+    return session_id
 
 def cart_content(_):
     h1("Shopping Cart")
-    div("Your cart is currently empty.")
-    p("Add items from the homepage to see them here.")
-    a("CHECK OUT", href="#", cls="btn btn-checkout")
+    out_of_stock = request.args.get('out_of_stock', type=int)
+    if out_of_stock is not None:
+        product = db.get_product_by_id(out_of_stock)
+        name = product['name'] if product else f"Product {out_of_stock}"
+        p(f"Sorry, there is not enough stock left for {name}. Please adjust your cart.", style="color: #f44336;")
+    if request.args.get('failed'):
+        p("We could not place your order. Please try again.", style="color: #f44336;")
+
+    cart_items = get_cart_store().get(cart_session_id())
+    products = {product['id']: product
+                for product in db.get_products_by_ids([product_id for product_id, _, _ in cart_items])}
+    items = [(products[product_id], variation, quantity)
+             for product_id, variation, quantity in cart_items if product_id in products]
+
+    if not items:
+        div("Your cart is currently empty.")
+        p("Add items from the homepage to see them here.")
+        return
+
+    total = 0
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("Product")
+                th("Variation")
+                th("Quantity")
+                th("Subtotal")
+        with tbody():
+            for product, variation, quantity in items:
+                subtotal = unit_price(product, variation) * quantity
+                total += subtotal
+                with tr():
+                    td(a(product['name'], href=url_for('product_detail', product_id=product['id'])))
+                    td(variation or "-")
+                    with td():
+                        with form(action="/cart/update", method="post"):
+                            input_(type="hidden", name="product_id", value=product['id'])
+                            input_(type="hidden", name="variation", value=variation)
+                            input_(type="number", name="quantity", value=quantity, min="0", max="99")
+                            button("Update", type="submit")
+                    td(f"₱{subtotal:.2f}")
+    h2(f"Total: ₱{total:.2f}")
+    with form(action="/checkout", method="post"):
+        button("CHECK OUT", type="submit", cls="btn btn-checkout")
+
+def order_content(order):
+    h1("Order Placed")
+    p(f"Ref No. ORD-{order['id']}")
+    p(f"Status: {order['status'].title()}")
+    with table(cls="admin-table"):
+        with thead():
+            with tr():
+                th("Product")
+                th("Variation")
+                th("Quantity")
+                th("Price")
+        with tbody():
+            for item in order['items']:
+                with tr():
+                    td(item['name'] or f"Product {item['product_id']}")
+                    td(item['variation'] or "-")
+                    td(item['quantity'])
+                    td(f"₱{item['unit_price']:.2f}")
+    h2(f"Total: ₱{order['total']:.2f}")
+    a("Continue Shopping", href=url_for('home'))
 
 def profile_content(_):
     h1("User Profile")
@@ -107,6 +270,21 @@ def profile_content(_):
 
 def order_history_content(_):
     h1("Order History")
+    user_id = session.get('user_id')
+    if user_id is None:
+        p("Register or log in to see your order history.")
+        a("Register", href=url_for('login_register_page'))
+        return
+
+    summary = db.get_order_summary(user_id)
+    p(f"{summary['order_count']} order(s), {summary['item_count']} item(s), "
+      f"₱{summary['total_spent']:.2f} spent")
+
+    page = db.get_orders_page(
+        user_id,
+        after=parse_order_position(request.args.get('after')),
+        before=parse_order_position(request.args.get('before')),
+    )
     with table(cls="admin-table"):
         with thead():
             with tr():
@@ -115,11 +293,33 @@ def order_history_content(_):
                 th("Quantity")
                 th("Payment")
         with tbody():
-            with tr():
-                td("ORD-123")
-                td("Delivered")
-                td("2")
-                td("₱320.00")
+            if not page['items']:
+                with tr():
+                    td("No orders yet.", colspan="4")
+            for order in page['items']:
+                with tr():
+                    td(a(f"ORD-{order['id']}", href=url_for('order_detail', order_id=order['id'])))
+                    td(order['status'].title())
+                    td(order['item_count'])
+                    td(f"₱{order['total']:.2f}")
+
+    with div(cls="pager"):
+        if page['prev'] is not None:
+            a("‹ Newer", href=url_for('order_history', before=format_order_position(page['prev'])))
+        if page['next'] is not None:
+            a("Older ›", href=url_for('order_history', after=format_order_position(page['next'])))
+
+# Order history positions travel in the URL as "<created_at>_<order id>".
+def format_order_position(position):
+    return f"{position[0]}_{position[1]}"
+
+def parse_order_position(value):
+    if not value:
+        return None
+    created_at, _, order_id = value.rpartition('_')
+    if not created_at or not order_id.isdigit():
+        return None
+    return created_at, int(order_id)
 
 def contact_us_content(_):
     h1("Contact Us")
@@ -137,19 +337,108 @@ def contact_us_content(_):
 def login_register_page():
     return create_base_page("Welcome", login_register_content)
 
+def home_validator():
+    # The listing is keyed by catalog version; the best-sellers row shows
+    # only which products rank, not their counts.
+    return (shell.digest, db.catalog_version(),
+            tuple(product_id for product_id, _ in bestsellers.top_sellers()))
+
+def product_validator(product_id):
+    # The page shows live stock and sold counts, which checkouts change
+    # without bumping the catalog version; no validator if they are unknown.
+    stamp = stock_stamp(product_stock(product_id))
+    if stamp is None:
+        return None
+    return (shell.digest, db.catalog_version(), product_id, stamp)
+
 @app.route('/home')
+@conditional(home_validator)
 def home():
     return create_base_page("Homepage", homepage_content)
 
+@app.route('/search')
+def search_page():
+    return create_base_page("Search", search_content)
+
+@app.route('/api/search')
+def search_api():
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', search.SEARCH_LIMIT, type=int), db.MAX_PAGE_SIZE))
+    started = time.perf_counter()
+    results = search.search(query, limit)
+    return jsonify({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3),
+    })
+
+@app.route('/api/best-sellers')
+def best_sellers_api():
+    variation = request.args.get('variation', '').strip() or None
+    if variation and not bestsellers.is_variation(variation):
+        return jsonify({'error': f"unknown variation {variation!r}"}), 400
+    limit = max(1, min(request.args.get('limit', bestsellers.BEST_SELLERS_K, type=int),
+                       bestsellers.BEST_SELLERS_CAPACITY))
+    ranking = bestsellers.top_sellers(limit, variation)
+    return jsonify({
+        'variation': variation,
+        'results': [{'id': product_id, 'sold_count': sold_count} for product_id, sold_count in ranking],
+    })
+
+@app.route('/api/variations/<path:name>')
+def variation_api(name):
+    # Products offering a variation with stock left (an indexed lookup).
+    limit = request.args.get('limit', db.PAGE_SIZE, type=int)
+    return jsonify({
+        'variation': name,
+        'results': [{'id': row['id'], 'name': row['name'], 'price': float(row['price']), 'stock': row['stock']}
+                    for row in db.get_products_with_variation(name, limit)],
+    })
+
+def product_stock(product_id):
+    # Live stock for the product page, read once per request. The cached
+    # product and its fragment only change with the catalog version, which
+    # checkouts leave alone.
+    if 'product_stock' not in g:
+        g.product_stock = db.get_product_stock(product_id)
+    return g.product_stock
+
+def stock_stamp(stock):
+    if stock is None:
+        return None
+    return (stock['stock'], stock['sold_count'], tuple(sorted(stock['variations'].items())))
+
+def with_live_stock(product, stock):
+    if product is None or stock is None:
+        return product
+    variations = [dict(variation, stock=stock['variations'].get(variation['name'], variation['stock']))
+                  for variation in product['variation_list']]
+    return dict(product, stock=stock['stock'], sold_count=stock['sold_count'], variation_list=variations)
+
 @app.route('/product/<int:product_id>')
+@conditional(product_validator)
 def product_detail(product_id):
-    product = db.get_product_by_id(product_id)
-    return create_base_page(product['name'] if product else "Not Found", lambda _: product_detail_content(product))
+    stock = product_stock(product_id)
+    product = with_live_stock(db.get_product_by_id(product_id), stock)
+    return create_base_page(
+        product['name'] if product else "Not Found",
+        lambda _: fragments.include(('product', product_id, stock_stamp(stock)), product_detail_content, product)
+    )
 
 @app.route('/cart')
 def cart():
     return create_base_page("Shopping Cart", cart_content)
 
+@app.route('/order/<int:order_id>')
+def order_detail(order_id):
+    order = db.get_order(order_id)
+    owner = order is not None and (
+        order['session_id'] == session.get('cart_id')
+        or (order['user_id'] is not None and order['user_id'] == session.get('user_id')))
+    if not owner:
+        return create_base_page("Not Found", lambda _: h1("Order not found")), 404
+    return create_base_page(f"Order ORD-{order_id}", lambda _: order_content(order))
+
 @app.route('/profile')
 def profile():
     return create_base_page("Profile", profile_content)
@@ -162,25 +451,102 @@ def order_history():
 def contact_us():
     return create_base_page("Contact Us", contact_us_content)
 
+@app.after_request
+def track_page_view(response):
+    # Queued for the event writers; nothing is written on the request thread.
+    # Prefetches by the desktop shell are not views.
+    if 'prefetch' in request.headers.get('Sec-Purpose', ''):
+        return response
+    if request.method == 'GET' and (g.get('not_modified') or
+                                    (response.status_code == 200 and response.mimetype == 'text/html')):
+        session_id = user_id = None
+        # Only read the session when there is one, so anonymous pages do not
+        # pick up Vary: Cookie.
+        if app.config['SESSION_COOKIE_NAME'] in request.cookies:
+            session_id, user_id = session.get('cart_id'), session.get('user_id')
+        events.emit('page_view', session_id=session_id, user_id=user_id, path=request.path)
+    return response
+
 # --- Form Handling Routes ---
 @app.route('/register', methods=['POST'])
 def handle_register():
     name = request.form['name']
     email = request.form['email']
     password = request.form['password']
-    db.create_user(name, email, password)
+    # The account is created on the request thread (the session needs its
+    # id); the welcome email only goes on the event queue.
+    try:
+        user_id = db.create_user(name, email, password)
+    except credentials.CredentialsBusy:
+        return redirect(url_for('login_register_page', register='busy'))
+    if user_id is None:
+        return redirect(url_for('login_register_page', register='failed'))
+    session['user_id'] = user_id
+    events.emit('welcome_email', user_id=user_id, email=email, template='welcome')
+    return redirect(url_for('home'))
+
+@app.route('/login', methods=['POST'])
+def handle_login():
+    try:
+        user_id = db.authenticate(request.form['email'], request.form['password'])
+    except credentials.CredentialsBusy:
+        return redirect(url_for('login_register_page', login='busy'))
+    if user_id is None:
+        return redirect(url_for('login_register_page', login='failed'))
+    session['user_id'] = user_id
     return redirect(url_for('home'))
 
 @app.route('/submit-feedback', methods=['POST'])
 def handle_feedback():
     name = request.form.get('name')
     email = request.form.get('email')
-    message = request.form.get('message')
-    print(f"Feedback Received:\nName: {name}\nEmail: {email}\nMessage: {message}")
+    message = (request.form.get('message') or '').strip()
+    if message:
+        events.emit('feedback', name=name, email=email, message=message)
     return redirect(url_for('home'))
 
 @app.route('/add-to-cart', methods=['POST'])
 def handle_add_to_cart():
-    product_id = request.form.get('product_id')
-    print(f"Product {product_id} added to cart! (Functionality is a placeholder)")
+    # Only touches the in-memory cart store; the database write happens
+    # later on the cart flusher thread.
+    product_id = request.form.get('product_id', type=int)
+    quantity = request.form.get('quantity', 1, type=int)
+    if product_id is None or quantity < 1:
+        return redirect(url_for('home'))
+    variation = request.form.get('variation', '').strip()
+    if request.form.get('action') == 'buy':
+        # BUY NOW checks out this item on its own and leaves the cart alone.
+        return checkout_items(cart_session_id(), [(product_id, variation, quantity)], clear_cart=False)
+    session_id = cart_session_id()
+    get_cart_store().add(session_id, product_id, variation, quantity)
+    events.emit('add_to_cart', session_id=session_id, user_id=session.get('user_id'),
+                product_id=product_id, quantity=quantity)
+    return redirect(url_for('cart'))
+
+@app.route('/checkout', methods=['POST'])
+def handle_checkout():
+    session_id = cart_session_id()
+    items = get_cart_store().get(session_id)
+    if not items:
+        return redirect(url_for('cart'))
+    return checkout_items(session_id, items, clear_cart=True)
+
+def checkout_items(session_id, items, clear_cart):
+    try:
+        order_id = db.place_order(session_id, items, user_id=session.get('user_id'))
+    except db.OutOfStock as err:
+        return redirect(url_for('cart', out_of_stock=err.product_id))
+    if order_id is None:
+        return redirect(url_for('cart', failed=1))
+    if clear_cart:
+        get_cart_store().clear(session_id)
+    return redirect(url_for('order_detail', order_id=order_id))
+
+@app.route('/cart/update', methods=['POST'])
+def handle_cart_update():
+    product_id = request.form.get('product_id', type=int)
+    quantity = request.form.get('quantity', 0, type=int)
+    if product_id is not None:
+        variation = request.form.get('variation', '').strip()
+        get_cart_store().set_quantity(cart_session_id(), product_id, variation, quantity)
     return redirect(url_for('cart'))
\ No newline at end of file